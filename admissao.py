@@ -0,0 +1,134 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from fastapi import Depends, HTTPException, Request
+from cache import CacheLRU
+from dependencies import verificar_token, caches_monitorados
+from configuracoes import configuracoes
+from metricas import registrar_coletor
+from models import Usuario
+import math
+import time
+
+
+class BackendLimites(ABC):
+    """
+    Interface do armazenamento dos baldes de fichas (token bucket) usados nos limites de taxa. Cada
+    chave tem um balde com no máximo "capacidade" fichas, repostas à razão de "taxa" fichas por
+    segundo, e cada requisição admitida retira uma ficha. Em uma implantação com vários workers, um
+    backend baseado em um serviço compartilhado (ex.: um script Lua no Redis) faz com que o limite
+    valha para o conjunto dos processos e não para cada um separadamente.
+    """
+
+    @abstractmethod
+    async def consumir(self, chave, capacidade, taxa):
+        """
+        Retira uma ficha do balde da chave. Retorna 0 quando havia ficha disponível, ou quantos
+        segundos faltam para a próxima ficha quando o balde está vazio.
+        """
+
+
+class BackendMemoria(BackendLimites):
+    """
+    Backend em memória, para um único processo. Cada balde guarda a quantidade de fichas e o instante
+    da última atualização, e as fichas são repostas só quando o balde é consultado. Os baldes ficam
+    em um CacheLRU com prazo igual ao tempo até o balde encher de novo: um balde cheio equivale a um
+    balde inexistente, então ele pode ser descartado, e a memória fica limitada a tamanho_maximo
+    chaves mesmo com muitos IPs diferentes.
+    """
+
+    def __init__(self, tamanho_maximo):
+        # o TTL do cache é apenas um teto; o prazo de cada balde é definido em consumir()
+        self.baldes = CacheLRU(tamanho_maximo, 24 * 60 * 60)
+
+    async def consumir(self, chave, capacidade, taxa):
+        agora = time.monotonic()
+        balde = self.baldes.obter(chave)
+        if balde is None:
+            fichas = capacidade
+        else:
+            fichas, atualizado_em = balde
+            fichas = min(capacidade, fichas + (agora - atualizado_em) * taxa)
+
+        if fichas < 1:
+            self.baldes.definir(chave, (fichas, agora), expira_em=agora + (capacidade - fichas) / taxa)
+            return (1 - fichas) / taxa
+
+        fichas -= 1
+        self.baldes.definir(chave, (fichas, agora), expira_em=agora + (capacidade - fichas) / taxa)
+        return 0
+
+
+class ControleAdmissao:
+    """
+    Controle de admissão das requisições: limites de taxa por chave (IP ou usuário), guardados no
+    backend, e limites de requisições simultâneas por classe de rota, contados no próprio processo.
+    Uma requisição acima do limite de taxa recebe 429 (Too Many Requests) e uma acima do limite de
+    concorrência recebe 503 (Service Unavailable), ambas com o cabeçalho Retry-After, antes de
+    consumir bcrypt ou o bloqueio de escrita do banco de dados.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.em_execucao = {}
+        self.rejeicoes = {}
+
+    def rejeitar(self, limite, status_code, detail, espera):
+        self.rejeicoes[limite] = self.rejeicoes.get(limite, 0) + 1
+        raise HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(max(1, math.ceil(espera)))})
+
+    async def verificar_taxa(self, limite, chave, capacidade, taxa):
+        if not configuracoes.ADMISSAO_ATIVA or capacidade <= 0 or taxa <= 0:
+            return
+        espera = await self.backend.consumir(f"{limite}:{chave}", capacidade, taxa)
+        if espera > 0:
+            self.rejeitar(limite, 429, "Muitas requisições, tente novamente em instantes.", espera)
+
+    @contextmanager
+    def ocupar(self, classe, maximo):
+        """
+        Gerenciador de contexto que ocupa uma vaga da classe de rota durante a requisição, ou levanta
+        503 se as maximo vagas já estiverem ocupadas.
+        """
+        if configuracoes.ADMISSAO_ATIVA and maximo > 0 and self.em_execucao.get(classe, 0) >= maximo:
+            self.rejeitar(classe, 503, "Serviço sobrecarregado, tente novamente em instantes.", 1)
+        self.em_execucao[classe] = self.em_execucao.get(classe, 0) + 1
+        try:
+            yield
+        finally:
+            self.em_execucao[classe] -= 1
+
+
+# controle usado pelas rotas; para vários workers, basta trocar o BackendMemoria por um backend compartilhado
+backend_limites = BackendMemoria(configuracoes.ADMISSAO_BALDES_MAXIMO)
+controle_admissao = ControleAdmissao(backend_limites)
+caches_monitorados["limites"] = backend_limites.baldes
+
+async def admitir_autenticacao(request: Request):
+    """
+    Função de dependência das rotas de autenticação: limita a taxa de requisições por IP do cliente
+    e a quantidade de requisições de autenticação simultâneas, que disputam o pool do bcrypt.
+    """
+    ip = request.client.host if request.client else "desconhecido"
+    await controle_admissao.verificar_taxa("ip", ip, configuracoes.ADMISSAO_IP_RAJADA, configuracoes.ADMISSAO_IP_TAXA)
+    with controle_admissao.ocupar("autenticacao", configuracoes.ADMISSAO_CONCORRENCIA_AUTENTICACAO):
+        yield
+
+async def admitir_escrita_pedidos(usuario: Usuario = Depends(verificar_token)):
+    """
+    Função de dependência das rotas que alteram pedidos: limita a taxa de escritas por usuário e a
+    quantidade de escritas simultâneas, que disputam o bloqueio de escrita do banco de dados.
+    """
+    await controle_admissao.verificar_taxa("usuario", usuario.id, configuracoes.ADMISSAO_USUARIO_RAJADA, configuracoes.ADMISSAO_USUARIO_TAXA)
+    with controle_admissao.ocupar("escrita_pedidos", configuracoes.ADMISSAO_CONCORRENCIA_ESCRITA):
+        yield
+
+def exportar_metricas_admissao():
+    linhas = ["# TYPE delivery_admissao_em_execucao gauge"]
+    for classe, quantidade in sorted(controle_admissao.em_execucao.items()):
+        linhas.append(f'delivery_admissao_em_execucao{{classe="{classe}"}} {quantidade}')
+    linhas.append("# TYPE delivery_admissao_rejeicoes_total counter")
+    for limite, quantidade in sorted(controle_admissao.rejeicoes.items()):
+        linhas.append(f'delivery_admissao_rejeicoes_total{{limite="{limite}"}} {quantidade}')
+    return linhas
+
+registrar_coletor(exportar_metricas_admissao)
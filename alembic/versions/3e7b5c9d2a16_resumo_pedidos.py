@@ -0,0 +1,46 @@
+"""Tabela de resumo dos pedidos para a listagem por usuário
+
+Revision ID: 3e7b5c9d2a16
+Revises: 9f4c2d7a1e58
+Create Date: 2026-10-18 15:41:22.904176
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e7b5c9d2a16'
+down_revision: Union[str, Sequence[str], None] = '9f4c2d7a1e58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('resumo_pedidos',
+    sa.Column('pedido', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('usuario', sa.Integer(), nullable=False),
+    sa.Column('status', sa.SmallInteger(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('qtde_itens', sa.Integer(), nullable=False),
+    sa.Column('atualizado_em', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['pedido'], ['pedidos.id'], ),
+    sa.ForeignKeyConstraint(['usuario'], ['usuarios.id'], ),
+    sa.PrimaryKeyConstraint('pedido')
+    )
+    op.create_index('ix_resumo_pedidos_usuario_pedido', 'resumo_pedidos', ['usuario', 'pedido'], unique=False)
+
+    # gera o resumo dos pedidos existentes, que já têm total e quantidade de itens atualizados
+    op.execute(
+        "INSERT INTO resumo_pedidos (pedido, usuario, status, total, qtde_itens, atualizado_em) "
+        "SELECT id, usuario, status, total, qtde_itens, CURRENT_TIMESTAMP FROM pedidos"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_resumo_pedidos_usuario_pedido', table_name='resumo_pedidos')
+    op.drop_table('resumo_pedidos')
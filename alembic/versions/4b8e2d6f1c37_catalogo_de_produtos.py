@@ -0,0 +1,75 @@
+"""Catálogo de produtos e itens ligados aos produtos
+
+Revision ID: 4b8e2d6f1c37
+Revises: 8c3d5e7f9a12
+Create Date: 2026-10-18 21:02:00.557558
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b8e2d6f1c37'
+down_revision: Union[str, Sequence[str], None] = '8c3d5e7f9a12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABELAS_ITENS = ('itens_pedido', 'itens_pedido_arquivados')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('produtos',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('sabor', sa.String(length=50), nullable=False),
+    sa.Column('tamanho', sa.String(length=20), nullable=False),
+    sa.Column('preco', sa.Integer(), nullable=False),
+    sa.Column('disponivel', sa.Boolean(), nullable=False),
+    sa.Column('versao', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('sabor', 'tamanho', name='uq_produtos_sabor_tamanho')
+    )
+
+    # o catálogo inicial tem um produto para cada sabor e tamanho já vendido, com o maior preço cobrado
+    op.execute(
+        "INSERT INTO produtos (sabor, tamanho, preco, disponivel, versao) "
+        "SELECT sabor, tamanho, MAX(preco_unitario), TRUE, 1 FROM ("
+        "SELECT sabor, tamanho, preco_unitario FROM itens_pedido "
+        "UNION ALL SELECT sabor, tamanho, preco_unitario FROM itens_pedido_arquivados"
+        ") AS itens GROUP BY sabor, tamanho"
+    )
+
+    for tabela in TABELAS_ITENS:
+        op.add_column(tabela, sa.Column('produto', sa.Integer(), nullable=True))
+        op.execute(
+            f"UPDATE {tabela} SET produto = (SELECT produtos.id FROM produtos "
+            f"WHERE produtos.sabor = {tabela}.sabor AND produtos.tamanho = {tabela}.tamanho)"
+        )
+        with op.batch_alter_table(tabela) as batch_op:
+            batch_op.alter_column('produto', existing_type=sa.Integer(), nullable=False)
+            batch_op.create_foreign_key(f'fk_{tabela}_produto', 'produtos', ['produto'], ['id'])
+            batch_op.drop_column('tamanho')
+            batch_op.drop_column('sabor')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for tabela in reversed(TABELAS_ITENS):
+        with op.batch_alter_table(tabela) as batch_op:
+            batch_op.add_column(sa.Column('sabor', sa.String(length=50), nullable=True))
+            batch_op.add_column(sa.Column('tamanho', sa.String(length=20), nullable=True))
+        op.execute(
+            f"UPDATE {tabela} SET "
+            f"sabor = (SELECT produtos.sabor FROM produtos WHERE produtos.id = {tabela}.produto), "
+            f"tamanho = (SELECT produtos.tamanho FROM produtos WHERE produtos.id = {tabela}.produto)"
+        )
+        with op.batch_alter_table(tabela) as batch_op:
+            batch_op.alter_column('sabor', existing_type=sa.String(length=50), nullable=False)
+            batch_op.alter_column('tamanho', existing_type=sa.String(length=20), nullable=False)
+            batch_op.drop_constraint(f'fk_{tabela}_produto', type_='foreignkey')
+            batch_op.drop_column('produto')
+
+    op.drop_table('produtos')
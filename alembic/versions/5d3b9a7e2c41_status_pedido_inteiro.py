@@ -0,0 +1,61 @@
+"""Status do pedido como inteiro
+
+Revision ID: 5d3b9a7e2c41
+Revises: e8a2f61c0b37
+Create Date: 2026-10-18 11:27:05.661942
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d3b9a7e2c41'
+down_revision: Union[str, Sequence[str], None] = 'e8a2f61c0b37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# valores de models.StatusPedido
+STATUS = {'PENDENTE': 1, 'FINALIZADO': 2, 'CANCELADO': 3}
+
+
+def recriar_indice_abertos(predicado):
+    if op.get_bind().dialect.name in ('sqlite', 'postgresql'):
+        op.create_index(
+            'ix_pedidos_abertos_usuario_id', 'pedidos', ['usuario', 'id'], unique=False,
+            sqlite_where=sa.text(predicado),
+            postgresql_where=sa.text(predicado)
+        )
+
+
+def remover_indice_abertos():
+    if op.get_bind().dialect.name in ('sqlite', 'postgresql'):
+        op.drop_index('ix_pedidos_abertos_usuario_id', table_name='pedidos')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    remover_indice_abertos()
+
+    casos = " ".join(f"WHEN '{nome}' THEN '{valor}'" for nome, valor in STATUS.items())
+    op.execute(f"UPDATE pedidos SET status = CASE status {casos} END")
+    with op.batch_alter_table('pedidos') as batch_op:
+        batch_op.alter_column('status', existing_type=sa.String(), type_=sa.SmallInteger(),
+                              existing_nullable=False, postgresql_using='status::smallint')
+
+    recriar_indice_abertos(f"status = {STATUS['PENDENTE']}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    remover_indice_abertos()
+
+    with op.batch_alter_table('pedidos') as batch_op:
+        batch_op.alter_column('status', existing_type=sa.SmallInteger(), type_=sa.String(),
+                              existing_nullable=False, postgresql_using='status::varchar')
+    casos = " ".join(f"WHEN '{valor}' THEN '{nome}'" for nome, valor in STATUS.items())
+    op.execute(f"UPDATE pedidos SET status = CASE status {casos} END")
+
+    recriar_indice_abertos("status = 'PENDENTE'")
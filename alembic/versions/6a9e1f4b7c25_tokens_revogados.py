@@ -0,0 +1,34 @@
+"""Tabela de tokens revogados
+
+Revision ID: 6a9e1f4b7c25
+Revises: d25a8f3c6e41
+Create Date: 2026-10-18 21:03:44.127905
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a9e1f4b7c25'
+down_revision: Union[str, Sequence[str], None] = 'd25a8f3c6e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('tokens_revogados',
+    sa.Column('jti', sa.String(length=32), nullable=False),
+    sa.Column('expira_em', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('jti')
+    )
+    op.create_index(op.f('ix_tokens_revogados_expira_em'), 'tokens_revogados', ['expira_em'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_tokens_revogados_expira_em'), table_name='tokens_revogados')
+    op.drop_table('tokens_revogados')
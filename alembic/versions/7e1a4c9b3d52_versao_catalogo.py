@@ -0,0 +1,35 @@
+"""Versão do catálogo de produtos em uma linha própria
+
+Revision ID: 7e1a4c9b3d52
+Revises: 4b8e2d6f1c37
+Create Date: 2026-10-18 22:10:41.318604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e1a4c9b3d52'
+down_revision: Union[str, Sequence[str], None] = '4b8e2d6f1c37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('versao_catalogo',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('versao', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # a versão continua a partir da maior versão dos produtos, que os processos já podem ter carregado
+    op.execute("INSERT INTO versao_catalogo (id, versao) SELECT 1, COALESCE(MAX(versao), 0) FROM produtos")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('versao_catalogo')
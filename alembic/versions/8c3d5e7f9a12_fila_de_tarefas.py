@@ -0,0 +1,56 @@
+"""Fila de tarefas em segundo plano e tabela de falhas
+
+Revision ID: 8c3d5e7f9a12
+Revises: 6a9e1f4b7c25
+Create Date: 2026-10-18 20:54:14.689434
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c3d5e7f9a12'
+down_revision: Union[str, Sequence[str], None] = '6a9e1f4b7c25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('tarefas',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('tipo', sa.String(length=50), nullable=False),
+    sa.Column('chave', sa.String(length=200), nullable=False),
+    sa.Column('dados', sa.JSON(), nullable=False),
+    sa.Column('tentativas', sa.Integer(), nullable=False),
+    sa.Column('criado_em', sa.DateTime(), nullable=False),
+    sa.Column('disponivel_em', sa.DateTime(), nullable=False),
+    sa.Column('concluida_em', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('chave')
+    )
+    op.create_index('ix_tarefas_concluida_disponivel', 'tarefas', ['concluida_em', 'disponivel_em'], unique=False)
+    op.create_table('tarefas_falhas',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('tarefa', sa.Integer(), nullable=False),
+    sa.Column('tipo', sa.String(length=50), nullable=False),
+    sa.Column('chave', sa.String(length=200), nullable=False),
+    sa.Column('dados', sa.JSON(), nullable=False),
+    sa.Column('tentativas', sa.Integer(), nullable=False),
+    sa.Column('erro', sa.Text(), nullable=False),
+    sa.Column('criado_em', sa.DateTime(), nullable=False),
+    sa.Column('falhou_em', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_tarefas_falhas_chave'), 'tarefas_falhas', ['chave'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_tarefas_falhas_chave'), table_name='tarefas_falhas')
+    op.drop_table('tarefas_falhas')
+    op.drop_index('ix_tarefas_concluida_disponivel', table_name='tarefas')
+    op.drop_table('tarefas')
@@ -0,0 +1,30 @@
+"""Versão da linha do pedido para ETag e If-Match
+
+Revision ID: 9f4c2d7a1e58
+Revises: 5d3b9a7e2c41
+Create Date: 2026-10-18 14:27:05.318402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9f4c2d7a1e58'
+down_revision: Union[str, Sequence[str], None] = '5d3b9a7e2c41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # os pedidos existentes começam na versão 1, a mesma usada pelo SQLAlchemy nos pedidos novos
+    op.add_column('pedidos', sa.Column('versao', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('pedidos') as batch_op:
+        batch_op.drop_column('versao')
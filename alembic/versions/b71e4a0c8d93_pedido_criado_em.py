@@ -0,0 +1,35 @@
+"""Data de criação do pedido para os relatórios por período
+
+Revision ID: b71e4a0c8d93
+Revises: 3e7b5c9d2a16
+Create Date: 2026-10-18 16:58:40.117329
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b71e4a0c8d93'
+down_revision: Union[str, Sequence[str], None] = '3e7b5c9d2a16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # o SQLite não aceita ADD COLUMN com valor padrão não constante (CURRENT_TIMESTAMP), então lá a
+    # tabela é recriada; os pedidos existentes recebem a data da migração
+    recriar = 'always' if op.get_bind().dialect.name == 'sqlite' else 'auto'
+    with op.batch_alter_table('pedidos', recreate=recriar) as batch_op:
+        batch_op.add_column(sa.Column('criado_em', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+        batch_op.create_index('ix_pedidos_criado_em', ['criado_em'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('pedidos') as batch_op:
+        batch_op.drop_index('ix_pedidos_criado_em')
+        batch_op.drop_column('criado_em')
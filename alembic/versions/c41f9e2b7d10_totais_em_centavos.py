@@ -0,0 +1,52 @@
+"""Totais em centavos e quantidade de itens no pedido
+
+Revision ID: c41f9e2b7d10
+Revises: a643dd8e6f54
+Create Date: 2026-10-18 09:12:31.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f9e2b7d10'
+down_revision: Union[str, Sequence[str], None] = 'a643dd8e6f54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('pedidos', sa.Column('qtde_itens', sa.Integer(), nullable=False, server_default='0'))
+
+    # converte os valores em reais para centavos e recalcula os totais a partir dos itens
+    op.execute("UPDATE itens_pedido SET preco_unitario = ROUND(preco_unitario * 100)")
+    op.execute(
+        "UPDATE pedidos SET "
+        "total = (SELECT COALESCE(SUM(quantidade * preco_unitario), 0) FROM itens_pedido WHERE itens_pedido.pedido = pedidos.id), "
+        "qtde_itens = (SELECT COUNT(*) FROM itens_pedido WHERE itens_pedido.pedido = pedidos.id)"
+    )
+
+    with op.batch_alter_table('itens_pedido') as batch_op:
+        batch_op.alter_column('preco_unitario', existing_type=sa.Float(), type_=sa.Integer(),
+                              existing_nullable=False, postgresql_using='preco_unitario::integer')
+    with op.batch_alter_table('pedidos') as batch_op:
+        batch_op.alter_column('total', existing_type=sa.Float(), type_=sa.Integer(),
+                              existing_nullable=False, postgresql_using='total::integer')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('pedidos') as batch_op:
+        batch_op.alter_column('total', existing_type=sa.Integer(), type_=sa.Float(), existing_nullable=False)
+    with op.batch_alter_table('itens_pedido') as batch_op:
+        batch_op.alter_column('preco_unitario', existing_type=sa.Integer(), type_=sa.Float(), existing_nullable=False)
+
+    op.execute("UPDATE itens_pedido SET preco_unitario = preco_unitario / 100.0")
+    op.execute("UPDATE pedidos SET total = total / 100.0")
+
+    with op.batch_alter_table('pedidos') as batch_op:
+        batch_op.drop_column('qtde_itens')
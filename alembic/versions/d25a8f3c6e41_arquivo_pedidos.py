@@ -0,0 +1,57 @@
+"""Tabelas de arquivo dos pedidos encerrados
+
+Revision ID: d25a8f3c6e41
+Revises: b71e4a0c8d93
+Create Date: 2026-10-18 19:12:07.518302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd25a8f3c6e41'
+down_revision: Union[str, Sequence[str], None] = 'b71e4a0c8d93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('pedidos_arquivados',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('status', sa.SmallInteger(), nullable=False),
+    sa.Column('usuario', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('qtde_itens', sa.Integer(), nullable=False),
+    sa.Column('versao', sa.Integer(), nullable=False),
+    sa.Column('criado_em', sa.DateTime(), nullable=False),
+    sa.Column('atualizado_em', sa.DateTime(), nullable=False),
+    sa.Column('arquivado_em', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['usuario'], ['usuarios.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_pedidos_arquivados_usuario_id', 'pedidos_arquivados', ['usuario', 'id'], unique=False)
+    op.create_index('ix_pedidos_arquivados_criado_em', 'pedidos_arquivados', ['criado_em'], unique=False)
+    op.create_table('itens_pedido_arquivados',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('quantidade', sa.Integer(), nullable=False),
+    sa.Column('sabor', sa.String(length=50), nullable=False),
+    sa.Column('tamanho', sa.String(length=20), nullable=False),
+    sa.Column('preco_unitario', sa.Integer(), nullable=False),
+    sa.Column('pedido', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['pedido'], ['pedidos_arquivados.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_itens_pedido_arquivados_pedido'), 'itens_pedido_arquivados', ['pedido'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_itens_pedido_arquivados_pedido'), table_name='itens_pedido_arquivados')
+    op.drop_table('itens_pedido_arquivados')
+    op.drop_index('ix_pedidos_arquivados_criado_em', table_name='pedidos_arquivados')
+    op.drop_index('ix_pedidos_arquivados_usuario_id', table_name='pedidos_arquivados')
+    op.drop_table('pedidos_arquivados')
@@ -0,0 +1,42 @@
+"""Indices de pedidos e itens_pedido
+
+Revision ID: e8a2f61c0b37
+Revises: c41f9e2b7d10
+Create Date: 2026-10-18 10:03:57.418230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8a2f61c0b37'
+down_revision: Union[str, Sequence[str], None] = 'c41f9e2b7d10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_pedidos_usuario_id', 'pedidos', ['usuario', 'id'], unique=False)
+    op.create_index('ix_pedidos_status_id', 'pedidos', ['status', 'id'], unique=False)
+    op.create_index('ix_itens_pedido_pedido', 'itens_pedido', ['pedido'], unique=False)
+
+    # índices parciais só existem no SQLite e no PostgreSQL
+    if op.get_bind().dialect.name in ('sqlite', 'postgresql'):
+        op.create_index(
+            'ix_pedidos_abertos_usuario_id', 'pedidos', ['usuario', 'id'], unique=False,
+            sqlite_where=sa.text("status = 'PENDENTE'"),
+            postgresql_where=sa.text("status = 'PENDENTE'")
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name in ('sqlite', 'postgresql'):
+        op.drop_index('ix_pedidos_abertos_usuario_id', table_name='pedidos')
+    op.drop_index('ix_itens_pedido_pedido', table_name='itens_pedido')
+    op.drop_index('ix_pedidos_status_id', table_name='pedidos')
+    op.drop_index('ix_pedidos_usuario_id', table_name='pedidos')
@@ -0,0 +1,239 @@
+from fastapi import APIRouter, Depends, HTTPException
+from cache import CacheLRU
+from dependencies import getSession, verificar_token, caches_monitorados
+from configuracoes import configuracoes
+from schemas import ResponseVendasSchema, ResponseResumoVendasSchema
+from sqlalchemy import select, func, distinct, type_coerce, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Pedido, ItemPedido, PedidoArquivado, ItemPedidoArquivado, Produto, Usuario, StatusPedido
+from catalogo import CatalogoProdutos, obter_catalogo_requisicao
+from datetime import datetime
+from typing import Optional
+from functools import cache
+
+
+@cache
+def carregar_numpy():
+    """
+    Função para importar o NumPy na primeira análise, e não na inicialização do app (a importação
+    leva dezenas de milissegundos e só as rotas de análise o usam). O NumPy é opcional: quando
+    instalado, as métricas derivadas (percentis, médias) são calculadas de forma vetorizada; sem
+    ele, a função retorna None e o mesmo cálculo é feito em Python puro.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+analytics_router = APIRouter(prefix="/analytics", tags=["analytics"], dependencies=[Depends(verificar_token)])
+
+# resultados dos relatórios por parâmetros (agrupamento, período e filtros)
+cache_analise = CacheLRU(configuracoes.ANALISE_CACHE_TAMANHO, configuracoes.ANALISE_CACHE_TTL)
+caches_monitorados["analise"] = cache_analise
+
+AGRUPAMENTOS = ("produto", "sabor", "tamanho", "status", "periodo")
+# formato do strftime no SQLite e unidade do date_trunc nos demais bancos para cada tamanho de período
+PERIODOS = {
+    "hora": ("%Y-%m-%d %H:00", "hour"),
+    "dia": ("%Y-%m-%d", "day"),
+    "mes": ("%Y-%m", "month"),
+}
+# os relatórios consideram os pedidos em uso e os arquivados: cada consulta é feita nas duas fontes
+# (pedido, item), com os índices de cada tabela, e os resultados são somados
+FONTES = ((Pedido, ItemPedido), (PedidoArquivado, ItemPedidoArquivado))
+
+
+def verificar_admin(usuario):
+    if not usuario.admin:
+        raise HTTPException(status_code=401, detail="Você não tem autorização para acessar essa rota")
+
+def inicio_periodo(session, periodo, modelo_pedido):
+    """
+    Função para montar a expressão SQL que leva a data de criação do pedido ao início do período
+    (hora, dia ou mês), usada como grupo no GROUP BY.
+    """
+    formato, unidade = PERIODOS[periodo]
+    if session.get_bind().dialect.name == "sqlite":
+        return func.strftime(formato, modelo_pedido.criado_em)
+    return func.date_trunc(unidade, modelo_pedido.criado_em)
+
+def filtrar_vendas(consulta, modelo_pedido, inicio, fim, status):
+    """
+    Função para aplicar à consulta a janela de tempo [inicio, fim) sobre a data de criação do pedido
+    e o filtro opcional de status.
+    """
+    if inicio is not None:
+        consulta = consulta.filter(modelo_pedido.criado_em >= inicio)
+    if fim is not None:
+        consulta = consulta.filter(modelo_pedido.criado_em < fim)
+    if status is not None:
+        if status not in StatusPedido.__members__:
+            raise HTTPException(status_code=400, detail=f"Status inválido, use um destes: {', '.join(StatusPedido.__members__)}")
+        consulta = consulta.filter(modelo_pedido.status == StatusPedido[status])
+    return consulta
+
+def percentis(valores, fracoes):
+    """
+    Função para calcular os percentis de uma lista de valores com interpolação linear entre as
+    posições vizinhas, o mesmo método padrão do numpy.percentile.
+    """
+    numpy = carregar_numpy()
+    if numpy is not None:
+        return numpy.percentile(valores, [fracao * 100 for fracao in fracoes]).tolist()
+    ordenados = sorted(valores)
+    resultado = []
+    for fracao in fracoes:
+        posicao = (len(ordenados) - 1) * fracao
+        abaixo = int(posicao)
+        acima = min(abaixo + 1, len(ordenados) - 1)
+        resultado.append(ordenados[abaixo] + (ordenados[acima] - ordenados[abaixo]) * (posicao - abaixo))
+    return resultado
+
+def media(valores):
+    numpy = carregar_numpy()
+    if numpy is not None:
+        return float(numpy.mean(valores))
+    return sum(valores) / len(valores)
+
+@analytics_router.get("/vendas", response_model=ResponseVendasSchema)
+async def vendas(
+    agrupar: str = "sabor",
+    periodo: str = "dia",
+    inicio: Optional[datetime] = None,
+    fim: Optional[datetime] = None,
+    status: Optional[str] = None,
+    session: AsyncSession = Depends(getSession),
+    usuario: Usuario = Depends(verificar_token),
+    catalogo: CatalogoProdutos = Depends(obter_catalogo_requisicao)
+):
+    """
+    Essa é a rota de relatório de vendas, disponível apenas para administradores. Ela devolve a
+    receita, a quantidade vendida e o número de pedidos agrupados por produto, sabor, tamanho, status
+    ou período (hora, dia ou mês da criação do pedido), considerando os pedidos (em uso e arquivados)
+    criados na janela [inicio, fim) e, opcionalmente, só os de um status. A agregação é feita no banco
+    de dados com GROUP BY e o resultado fica em cache por ANALISE_CACHE_TTL segundos para cada
+    combinação de parâmetros, de forma que os painéis não percorram os itens dos pedidos a cada
+    atualização. O agrupamento por produto usa só o id do produto gravado nos itens, e o nome de
+    cada grupo vem do índice do catálogo; sabor e tamanho juntam os itens à tabela de produtos.
+    """
+    verificar_admin(usuario)
+    if agrupar not in AGRUPAMENTOS:
+        raise HTTPException(status_code=400, detail=f"Agrupamento inválido, use um destes: {', '.join(AGRUPAMENTOS)}")
+    if periodo not in PERIODOS:
+        raise HTTPException(status_code=400, detail=f"Período inválido, use um destes: {', '.join(PERIODOS)}")
+
+    chave = ("vendas", agrupar, periodo if agrupar == "periodo" else None, inicio, fim, status)
+    resultado = cache_analise.obter(chave)
+    if resultado is not None:
+        return resultado
+
+    # grupo -> [receita em centavos, quantidade, pedidos]; um pedido está em uma só das fontes, então
+    # as contagens de pedidos de cada fonte podem ser somadas
+    grupos = {}
+    for modelo_pedido, modelo_item in FONTES:
+        grupo = {
+            "produto": modelo_item.produto,
+            "sabor": Produto.sabor,
+            "tamanho": Produto.tamanho,
+            "status": modelo_pedido.status,
+            "periodo": inicio_periodo(session, periodo, modelo_pedido) if agrupar == "periodo" else None,
+        }[agrupar]
+        consulta = filtrar_vendas(
+            select(
+                grupo,
+                func.sum(modelo_item.quantidade * type_coerce(modelo_item.preco_unitario, Integer)),
+                func.sum(modelo_item.quantidade),
+                func.count(distinct(modelo_item.pedido))
+            )
+            .join(modelo_pedido, modelo_pedido.id == modelo_item.pedido)
+            .group_by(grupo),
+            modelo_pedido, inicio, fim, status
+        )
+        if agrupar in ("sabor", "tamanho"):
+            consulta = consulta.join(Produto, Produto.id == modelo_item.produto)
+        for valor, receita_centavos, quantidade, pedidos in (await session.execute(consulta)).all():
+            soma = grupos.setdefault(valor, [0, 0, 0])
+            soma[0] += receita_centavos
+            soma[1] += quantidade
+            soma[2] += pedidos
+
+    # nome de cada grupo na resposta; os produtos são identificados pelo sabor e tamanho do catálogo
+    if agrupar == "produto":
+        indice = await catalogo.garantir(session, grupos)
+        nomes = {id_produto: f"{indice[id_produto].sabor} {indice[id_produto].tamanho}" for id_produto in grupos}
+    else:
+        nomes = {valor: valor.name if isinstance(valor, StatusPedido) else str(valor) for valor in grupos}
+    resultado = {
+        "agrupar": agrupar,
+        "linhas": [
+            {
+                "grupo": nomes[valor],
+                "receita": receita_centavos / 100,
+                "quantidade": quantidade,
+                "pedidos": pedidos
+            }
+            for valor, (receita_centavos, quantidade, pedidos) in sorted(grupos.items())
+        ]
+    }
+    cache_analise.definir(chave, resultado)
+    return resultado
+
+@analytics_router.get("/resumo", response_model=ResponseResumoVendasSchema)
+async def resumo_vendas(
+    inicio: Optional[datetime] = None,
+    fim: Optional[datetime] = None,
+    status: Optional[str] = None,
+    session: AsyncSession = Depends(getSession),
+    usuario: Usuario = Depends(verificar_token)
+):
+    """
+    Essa é a rota com as métricas derivadas das vendas, disponível apenas para administradores: número
+    de pedidos, receita, ticket médio e percentis do valor dos pedidos (p50, p90 e p99) e tamanho médio
+    da cesta (unidades por pedido) com os seus percentis, para os pedidos (em uso e arquivados)
+    criados na janela [inicio, fim). O banco devolve só duas colunas por pedido (total e unidades, já somadas com
+    GROUP BY), e as estatísticas são calculadas sobre essas colunas com o NumPy quando disponível.
+    O resultado fica em cache como na rota de vendas.
+    """
+    verificar_admin(usuario)
+
+    chave = ("resumo", inicio, fim, status)
+    resultado = cache_analise.obter(chave)
+    if resultado is not None:
+        return resultado
+
+    linhas = []
+    for modelo_pedido, modelo_item in FONTES:
+        consulta = filtrar_vendas(
+            select(type_coerce(modelo_pedido.total, Integer), func.coalesce(func.sum(modelo_item.quantidade), 0))
+            .outerjoin(modelo_item, modelo_item.pedido == modelo_pedido.id)
+            .group_by(modelo_pedido.id, modelo_pedido.total),
+            modelo_pedido, inicio, fim, status
+        )
+        linhas += (await session.execute(consulta)).all()
+
+    resultado = {"pedidos": len(linhas), "receita": 0.0}
+    if linhas:
+        numpy = carregar_numpy()
+        if numpy is not None:
+            colunas = numpy.array(linhas, dtype=numpy.int64)
+            totais, cestas = colunas[:, 0], colunas[:, 1]
+            receita_centavos = int(totais.sum())
+        else:
+            totais = [total for total, _ in linhas]
+            cestas = [unidades for _, unidades in linhas]
+            receita_centavos = sum(totais)
+        ticket_p50, ticket_p90, ticket_p99 = percentis(totais, (0.5, 0.9, 0.99))
+        cesta_p50, cesta_p90 = percentis(cestas, (0.5, 0.9))
+        resultado.update({
+            "receita": receita_centavos / 100,
+            "ticket_medio": round(media(totais) / 100, 2),
+            "ticket_p50": round(ticket_p50 / 100, 2),
+            "ticket_p90": round(ticket_p90 / 100, 2),
+            "ticket_p99": round(ticket_p99 / 100, 2),
+            "cesta_media": round(media(cestas), 2),
+            "cesta_p50": round(cesta_p50, 2),
+            "cesta_p90": round(cesta_p90, 2),
+        })
+    cache_analise.definir(chave, resultado)
+    return resultado
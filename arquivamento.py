@@ -0,0 +1,106 @@
+from sqlalchemy import select, insert, delete, func
+from database import SessionLocal
+from configuracoes import configuracoes
+from models import Pedido, ItemPedido, ResumoPedido, PedidoArquivado, ItemPedidoArquivado, StatusPedido
+from datetime import datetime, timedelta, timezone
+import argparse
+import asyncio
+
+# só pedidos que não podem mais mudar de status são arquivados
+STATUS_ENCERRADOS = (StatusPedido.FINALIZADO, StatusPedido.CANCELADO)
+
+
+async def arquivar_lote(session, limite, tamanho_lote):
+    """
+    Função para mover um lote de até tamanho_lote pedidos encerrados criados antes de limite (os de
+    menor id) para as tabelas de arquivo, em uma única transação curta: os pedidos são copiados com
+    INSERT ... SELECT, os itens são copiados e removidos pelos ids copiados, e por fim são removidos o
+    resumo e os pedidos. A primeira instrução já é uma escrita, então no SQLite a transação começa com
+    o bloqueio de escrita e não precisa promovê-lo no meio; no PostgreSQL os pedidos selecionados ficam
+    bloqueados (FOR UPDATE) até o commit, e os que estão sendo alterados por outra transação são
+    pulados e ficam para a próxima execução. A função retorna os ids arquivados.
+    """
+    # a data da última alteração vem do resumo do pedido, que deixa de existir no arquivo
+    atualizado_em = (
+        select(ResumoPedido.atualizado_em)
+        .filter(ResumoPedido.pedido == Pedido.id)
+        .scalar_subquery()
+    )
+    # no SQLite (tabelas sem AUTOINCREMENT) um novo registro recebe o maior id existente + 1; o pedido
+    # de maior id e o dono do item de maior id ficam na tabela de pedidos para que os ids arquivados
+    # não sejam reutilizados
+    maior_pedido = select(func.max(Pedido.id)).scalar_subquery()
+    pedido_maior_item = (
+        select(ItemPedido.pedido)
+        .filter(ItemPedido.id == select(func.max(ItemPedido.id)).scalar_subquery())
+        .scalar_subquery()
+    )
+    selecionados = (
+        select(
+            Pedido.id, Pedido.status, Pedido.usuario, Pedido.total, Pedido.qtde_itens, Pedido.versao,
+            Pedido.criado_em, func.coalesce(atualizado_em, Pedido.criado_em)
+        )
+        .filter(
+            Pedido.status.in_(STATUS_ENCERRADOS), Pedido.criado_em < limite,
+            Pedido.id < maior_pedido, Pedido.id != func.coalesce(pedido_maior_item, 0)
+        )
+        .order_by(Pedido.id)
+        .limit(tamanho_lote)
+        .with_for_update(skip_locked=True)
+    )
+    tabela = PedidoArquivado.__table__
+    ids = (await session.scalars(
+        insert(tabela)
+        .from_select(
+            [tabela.c.id, tabela.c.status, tabela.c.usuario, tabela.c.total, tabela.c.qtde_itens,
+             tabela.c.versao, tabela.c.criado_em, tabela.c.atualizado_em],
+            selecionados
+        )
+        .returning(tabela.c.id)
+    )).all()
+    if not ids:
+        return ids
+
+    itens = ItemPedidoArquivado.__table__
+    await session.execute(
+        insert(itens).from_select(
+            [itens.c.id, itens.c.quantidade, itens.c.produto, itens.c.preco_unitario, itens.c.pedido],
+            select(ItemPedido.id, ItemPedido.quantidade, ItemPedido.produto, ItemPedido.preco_unitario, ItemPedido.pedido)
+            .filter(ItemPedido.pedido.in_(ids))
+        )
+    )
+    await session.execute(delete(ItemPedido.__table__).where(ItemPedido.__table__.c.pedido.in_(ids)))
+    await session.execute(delete(ResumoPedido.__table__).where(ResumoPedido.__table__.c.pedido.in_(ids)))
+    await session.execute(delete(Pedido.__table__).where(Pedido.__table__.c.id.in_(ids)))
+    await session.commit()
+    return ids
+
+async def arquivar_pedidos(fabrica_sessao, idade_dias=configuracoes.ARQUIVAMENTO_IDADE_DIAS,
+                           tamanho_lote=configuracoes.ARQUIVAMENTO_TAMANHO_LOTE, pausa_ms=configuracoes.ARQUIVAMENTO_PAUSA_MS):
+    """
+    Função para arquivar todos os pedidos finalizados ou cancelados criados há mais de idade_dias dias.
+    Cada lote é gravado em uma sessão e transação próprias, seguidas de uma pausa de pausa_ms
+    milissegundos, de forma que as escritas da API não esperam o arquivamento inteiro, apenas um
+    lote. A função retorna a quantidade de pedidos arquivados.
+    """
+    limite = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=idade_dias)
+    quantidade = 0
+    while True:
+        async with fabrica_sessao() as session:
+            ids = await arquivar_lote(session, limite, tamanho_lote)
+        quantidade += len(ids)
+        if len(ids) < tamanho_lote:
+            return quantidade
+        await asyncio.sleep(pausa_ms / 1000)
+
+async def executar(args):
+    quantidade = await arquivar_pedidos(SessionLocal, args.idade_dias, args.tamanho_lote, args.pausa_ms)
+    print(f"{quantidade} pedido(s) arquivado(s)")
+
+if __name__ == "__main__":
+    # uso: python arquivamento.py [--idade-dias 90] [--tamanho-lote 500]
+    parser = argparse.ArgumentParser(description="Move os pedidos encerrados antigos para as tabelas de arquivo.")
+    parser.add_argument("--idade-dias", type=int, default=configuracoes.ARQUIVAMENTO_IDADE_DIAS)
+    parser.add_argument("--tamanho-lote", type=int, default=configuracoes.ARQUIVAMENTO_TAMANHO_LOTE)
+    parser.add_argument("--pausa-ms", type=float, default=configuracoes.ARQUIVAMENTO_PAUSA_MS)
+    asyncio.run(executar(parser.parse_args()))
@@ -1,50 +1,70 @@
 from fastapi import APIRouter, Depends, HTTPException
-from dependencies import getSession, verificar_token
-from models import Usuario
-from main import bcrypt_context, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
-from schemas import UsuarioSchema, LoginSchema
-from sqlalchemy.orm import Session
+from dependencies import getSession, verificar_token, carregar_usuario, oauth2_schema
+from admissao import admitir_autenticacao
+from models import Usuario, TokenRevogado
+from configuracoes import configuracoes
+from senhas import gerar_hash_senha, verificar_senha
+from metricas import medir
+from schemas import UsuarioSchema, LoginSchema, ResponseAuthHomeSchema, ResponseMensagemSchema, ResponseLoginSchema, ResponseTokenSchema
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from tokens import verificador_token, tokens_revogados
 from jose import jwt
 from datetime import datetime, timedelta, timezone
 from fastapi.security import OAuth2PasswordRequestForm
+import uuid
 
-auth_router = APIRouter(prefix="/auth", tags=["auth"])
+# todas as rotas de autenticação passam pelo limite de taxa por IP e de requisições simultâneas
+auth_router = APIRouter(prefix="/auth", tags=["auth"], dependencies=[Depends(admitir_autenticacao)])
 
-def criar_token(id_usuario, duracao_token=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)):
+def criar_token(id_usuario, duracao_token=timedelta(minutes=configuracoes.ACCESS_TOKEN_EXPIRE_MINUTES), usuario=None):
     """
     Função para criar um token JWT (JSON Web Token) para um usuário autenticado. 
     O token é criado com base no ID do usuário e tem um tempo de expiração definido
     por ACCESS_TOKEN_EXPIRE_MINUTES. A função utiliza a biblioteca jose para codificar
     o token com uma chave secreta (SECRET_KEY) e um algoritmo de criptografia (ALGORITHM).
     O token gerado pode ser usado para autenticar o usuário em rotas protegidas do sistema,
-    permitindo que ele acesse recursos autorizados.
+    permitindo que ele acesse recursos autorizados. Cada token recebe um identificador único (jti),
+    usado na revogação; no modo sem estado (TOKEN_SEM_ESTADO), quando o usuário é informado, o token
+    também leva o admin e o ativo do usuário, e a verificação dispensa a consulta ao banco de dados.
     """
     data_expericacao = datetime.now(timezone.utc) + duracao_token
     dic_info = {
         "sub": str(id_usuario),
-        "exp": data_expericacao
+        "exp": data_expericacao,
+        "jti": uuid.uuid4().hex
     }
-    encode_jwt = jwt.encode(dic_info, SECRET_KEY, ALGORITHM)
+    # só o access token, de curta duração, leva as claims: o refresh token sempre passa pelo banco
+    if configuracoes.TOKEN_SEM_ESTADO and usuario is not None:
+        dic_info["adm"] = bool(usuario.admin)
+        dic_info["atv"] = bool(usuario.ativo)
+    with medir("jwt"):
+        encode_jwt = jwt.encode(dic_info, configuracoes.SECRET_KEY, configuracoes.ALGORITHM)
     return encode_jwt
 
-def autenticar_usuario(email, senha, session):
+async def autenticar_usuario(email, senha, session):
     """
     Função para autenticar um usuário com base no email e senha fornecidos.
     Ela consulta o banco de dados para encontrar um usuário com o email
     correspondente e, em seguida, verifica se a senha fornecida corresponde
-    à senha armazenada no banco de dados usando o bcrypt_context. Se a 
+    à senha armazenada no banco de dados usando o pool de threads do bcrypt. Se a 
     autenticação for bem-sucedida, a função retorna o objeto do usuário;
-    caso contrário, retorna False.
+    caso contrário, retorna False. Quando o hash armazenado foi gerado com um
+    custo diferente do configurado, ele é substituído por um novo hash.
     """
-    usuario = session.query(Usuario).filter(Usuario.email==email).first()
+    usuario = await session.scalar(select(Usuario).filter(Usuario.email==email))
     if not usuario:
         return False
-    elif not bcrypt_context.verify(senha, usuario.senha):
+
+    senha_valida, novo_hash = await verificar_senha(senha, usuario.senha)
+    if not senha_valida:
         return False
-    else:
-        return usuario
+    elif novo_hash:
+        usuario.senha = novo_hash
+        await session.commit()
+    return usuario
 
-@auth_router.get("/")
+@auth_router.get("/", response_model=ResponseAuthHomeSchema)
 async def home():
     """
     Essa é a rota padrão de autenticação do sistema. Ela pode ser usada para verificar se a rota está funcionando corretamente ou para testar a autenticação. No futuro, essa rota pode ser expandida para incluir funcionalidades como login, logout, registro de usuários e integração com um banco de dados para armazenar as informações dos usuários.
@@ -54,21 +74,21 @@ async def home():
         "autenticado": False
     }
 
-@auth_router.post("/criar_conta")
-async def criar_conta(usuario_schema: UsuarioSchema, session: Session = Depends(getSession)):
+@auth_router.post("/criar_conta", response_model=ResponseMensagemSchema)
+async def criar_conta(usuario_schema: UsuarioSchema, session: AsyncSession = Depends(getSession)):
     """
     Essa é a rota para criar uma nova conta de usuário. Ela recebe os dados do usuário, como nome, 
     email, senha, status de ativo e admin, e verifica se um usuário com o mesmo email já existe no 
     banco de dados. Se o usuário já existir, a função levanta uma exceção HTTP 400 (Bad Request) 
     indicando que o usuário já existe. Caso contrário, a senha fornecida é criptografada usando 
-    bcrypt_context, um novo objeto de usuário é criado e adicionado ao banco de dados, e uma mensagem 
+    o pool de threads do bcrypt, um novo objeto de usuário é criado e adicionado ao banco de dados, e uma mensagem 
     de sucesso é retornada indicando que o usuário foi criado com sucesso.
     """
-    usuario = session.query(Usuario).filter(Usuario.email==usuario_schema.email).first()
+    usuario = await session.scalar(select(Usuario).filter(Usuario.email==usuario_schema.email))
     if usuario:
         raise HTTPException(status_code=400, detail="Usuário já existe")
     else:
-        senha_criptografa = bcrypt_context.hash(usuario_schema.senha)
+        senha_criptografa = await gerar_hash_senha(usuario_schema.senha)
         novo_usuario = Usuario(
             usuario_schema.nome, 
             usuario_schema.email, 
@@ -77,11 +97,11 @@ async def criar_conta(usuario_schema: UsuarioSchema, session: Session = Depends(
             usuario_schema.admin
         )
         session.add(novo_usuario)
-        session.commit()
+        await session.commit()
         return {"message": f"Usuário {usuario_schema.nome} criado com sucesso!"}
 
-@auth_router.post("/login")
-async def login(login_schema: LoginSchema, session: Session = Depends(getSession)):
+@auth_router.post("/login", response_model=ResponseLoginSchema)
+async def login(login_schema: LoginSchema, session: AsyncSession = Depends(getSession)):
     """
     Essa é a rota para realizar o login de um usuário. Ela recebe as credenciais de email e senha,
     autentica o usuário usando a função autenticar_usuario e, se a autenticação for bem-sucedida,
@@ -90,11 +110,11 @@ async def login(login_schema: LoginSchema, session: Session = Depends(getSession
     Ambos os tokens são retornados ao usuário, permitindo que ele acesse recursos protegidos do 
     sistema e atualize seu token de acesso quando necessário.
     """
-    usuario = autenticar_usuario(login_schema.email, login_schema.senha, session)
+    usuario = await autenticar_usuario(login_schema.email, login_schema.senha, session)
     if not usuario:
         raise HTTPException(status_code=400, detail="Usuário ou senha incorreto.")
     else:
-        access_token = criar_token(usuario.id)
+        access_token = criar_token(usuario.id, usuario=usuario)
         refresh_token = criar_token(usuario.id, duracao_token=timedelta(days=7))
 
         return {
@@ -103,8 +123,8 @@ async def login(login_schema: LoginSchema, session: Session = Depends(getSession
             "token_type": "Bearer"
         }
     
-@auth_router.post("/login-form")
-async def login_form(dados_form: OAuth2PasswordRequestForm = Depends(), session: Session = Depends(getSession)):
+@auth_router.post("/login-form", response_model=ResponseTokenSchema)
+async def login_form(dados_form: OAuth2PasswordRequestForm = Depends(), session: AsyncSession = Depends(getSession)):
     """
     Função para realizar o login de um usuário usando o OAuth2PasswordRequestForm, que é um formulário de 
     autenticação padrão para APIs. Ela recebe as credenciais de email e senha do formulário, autentica o 
@@ -112,28 +132,51 @@ async def login_form(dados_form: OAuth2PasswordRequestForm = Depends(), session:
     acesso (access token) para o usuário. O token é retornado ao usuário, permitindo que ele acesse recursos 
     protegidos do sistema.
     """
-    usuario = autenticar_usuario(dados_form.username, dados_form.password, session)
+    usuario = await autenticar_usuario(dados_form.username, dados_form.password, session)
     if not usuario:
         raise HTTPException(status_code=400, detail="Usuário ou senha incorreto.")
     else:
-        access_token = criar_token(usuario.id)
+        access_token = criar_token(usuario.id, usuario=usuario)
 
         return {
             "access_token": access_token,
             "token_type": "Bearer"
         }
     
-@auth_router.get("/refresh")
-async def refresh_token(usuario: Usuario = Depends(verificar_token)):
+@auth_router.get("/refresh", response_model=ResponseTokenSchema)
+async def refresh_token(usuario: Usuario = Depends(verificar_token), session: AsyncSession = Depends(getSession)):
     """
     Essa é a rota para atualizar o token de acesso (refresh token). Ela é usada para gerar um novo
     token de acesso válido para um usuário autenticado, permitindo que ele continue acessando recursos
     protegidos sem precisar fazer login novamente. A função verifica o token de acesso atual do usuário
     e, se for válido, cria um novo token de acesso com uma nova data de expiração. O novo token é 
-    retornado ao usuário, permitindo que ele continue usando os recursos autorizados do sistema.
+    retornado ao usuário, permitindo que ele continue usando os recursos autorizados do sistema. O
+    usuário é relido (cache de usuários ou banco de dados) para que as claims do novo token reflitam
+    o admin e o ativo atuais.
     """
-    access_token = criar_token(usuario.id)
+    usuario = await carregar_usuario(session, usuario.id)
+    access_token = criar_token(usuario.id, usuario=usuario)
     return {
         "access_token": access_token,
         "token_type": "Bearer"
-    }
\ No newline at end of file
+    }
+
+@auth_router.post("/logout", response_model=ResponseMensagemSchema)
+async def logout(token: str = Depends(oauth2_schema), usuario: Usuario = Depends(verificar_token), session: AsyncSession = Depends(getSession)):
+    """
+    Essa é a rota para encerrar a sessão, revogando o token enviado (access ou refresh token) antes da
+    sua expiração. O jti do token é gravado na tabela de tokens revogados, que é limpa dos tokens já
+    expirados a cada logout, e passa a ser recusado imediatamente por este processo e pelos demais
+    workers na próxima recarga da lista (TOKEN_REVOGADOS_INTERVALO).
+    """
+    payload = verificador_token.decodificar(token)
+    if payload.get("jti") is None:
+        raise HTTPException(status_code=400, detail="Token sem identificador, não pode ser revogado.")
+
+    agora = datetime.now(timezone.utc).replace(tzinfo=None)
+    # merge em vez de add: outro worker pode ter revogado o mesmo token antes da próxima recarga
+    await session.merge(TokenRevogado(jti=payload["jti"], expira_em=datetime.fromtimestamp(payload["exp"], timezone.utc).replace(tzinfo=None)))
+    await session.execute(delete(TokenRevogado).where(TokenRevogado.expira_em <= agora))
+    await session.commit()
+    tokens_revogados.adicionar(payload["jti"])
+    return {"message": "Sessão encerrada com sucesso."}
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""
+Benchmark do controle de admissão sob sobrecarga.
+
+Sobre um banco SQLite temporário, dispara uma enxurrada de logins simultâneos (limitados pelo
+bcrypt) a partir de um único IP e, ao mesmo tempo, um fluxo de leituras de pedido de outro usuário
+já autenticado. Roda duas vezes, com o controle de admissão desligado e ligado, e mostra os status
+HTTP dos logins, as latências p50/p99 dos logins aceitos e rejeitados e a latência p50/p99 das
+leituras, que não devem piorar quando a enxurrada é recusada cedo com 429/503.
+
+Uso:
+    python -m benchmarks.admissao --logins 300 --leituras 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+PASTA_TEMPORARIA = tempfile.mkdtemp(prefix="admissao_delivery_")
+os.environ.setdefault("SECRET_KEY", "chave-benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(PASTA_TEMPORARIA, 'admissao.db')}")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+
+from main import app
+from configuracoes import configuracoes
+import admissao
+from database import db
+from models import Base
+
+SENHA = "senha-benchmark"
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return round(ordenados[indice] * 1000, 2)
+
+
+async def cronometrar(cliente, metodo, rota, **kwargs):
+    inicio = time.perf_counter()
+    resposta = await cliente.request(metodo, rota, **kwargs)
+    return resposta.status_code, time.perf_counter() - inicio
+
+
+async def rodada(cliente, cabecalho, logins, leituras):
+    admissao.backend_limites.baldes.limpar()
+
+    async def leitor():
+        latencias = []
+        for _ in range(leituras):
+            _, duracao = await cronometrar(cliente, "POST", "/orders/pedido/1", headers=cabecalho)
+            latencias.append(duracao)
+        return latencias
+
+    tarefa_leituras = asyncio.create_task(leitor())
+    respostas = await asyncio.gather(*(
+        cronometrar(cliente, "POST", "/auth/login", json={"email": "flood@delivery", "senha": SENHA})
+        for _ in range(logins)
+    ))
+    latencias_leituras = await tarefa_leituras
+
+    status = {}
+    for codigo, _ in respostas:
+        status[codigo] = status.get(codigo, 0) + 1
+    aceitos = [duracao for codigo, duracao in respostas if codigo == 200]
+    rejeitados = [duracao for codigo, duracao in respostas if codigo in (429, 503)]
+    return {
+        "status_logins": status,
+        "login_aceito_ms": {"p50": percentil(aceitos, 50), "p99": percentil(aceitos, 99)},
+        "login_rejeitado_ms": {"p50": percentil(rejeitados, 50), "p99": percentil(rejeitados, 99)},
+        "leitura_ms": {"p50": percentil(latencias_leituras, 50), "p99": percentil(latencias_leituras, 99)},
+    }
+
+
+async def executar(args):
+    async with db.begin() as conexao:
+        await conexao.run_sync(Base.metadata.create_all)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://benchmark", timeout=None) as cliente:
+        for nome in ("flood", "leitor"):
+            await cliente.post("/auth/criar_conta", json={"nome": nome, "email": f"{nome}@delivery", "senha": SENHA, "ativo": True, "admin": False})
+        token = (await cliente.post("/auth/login", json={"email": "leitor@delivery", "senha": SENHA})).json()["access_token"]
+        cabecalho = {"Authorization": f"Bearer {token}"}
+        await cliente.post("/orders/pedido", json={"usuario": 2}, headers=cabecalho)
+
+        resultados = {}
+        for ativa in (False, True):
+            configuracoes.ADMISSAO_ATIVA = ativa
+            resultados["com_admissao" if ativa else "sem_admissao"] = await rodada(cliente, cabecalho, args.logins, args.leituras)
+    await db.dispose()
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=300)
+    parser.add_argument("--leituras", type=int, default=300)
+    asyncio.run(executar(parser.parse_args()))
@@ -0,0 +1,105 @@
+"""
+Benchmark do custo de autenticação por requisição.
+
+Chama verificar_token repetidamente sobre um banco SQLite temporário e mede o tempo
+médio e a quantidade de comandos SQL por chamada em quatro modos: "sem_cache", em que os
+caches de tokens e de usuários são esvaziados antes de cada chamada (decodificação do JWT +
+consulta ao banco), "com_cache", em que o token decodificado e o usuário são reaproveitados,
+e os mesmos dois casos no modo sem estado (TOKEN_SEM_ESTADO), com um access token que leva
+admin e ativo assinados e dispensa a consulta ao banco. Também compara o custo de decodificar
+o token com o jwt.decode do python-jose e com o VerificadorToken montado uma única vez.
+
+Uso:
+    python -m benchmarks.autenticacao --chamadas 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SECRET_KEY", "chave-benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from configuracoes import configuracoes
+from jose import jwt
+from auth_routes import criar_token
+from database import criar_engine, criar_fabrica_sessao
+from dependencies import verificar_token, cache_tokens, cache_usuarios
+from metricas import medicoes_requisicao
+from models import Base, Usuario
+from tokens import verificador_token
+
+
+def definir_sem_estado(ativo):
+    configuracoes.TOKEN_SEM_ESTADO = ativo
+
+
+async def medir(fabrica_sessao, token, chamadas, limpar_cache):
+    cache_tokens.limpar()
+    cache_usuarios.limpar()
+    acertos_antes = cache_usuarios.acertos
+    medicoes = {"sql_comandos": 0, "db": 0}
+    marcador = medicoes_requisicao.set(medicoes)
+    async with fabrica_sessao() as session:
+        inicio = time.perf_counter()
+        for _ in range(chamadas):
+            if limpar_cache:
+                cache_tokens.limpar()
+                cache_usuarios.limpar()
+            await verificar_token(token, session)
+        duracao = time.perf_counter() - inicio
+    medicoes_requisicao.reset(marcador)
+    return {
+        "chamadas": chamadas,
+        "microssegundos_por_chamada": round(duracao / chamadas * 1_000_000, 2),
+        "sql_por_chamada": round(medicoes["sql_comandos"] / chamadas, 3),
+        "acertos_cache_usuarios": cache_usuarios.acertos - acertos_antes,
+    }
+
+
+def medir_decodificacao(decodificar, token, chamadas):
+    inicio = time.perf_counter()
+    for _ in range(chamadas):
+        decodificar(token)
+    return round((time.perf_counter() - inicio) / chamadas * 1_000_000, 2)
+
+
+async def executar(args):
+    with tempfile.TemporaryDirectory() as pasta:
+        engine = criar_engine(f"sqlite+aiosqlite:///{os.path.join(pasta, 'autenticacao.db')}")
+        async with engine.begin() as conexao:
+            await conexao.run_sync(Base.metadata.create_all)
+        fabrica_sessao = criar_fabrica_sessao(engine)
+        async with fabrica_sessao() as session:
+            session.add(Usuario("benchmark", "benchmark@delivery", "-"))
+            await session.commit()
+
+        definir_sem_estado(False)
+        token = criar_token(1)
+        resultados = {
+            "sem_cache": await medir(fabrica_sessao, token, args.chamadas, limpar_cache=True),
+            "com_cache": await medir(fabrica_sessao, token, args.chamadas, limpar_cache=False),
+        }
+        definir_sem_estado(True)
+        async with fabrica_sessao() as session:
+            token_sem_estado = criar_token(1, usuario=await session.get(Usuario, 1))
+        resultados["sem_estado_sem_cache"] = await medir(fabrica_sessao, token_sem_estado, args.chamadas, limpar_cache=True)
+        resultados["sem_estado_com_cache"] = await medir(fabrica_sessao, token_sem_estado, args.chamadas, limpar_cache=False)
+        definir_sem_estado(False)
+        resultados["decodificacao_microssegundos"] = {
+            "jose": medir_decodificacao(lambda t: jwt.decode(t, configuracoes.SECRET_KEY, algorithms=[configuracoes.ALGORITHM]), token, args.chamadas),
+            "verificador": medir_decodificacao(verificador_token.decodificar, token, args.chamadas),
+        }
+        await engine.dispose()
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chamadas", type=int, default=5000)
+    asyncio.run(executar(parser.parse_args()))
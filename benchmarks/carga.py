@@ -0,0 +1,263 @@
+"""
+Suíte de carga reproduzível da API de delivery.
+
+Por padrão roda em processo contra o app FastAPI de main.py (transporte ASGI do httpx) usando um
+banco SQLite temporário; com --url roda contra uma instância já em execução (ex.: uvicorn). O
+banco é populado com volumes configuráveis de usuários, pedidos e itens e, em seguida, vários
+clientes simultâneos repetem um fluxo misto: login, criação de pedido, inclusão de itens,
+listagens, consulta e finalização do pedido.
+
+O resultado é um JSON com latências p50/p95/p99 por rota, vazão total, erros e pico de memória
+(RSS) do processo no modo em processo, que pode ser salvo com --saida para comparar commits.
+
+Uso:
+    python -m benchmarks.carga --usuarios 50 --pedidos-por-usuario 20 --clientes 20 --iteracoes 10
+    python -m benchmarks.carga --url http://localhost:8000 --saida resultado.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+PASTA_TEMPORARIA = tempfile.mkdtemp(prefix="carga_delivery_")
+os.environ.setdefault("SECRET_KEY", "chave-benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+# os clientes simultâneos saem do mesmo IP; o controle de admissão é medido em benchmarks.admissao
+os.environ.setdefault("ADMISSAO_ATIVA", "false")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(PASTA_TEMPORARIA, 'carga.db')}")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+
+SENHA = "senha-benchmark"
+# produtos do catálogo usados pelos clientes virtuais: (sabor, tamanho, preço)
+CARDAPIO = [
+    (sabor, tamanho, preco + acrescimo)
+    for sabor, preco in (("calabresa", 29.9), ("mussarela", 15.0), ("portuguesa", 32.5))
+    for tamanho, acrescimo in (("P", 0.0), ("M", 5.0), ("G", 10.0))
+]
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return ordenados[indice]
+
+
+class Medidor:
+    """
+    Guarda as latências e os erros de cada rota (identificada pelo método e pelo caminho
+    sem os ids) e monta o relatório final.
+    """
+
+    def __init__(self):
+        self.latencias = {}
+        self.erros = {}
+
+    async def requisicao(self, cliente, nome, metodo, rota, **kwargs):
+        inicio = time.perf_counter()
+        resposta = await cliente.request(metodo, rota, **kwargs)
+        self.latencias.setdefault(nome, []).append(time.perf_counter() - inicio)
+        if resposta.status_code >= 400:
+            self.erros[nome] = self.erros.get(nome, 0) + 1
+        return resposta
+
+    def relatorio(self, duracao):
+        rotas = {}
+        for nome, valores in sorted(self.latencias.items()):
+            rotas[nome] = {
+                "requisicoes": len(valores),
+                "erros": self.erros.get(nome, 0),
+                "p50_ms": round(percentil(valores, 50) * 1000, 3),
+                "p95_ms": round(percentil(valores, 95) * 1000, 3),
+                "p99_ms": round(percentil(valores, 99) * 1000, 3),
+                "requisicoes_por_s": round(len(valores) / duracao, 1),
+            }
+        total = sum(len(valores) for valores in self.latencias.values())
+        return {
+            "duracao_s": round(duracao, 3),
+            "requisicoes": total,
+            "erros": sum(self.erros.values()),
+            "requisicoes_por_s": round(total / duracao, 1),
+            "rotas": rotas,
+        }
+
+
+async def popular_em_processo(args):
+    """
+    Cria as tabelas no banco temporário e insere o catálogo e os volumes pedidos diretamente pelo ORM, em lote.
+    Todos os usuários compartilham o mesmo hash de senha para não gastar tempo com bcrypt.
+    """
+    from sqlalchemy import insert
+    from database import db, SessionLocal
+    from senhas import bcrypt_context
+    from models import Base, Usuario, Produto, Pedido, ItemPedido, StatusPedido
+    from resumo_pedidos import reconstruir_resumos
+
+    async with db.begin() as conexao:
+        await conexao.run_sync(Base.metadata.create_all)
+
+    senha_hash = bcrypt_context.hash(SENHA)
+    async with SessionLocal() as session:
+        await session.execute(insert(Usuario), [
+            {"nome": f"usuario{i}", "email": f"usuario{i}@carga", "senha": senha_hash, "ativo": True, "admin": i == 0}
+            for i in range(args.usuarios)
+        ])
+        ids_produtos = (await session.scalars(insert(Produto).returning(Produto.id), [
+            {"sabor": sabor, "tamanho": tamanho, "preco": preco, "disponivel": True, "versao": 1}
+            for sabor, tamanho, preco in CARDAPIO
+        ])).all()
+        # a mussarela G custa 25,00
+        id_produto = ids_produtos[CARDAPIO.index(("mussarela", "G", 25.0))]
+        valor_pedido = args.itens_por_pedido * 25.0
+        ids_pedidos = (await session.scalars(insert(Pedido).returning(Pedido.id), [
+            {"usuario": usuario, "status": StatusPedido.PENDENTE, "total": valor_pedido, "qtde_itens": args.itens_por_pedido}
+            for usuario in range(1, args.usuarios + 1)
+            for _ in range(args.pedidos_por_usuario)
+        ])).all() if args.pedidos_por_usuario else []
+        for inicio in range(0, len(ids_pedidos), 1000):
+            await session.execute(insert(ItemPedido), [
+                {"pedido": id_pedido, "quantidade": 1, "produto": id_produto, "preco_unitario": 25.0}
+                for id_pedido in ids_pedidos[inicio:inicio + 1000]
+                for _ in range(args.itens_por_pedido)
+            ])
+        await session.commit()
+        await reconstruir_resumos(session)
+
+
+async def popular_remoto(cliente, args):
+    """
+    Popula uma instância em execução pela própria API, criando usuários, o catálogo (pelo
+    administrador usuario0; produtos já cadastrados são mantidos), pedidos e itens.
+    """
+    for i in range(args.usuarios):
+        await cliente.post("/auth/criar_conta", json={
+            "nome": f"usuario{i}", "email": f"usuario{i}@carga", "senha": SENHA, "ativo": True, "admin": i == 0
+        })
+        resposta = await cliente.post("/auth/login", json={"email": f"usuario{i}@carga", "senha": SENHA})
+        cabecalho = {"Authorization": f"Bearer {resposta.json()['access_token']}"}
+        id_usuario = int(obter_id_usuario(resposta.json()["access_token"]))
+        if i == 0:
+            for sabor, tamanho, preco in CARDAPIO:
+                await cliente.post("/catalog/produto", headers=cabecalho, json={"sabor": sabor, "tamanho": tamanho, "preco": preco})
+        for _ in range(args.pedidos_por_usuario):
+            id_pedido = (await cliente.post("/orders/pedido", json={"usuario": id_usuario}, headers=cabecalho)).json()["pedido_id"]
+            await cliente.post(f"/orders/pedido/itens/{id_pedido}", headers=cabecalho, json={"adicionar": [
+                {"quantidade": 1, "sabor": "mussarela", "tamanho": "G"}
+            ] * args.itens_por_pedido})
+
+
+def obter_id_usuario(token):
+    from jose import jwt
+    return jwt.get_unverified_claims(token)["sub"]
+
+
+async def fluxo_cliente(cliente, medidor, args, semente):
+    """
+    Fluxo de um cliente virtual: faz login e, a cada iteração, cria um pedido, adiciona itens um
+    a um e em lote, lista os próprios pedidos (completos e pelo resumo), consulta e finaliza o pedido. O administrador
+    (usuario0) também usa a listagem paginada geral.
+    """
+    aleatorio = random.Random(semente)
+    indice_usuario = semente % args.usuarios
+    resposta = await medidor.requisicao(cliente, "POST /auth/login", "POST", "/auth/login",
+                                        json={"email": f"usuario{indice_usuario}@carga", "senha": SENHA})
+    token = resposta.json()["access_token"]
+    id_usuario = int(obter_id_usuario(token))
+    cabecalho = {"Authorization": f"Bearer {token}"}
+
+    for _ in range(args.iteracoes):
+        resposta = await medidor.requisicao(cliente, "POST /orders/pedido", "POST", "/orders/pedido",
+                                            json={"usuario": id_usuario}, headers=cabecalho)
+        id_pedido = resposta.json()["pedido_id"]
+        for _ in range(args.itens_por_iteracao):
+            await medidor.requisicao(cliente, "POST /orders/pedido/adicionar_item/{id}", "POST",
+                                     f"/orders/pedido/adicionar_item/{id_pedido}", headers=cabecalho, json={
+                                         "quantidade": aleatorio.randint(1, 3), "sabor": "calabresa",
+                                         "tamanho": aleatorio.choice(["P", "M", "G"])
+                                     })
+        await medidor.requisicao(cliente, "POST /orders/pedido/itens/{id}", "POST", f"/orders/pedido/itens/{id_pedido}",
+                                 headers=cabecalho, json={"adicionar": [
+                                     {"quantidade": 1, "sabor": "portuguesa", "tamanho": "M"}
+                                 ] * args.itens_por_iteracao})
+        await medidor.requisicao(cliente, "POST /orders/listar/pedidos_usuario", "POST",
+                                 "/orders/listar/pedidos_usuario", headers=cabecalho)
+        await medidor.requisicao(cliente, "POST /orders/listar/meus_pedidos", "POST",
+                                 "/orders/listar/meus_pedidos", headers=cabecalho)
+        if indice_usuario == 0:
+            await medidor.requisicao(cliente, "POST /orders/listar", "POST", "/orders/listar", headers=cabecalho)
+        await medidor.requisicao(cliente, "POST /orders/pedido/{id}", "POST", f"/orders/pedido/{id_pedido}", headers=cabecalho)
+        await medidor.requisicao(cliente, "POST /orders/pedido/finalizar/{id}", "POST",
+                                 f"/orders/pedido/finalizar/{id_pedido}", headers=cabecalho)
+
+
+def commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        return None
+
+
+async def executar(args):
+    if args.url:
+        cliente = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        from main import app
+        await popular_em_processo(args)
+        cliente = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://carga", timeout=60)
+
+    medidor = Medidor()
+    async with cliente:
+        if args.url:
+            await popular_remoto(cliente, args)
+        inicio = time.perf_counter()
+        await asyncio.gather(*(fluxo_cliente(cliente, medidor, args, semente) for semente in range(args.clientes)))
+        duracao = time.perf_counter() - inicio
+
+    relatorio = {
+        "commit": commit_atual(),
+        "alvo": args.url or "em_processo",
+        "parametros": {
+            "usuarios": args.usuarios,
+            "pedidos_por_usuario": args.pedidos_por_usuario,
+            "itens_por_pedido": args.itens_por_pedido,
+            "clientes": args.clientes,
+            "iteracoes": args.iteracoes,
+            "itens_por_iteracao": args.itens_por_iteracao,
+        },
+        **medidor.relatorio(duracao),
+        # no Linux ru_maxrss é informado em KiB; contra uma instância remota o RSS do servidor não é visível daqui
+        "pico_rss_mib": None if args.url else round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if not args.url:
+        from database import db
+        await db.dispose()
+    shutil.rmtree(PASTA_TEMPORARIA, ignore_errors=True)
+
+    saida = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(saida)
+    print(saida)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="URL de uma instância em execução; sem ela o teste roda em processo")
+    parser.add_argument("--usuarios", type=int, default=20)
+    parser.add_argument("--pedidos-por-usuario", type=int, default=10)
+    parser.add_argument("--itens-por-pedido", type=int, default=5)
+    parser.add_argument("--clientes", type=int, default=10)
+    parser.add_argument("--iteracoes", type=int, default=5)
+    parser.add_argument("--itens-por-iteracao", type=int, default=3)
+    parser.add_argument("--saida", help="arquivo onde o relatório JSON também será gravado")
+    asyncio.run(executar(parser.parse_args()))
@@ -0,0 +1,94 @@
+"""
+Benchmark da resolução dos produtos dos itens de pedido.
+
+Compara, para cada item incluído em um pedido, a busca do produto (id, preço e disponibilidade)
+por sabor e tamanho com uma consulta ao banco de dados, como seria sem o índice, com a resolução
+pelo índice de preços em memória do catálogo, do jeito que as rotas de itens fazem (conferência
+da versão do catálogo limitada pelo intervalo e busca no dicionário). Também mede o tempo de
+recarregar o índice depois de uma alteração no catálogo.
+
+Uso:
+    python -m benchmarks.catalogo --sabores 50 --repeticoes 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SECRET_KEY", "chave-benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import insert, select, update
+from database import criar_engine, criar_fabrica_sessao
+from models import Base, Produto, VersaoCatalogo
+from catalogo import catalogo_produtos
+
+TAMANHOS = ("P", "M", "G")
+
+
+async def executar(args):
+    with tempfile.TemporaryDirectory() as pasta:
+        engine = criar_engine(f"sqlite+aiosqlite:///{os.path.join(pasta, 'catalogo.db')}")
+        async with engine.begin() as conexao:
+            await conexao.run_sync(Base.metadata.create_all)
+        fabrica_sessao = criar_fabrica_sessao(engine)
+
+        aleatorio = random.Random(0)
+        produtos = [(f"sabor{indice}", tamanho) for indice in range(args.sabores) for tamanho in TAMANHOS]
+        buscas = [aleatorio.choice(produtos) for _ in range(args.repeticoes)]
+        async with fabrica_sessao() as session:
+            await session.execute(insert(Produto), [
+                {"sabor": sabor, "tamanho": tamanho, "preco": 30.0, "disponivel": True, "versao": 1}
+                for sabor, tamanho in produtos
+            ])
+            await session.execute(VersaoCatalogo.incrementar())
+            await session.commit()
+
+            inicio = time.perf_counter()
+            for sabor, tamanho in buscas:
+                (await session.execute(
+                    select(Produto.id, Produto.preco, Produto.disponivel)
+                    .filter(Produto.sabor == sabor, Produto.tamanho == tamanho)
+                )).first()
+            duracao_banco = time.perf_counter() - inicio
+
+            await catalogo_produtos.atualizar(session, forcar=True)
+            inicio = time.perf_counter()
+            for sabor, tamanho in buscas:
+                (await catalogo_produtos.atualizar(session)).resolver(sabor=sabor, tamanho=tamanho)
+            duracao_indice = time.perf_counter() - inicio
+
+            # uma alteração de preço gera uma nova versão, e o índice inteiro é montado de novo
+            recargas = []
+            for _ in range(args.recargas):
+                versao = await session.scalar(VersaoCatalogo.incrementar())
+                await session.execute(update(Produto).filter(Produto.id == 1).values(versao=versao))
+                await session.commit()
+                inicio = time.perf_counter()
+                await catalogo_produtos.atualizar(session, forcar=True)
+                recargas.append(time.perf_counter() - inicio)
+        await engine.dispose()
+
+    print(json.dumps({
+        "produtos": len(produtos),
+        "buscas": args.repeticoes,
+        "banco_us_por_item": round(duracao_banco / args.repeticoes * 1_000_000, 2),
+        "indice_us_por_item": round(duracao_indice / args.repeticoes * 1_000_000, 2),
+        "aceleracao": round(duracao_banco / duracao_indice, 1),
+        "recarga_indice_ms": round(sorted(recargas)[len(recargas) // 2] * 1000, 3),
+        "versao_catalogo": catalogo_produtos.indice.versao,
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sabores", type=int, default=50)
+    parser.add_argument("--repeticoes", type=int, default=5000)
+    parser.add_argument("--recargas", type=int, default=20)
+    asyncio.run(executar(parser.parse_args()))
@@ -0,0 +1,167 @@
+"""
+Benchmark de vazão concorrente do acesso ao banco de dados.
+
+Compara o caminho síncrono usado antes (Session do SQLAlchemy chamada de dentro
+de rotas "async def", bloqueando o event loop) com o caminho atual baseado em
+AsyncSession/aiosqlite. As duas versões atendem a mesma mistura de leituras
+(POST /orders/pedido/{id}) e escritas (POST /orders/pedido/adicionar_item/{id})
+sobre um banco SQLite temporário, com várias requisições simultâneas.
+
+Uso:
+    python -m benchmarks.concorrencia_banco --requisicoes 500 --concorrencia 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SECRET_KEY", "chave-benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+# os clientes simultâneos saem do mesmo IP; o controle de admissão é medido em benchmarks.admissao
+os.environ.setdefault("ADMISSAO_ATIVA", "false")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from jose import jwt
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from main import app
+from configuracoes import configuracoes
+from auth_routes import criar_token
+from dependencies import getSession, oauth2_schema
+from database import criar_engine, criar_fabrica_sessao
+from models import Base, Usuario, Produto, VersaoCatalogo, Pedido, ItemPedido
+
+
+def criar_app_sincrono(url):
+    """
+    Reproduz o padrão antigo: rotas "async def" que usam uma Session síncrona,
+    de modo que cada consulta e commit bloqueia o event loop.
+    """
+    engine = create_engine(url)
+    app_sincrono = FastAPI()
+
+    def sessao_sincrona():
+        session = sessionmaker(bind=engine)()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def usuario_sincrono(token: str = Depends(oauth2_schema), session: Session = Depends(sessao_sincrona)):
+        id_usuario = int(jwt.decode(token, configuracoes.SECRET_KEY, algorithms=[configuracoes.ALGORITHM]).get("sub"))
+        return session.query(Usuario).filter(Usuario.id==id_usuario).first()
+
+    @app_sincrono.post("/orders/pedido/{id_pedido}")
+    async def obter_pedido(id_pedido: int, session: Session = Depends(sessao_sincrona), usuario: Usuario = Depends(usuario_sincrono)):
+        pedido = session.query(Pedido).filter(Pedido.id==id_pedido).first()
+        if not pedido:
+            raise HTTPException(status_code=400, detail="Pedido não encontrado")
+        return {"qtde_itens": len(pedido.itens), "pedido": pedido}
+
+    @app_sincrono.post("/orders/pedido/adicionar_item/{id_pedido}")
+    async def adicionar_item_pedido(id_pedido: int, session: Session = Depends(sessao_sincrona), usuario: Usuario = Depends(usuario_sincrono)):
+        pedido = session.query(Pedido).filter(Pedido.id==id_pedido).first()
+        session.add(ItemPedido(id_pedido, 1, 1, 10.0))
+        pedido.total = sum(item.quantidade * item.preco_unitario for item in pedido.itens)
+        session.commit()
+        return {"pedido_total": pedido.total}
+
+    return app_sincrono
+
+
+async def preparar_banco(url_async):
+    engine = criar_engine(url_async)
+    async with engine.begin() as conexao:
+        await conexao.run_sync(Base.metadata.create_all)
+    async with criar_fabrica_sessao(engine)() as session:
+        session.add(Usuario("benchmark", "benchmark@delivery", "-", admin=True))
+        session.add(Produto(sabor="calabresa", tamanho="G", preco=10.0, versao=1))
+        await session.execute(VersaoCatalogo.incrementar())
+        await session.flush()
+        for _ in range(20):
+            session.add(Pedido(usuario=1))
+        await session.flush()
+        for id_pedido in range(1, 21):
+            for _ in range(10):
+                session.add(ItemPedido(id_pedido, 1, 1, 10.0))
+        await session.commit()
+    return engine
+
+
+async def disparar(aplicacao, requisicoes, concorrencia, fracao_escrita):
+    cabecalho = {"Authorization": f"Bearer {criar_token(1)}"}
+    semaforo = asyncio.Semaphore(concorrencia)
+    transporte = httpx.ASGITransport(app=aplicacao)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://benchmark") as cliente:
+        async def uma(indice):
+            id_pedido = indice % 20 + 1
+            escrita = (indice % 100) < fracao_escrita * 100
+            rota = f"/orders/pedido/adicionar_item/{id_pedido}" if escrita else f"/orders/pedido/{id_pedido}"
+            async with semaforo:
+                resposta = await cliente.post(rota, headers=cabecalho, json={
+                    "quantidade": 1, "produto": 1
+                })
+                resposta.raise_for_status()
+
+        # mede o maior atraso do event loop durante a carga: com a Session síncrona
+        # cada consulta bloqueia o loop e esse atraso cresce junto com o banco
+        atrasos = []
+        ativo = True
+
+        async def sonda():
+            while ativo:
+                antes = time.perf_counter()
+                await asyncio.sleep(0.001)
+                atrasos.append(time.perf_counter() - antes - 0.001)
+
+        tarefa_sonda = asyncio.create_task(sonda())
+        inicio = time.perf_counter()
+        await asyncio.gather(*(uma(i) for i in range(requisicoes)))
+        duracao = time.perf_counter() - inicio
+        ativo = False
+        await tarefa_sonda
+        return duracao, max(atrasos, default=0.0)
+
+
+async def executar(args):
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        for modo in ("antes_sincrono", "depois_assincrono"):
+            caminho = os.path.join(pasta, f"{modo}.db")
+            engine = await preparar_banco(f"sqlite+aiosqlite:///{caminho}")
+            if modo == "antes_sincrono":
+                aplicacao = criar_app_sincrono(f"sqlite:///{caminho}")
+            else:
+                fabrica_sessao = criar_fabrica_sessao(engine)
+
+                async def sessao_benchmark():
+                    async with fabrica_sessao() as session:
+                        yield session
+                app.dependency_overrides[getSession] = sessao_benchmark
+                aplicacao = app
+            duracao, atraso_maximo = await disparar(aplicacao, args.requisicoes, args.concorrencia, args.fracao_escrita)
+            app.dependency_overrides.clear()
+            await engine.dispose()
+            resultados[modo] = {
+                "requisicoes": args.requisicoes,
+                "concorrencia": args.concorrencia,
+                "duracao_s": round(duracao, 4),
+                "requisicoes_por_s": round(args.requisicoes / duracao, 1),
+                "atraso_max_event_loop_ms": round(atraso_maximo * 1000, 2),
+            }
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requisicoes", type=int, default=500)
+    parser.add_argument("--concorrencia", type=int, default=50)
+    parser.add_argument("--fracao-escrita", type=float, default=0.2)
+    asyncio.run(executar(parser.parse_args()))
@@ -0,0 +1,93 @@
+"""
+Verificação do número de consultas SQL por requisição nas rotas de leitura de pedidos.
+
+Para volumes crescentes de pedidos (cada um com vários itens) de um mesmo usuário, conta os
+comandos SQL executados por POST /orders/listar/pedidos_usuario e POST /orders/pedido/{id}.
+O número de consultas precisa ser o mesmo para qualquer volume: se crescer junto com a
+quantidade de pedidos, há um problema de N+1 e o script termina com código de saída 1.
+
+Uso:
+    python -m benchmarks.contagem_consultas --volumes 1 10 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("SECRET_KEY", "chave-benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+from sqlalchemy import event
+
+from main import app
+from auth_routes import criar_token
+from database import criar_engine, criar_fabrica_sessao
+from dependencies import getSession
+from models import Base, Usuario, Produto, VersaoCatalogo, Pedido, ItemPedido
+from catalogo import obter_catalogo_produtos
+
+
+async def contar_consultas(volume, pasta, itens_por_pedido):
+    engine = criar_engine(f"sqlite+aiosqlite:///{os.path.join(pasta, f'consultas_{volume}.db')}")
+    async with engine.begin() as conexao:
+        await conexao.run_sync(Base.metadata.create_all)
+    fabrica_sessao = criar_fabrica_sessao(engine)
+    async with fabrica_sessao() as session:
+        session.add(Usuario("consultas", "consultas@delivery", "-"))
+        session.add(Produto(sabor="mussarela", tamanho="M", preco=10.0, versao=1))
+        await session.execute(VersaoCatalogo.incrementar())
+        await session.flush()
+        for _ in range(volume):
+            pedido = Pedido(usuario=1)
+            session.add(pedido)
+            await session.flush()
+            for _ in range(itens_por_pedido):
+                session.add(ItemPedido(pedido.id, 1, 1, 10.0))
+        await session.commit()
+        # o índice do catálogo é carregado no lifespan, que não roda no transporte ASGI do httpx
+        await obter_catalogo_produtos(app).atualizar(session, forcar=True)
+
+    async def sessao_verificacao():
+        async with fabrica_sessao() as session:
+            yield session
+    app.dependency_overrides[getSession] = sessao_verificacao
+
+    comandos = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: comandos.append(args[2]))
+    cabecalho = {"Authorization": f"Bearer {criar_token(1)}"}
+    resultado = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://verificacao") as cliente:
+        # a primeira requisição aquece o cache de autenticação e não é contada
+        (await cliente.get("/orders/", headers=cabecalho)).raise_for_status()
+        for nome, rota in (("listar_pedidos_usuario", "/orders/listar/pedidos_usuario"), ("obter_pedido", "/orders/pedido/1")):
+            comandos.clear()
+            resposta = await cliente.post(rota, headers=cabecalho)
+            resposta.raise_for_status()
+            resultado[nome] = len(comandos)
+
+    app.dependency_overrides.clear()
+    await engine.dispose()
+    return resultado
+
+
+async def executar(args):
+    with tempfile.TemporaryDirectory() as pasta:
+        resultados = {volume: await contar_consultas(volume, pasta, args.itens_por_pedido) for volume in args.volumes}
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+    constantes = all(contagem == resultados[args.volumes[0]] for contagem in resultados.values())
+    if not constantes:
+        print("O número de consultas por requisição cresce com a quantidade de pedidos (N+1).")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--volumes", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--itens-por-pedido", type=int, default=5)
+    asyncio.run(executar(parser.parse_args()))
@@ -0,0 +1,134 @@
+"""
+Benchmark de escritas por segundo com e sem o agrupamento de commits (group commit).
+
+Várias requisições simultâneas criam pedidos e adicionam itens pelas rotas HTTP, como em um pico
+de pedidos, em um app montado com create_app() e as configurações padrão da engine (pool de
+conexões incluído). No modo "individual" (GRAVACAO_LOTE desligado) cada requisição grava e faz o
+commit na própria sessão; no modo "lote" as escritas passam pelo gravador em lote do app, que grava
+várias delas em uma só transação, enquanto as requisições esperam sem prender uma conexão do pool.
+O banco é um SQLite temporário; --synchronous FULL faz cada commit esperar o fsync, o que deixa
+visível o custo economizado pelo agrupamento.
+
+Uso:
+    python -m benchmarks.gravacao --escritas 2000 --concorrencia 100 --janela-ms 5 --tamanho-lote 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SECRET_KEY", "chave-benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+# o controle de admissão recusaria (429) parte das escritas do pico simulado
+os.environ.setdefault("ADMISSAO_ATIVA", "false")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+from sqlalchemy import event, select
+
+from auth_routes import criar_token
+from configuracoes import configuracoes
+from database import criar_engine
+from main import create_app
+from models import Base, Usuario, Produto, VersaoCatalogo, Pedido
+
+
+def percentil(valores, fracao):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * fracao))]
+
+
+async def medir_modo(modo, caminho, args):
+    configuracoes_app = configuracoes.model_copy(update={
+        "DATABASE_URL": f"sqlite+aiosqlite:///{caminho}",
+        "GRAVACAO_LOTE": modo == "lote",
+        "GRAVACAO_LOTE_JANELA_MS": args.janela_ms,
+        "GRAVACAO_LOTE_TAMANHO": args.tamanho_lote,
+    })
+    engine = criar_engine(configuracoes=configuracoes_app)
+    async with engine.begin() as conexao:
+        await conexao.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+
+    app = create_app(configuracoes_app)
+    async with app.router.lifespan_context(app):
+        # o PRAGMA é aplicado depois dos da engine do app, nas conexões abertas depois do descarte do pool
+        def ajustar_synchronous(conexao_dbapi, registro_conexao):
+            cursor = conexao_dbapi.cursor()
+            cursor.execute(f"PRAGMA synchronous={args.synchronous}")
+            cursor.close()
+        event.listen(app.state.engine.sync_engine, "connect", ajustar_synchronous)
+        await app.state.engine.dispose()
+
+        async with app.state.fabrica_sessao() as session:
+            session.add(Usuario("benchmark", "benchmark@delivery", "-", admin=True))
+            session.add(Produto(sabor="calabresa", tamanho="G", preco=45.9, versao=1))
+            await session.execute(VersaoCatalogo.incrementar())
+            await session.commit()
+
+        cabecalho = {"Authorization": f"Bearer {criar_token(1)}"}
+        semaforo = asyncio.Semaphore(args.concorrencia)
+        latencias = []
+        erros = 0
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=None) as cliente:
+            # a primeira requisição aquece o cache de autenticação e não é medida
+            (await cliente.get("/orders/", headers=cabecalho)).raise_for_status()
+
+            async def uma(indice):
+                nonlocal erros
+                async with semaforo:
+                    inicio = time.perf_counter()
+                    # metade das escritas cria pedidos e a outra metade adiciona um item ao pedido criado
+                    if indice % 2 == 0:
+                        resposta = await cliente.post("/orders/pedido", json={"usuario": 1}, headers=cabecalho)
+                    else:
+                        resposta = await cliente.post(f"/orders/pedido/adicionar_item/{indice // 2 + 1}", json={"quantidade": 1, "produto": 1}, headers=cabecalho)
+                    if resposta.status_code != 200:
+                        erros += 1
+                    latencias.append(time.perf_counter() - inicio)
+
+            inicio = time.perf_counter()
+            # os pedidos são criados antes dos itens que dependem deles
+            await asyncio.gather(*(uma(indice) for indice in range(0, args.escritas, 2)))
+            await asyncio.gather(*(uma(indice) for indice in range(1, args.escritas, 2)))
+            duracao = time.perf_counter() - inicio
+
+        async with app.state.fabrica_sessao() as session:
+            soma_itens = sum((await session.scalars(select(Pedido.qtde_itens))).all())
+        gravador = app.state.gravador_lote
+        resultado = {
+            "escritas": args.escritas,
+            "erros": erros,
+            "itens_gravados": soma_itens,
+            "duracao_s": round(duracao, 4),
+            "escritas_por_s": round(args.escritas / duracao, 1),
+            "latencia_p50_ms": round(percentil(latencias, 0.50) * 1000, 2),
+            "latencia_p99_ms": round(percentil(latencias, 0.99) * 1000, 2),
+        }
+        if gravador is not None:
+            resultado["lotes"] = gravador.lotes
+            resultado["media_por_lote"] = round(gravador.operacoes / max(gravador.lotes, 1), 1)
+    return resultado
+
+
+async def executar(args):
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        for modo in ("individual", "lote"):
+            resultados[modo] = await medir_modo(modo, os.path.join(pasta, f"{modo}.db"), args)
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escritas", type=int, default=2000)
+    parser.add_argument("--concorrencia", type=int, default=100)
+    parser.add_argument("--janela-ms", type=float, default=5)
+    parser.add_argument("--tamanho-lote", type=int, default=100)
+    parser.add_argument("--synchronous", choices=("OFF", "NORMAL", "FULL"), default="FULL")
+    asyncio.run(executar(parser.parse_args()))
@@ -0,0 +1,169 @@
+"""
+Benchmark do tempo de inicialização a frio (cold start) de um worker.
+
+Em processos Python novos, como os que o uvicorn cria a cada worker, mede o tempo de importar
+main.py, de montar o app com create_app() (importação das rotas, do SQLAlchemy, do bcrypt e do
+JWT) e de executar o lifespan (criação da engine, aquecimento do pool de conexões e carga do
+catálogo de produtos), repetindo a medição várias vezes. Em seguida sobe o uvicorn com
+"main:create_app --factory" e --workers N e mede o tempo desde o início do processo até todos os
+workers responderem. O script termina com
+código de saída 1 se a mediana do tempo total de um worker ou a subida do uvicorn passar da meta.
+
+Como os workers sobem em paralelo, a meta do uvicorn, se não for informada, é a meta de um worker
+vezes a quantidade de workers por núcleo de CPU, mais 1500 ms para o processo supervisor e a
+importação do próprio uvicorn em cada worker.
+
+Uso:
+    python -m benchmarks.inicializacao --repeticoes 10 --workers 4 --meta-worker-ms 1500
+"""
+import argparse
+import json
+import math
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# executado uma vez antes das medições: o lifespan carrega o catálogo de produtos, então o banco
+# temporário precisa das tabelas
+CRIACAO_TABELAS = """
+import asyncio
+from database import criar_engine
+from models import Base
+
+async def criar():
+    engine = criar_engine()
+    async with engine.begin() as conexao:
+        await conexao.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+
+asyncio.run(criar())
+"""
+
+# executado em um processo novo: imprime as durações (ms) de cada etapa da inicialização
+MEDICAO_WORKER = """
+import asyncio, json, time
+inicio = time.perf_counter()
+import main
+importado = time.perf_counter()
+app = main.create_app()
+montado = time.perf_counter()
+
+async def lifespan():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+pronto = asyncio.run(lifespan())
+print(json.dumps({
+    "importar_main": (importado - inicio) * 1000,
+    "create_app": (montado - importado) * 1000,
+    "lifespan": (pronto - montado) * 1000,
+    "total": (pronto - inicio) * 1000,
+}))
+"""
+
+
+def porta_livre():
+    with socket.socket() as conexao:
+        conexao.bind(("127.0.0.1", 0))
+        return conexao.getsockname()[1]
+
+
+def medir_worker(ambiente, repeticoes):
+    etapas = {}
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, "-c", MEDICAO_WORKER], cwd=RAIZ, env=ambiente, capture_output=True, text=True, check=True)
+        for etapa, duracao in json.loads(saida.stdout.strip().splitlines()[-1]).items():
+            etapas.setdefault(etapa, []).append(duracao)
+    return {
+        etapa: {"p50": round(statistics.median(duracoes), 1), "max": round(max(duracoes), 1)}
+        for etapa, duracoes in etapas.items()
+    }
+
+
+def medir_uvicorn(ambiente, workers, limite_segundos=60):
+    """
+    Sobe o uvicorn com a fábrica do app e consulta /metrics até que todos os workers tenham
+    respondido. Um worker só atende depois de concluir o lifespan e cada um informa o próprio
+    pid em delivery_processo_pid, então basta contar os processos distintos que responderam.
+    """
+    porta = porta_livre()
+    inicio = time.perf_counter()
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:create_app", "--factory", "--workers", str(workers),
+         "--port", str(porta), "--log-level", "warning"],
+        cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    primeira_resposta = None
+    pids = set()
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{porta}", timeout=1) as cliente:
+            while len(pids) < workers and time.perf_counter() - inicio < limite_segundos:
+                try:
+                    # sem keep-alive, cada consulta pode ser atendida por um worker diferente
+                    resposta = cliente.get("/metrics", headers={"Connection": "close"})
+                except httpx.TransportError:
+                    time.sleep(0.01)
+                    continue
+                if primeira_resposta is None:
+                    primeira_resposta = time.perf_counter()
+                for linha in resposta.text.splitlines():
+                    if linha.startswith("delivery_processo_pid "):
+                        pids.add(linha.split()[1])
+        todos_prontos = time.perf_counter()
+    finally:
+        servidor.terminate()
+        servidor.wait()
+    return {
+        "workers": workers,
+        "workers_prontos": len(pids),
+        "primeira_resposta_ms": round((primeira_resposta - inicio) * 1000, 1) if primeira_resposta else None,
+        "todos_workers_ms": round((todos_prontos - inicio) * 1000, 1) if len(pids) == workers else None,
+    }
+
+
+def executar(args):
+    with tempfile.TemporaryDirectory() as pasta:
+        ambiente = dict(
+            os.environ,
+            SECRET_KEY=os.environ.get("SECRET_KEY", "chave-benchmark"),
+            ALGORITHM=os.environ.get("ALGORITHM", "HS256"),
+            ACCESS_TOKEN_EXPIRE_MINUTES=os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", "30"),
+            DATABASE_URL=f"sqlite+aiosqlite:///{os.path.join(pasta, 'inicializacao.db')}",
+        )
+        subprocess.run([sys.executable, "-c", CRIACAO_TABELAS], cwd=RAIZ, env=ambiente, check=True)
+        worker = medir_worker(ambiente, args.repeticoes)
+        uvicorn = medir_uvicorn(ambiente, args.workers)
+
+    meta_uvicorn_ms = args.meta_uvicorn_ms
+    if meta_uvicorn_ms is None:
+        meta_uvicorn_ms = args.meta_worker_ms * math.ceil(args.workers / (os.cpu_count() or 1)) + 1500
+    resultado = {
+        "worker_ms": worker,
+        "uvicorn": uvicorn,
+        "meta_worker_ms": args.meta_worker_ms,
+        "meta_uvicorn_ms": meta_uvicorn_ms,
+        "dentro_da_meta": (
+            worker["total"]["p50"] <= args.meta_worker_ms
+            and uvicorn["todos_workers_ms"] is not None
+            and uvicorn["todos_workers_ms"] <= meta_uvicorn_ms
+        ),
+    }
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    return 0 if resultado["dentro_da_meta"] else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--meta-worker-ms", type=float, default=1500)
+    parser.add_argument("--meta-uvicorn-ms", type=float, default=None)
+    sys.exit(executar(parser.parse_args()))
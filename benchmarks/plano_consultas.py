@@ -0,0 +1,83 @@
+"""
+Verificação do plano de execução (EXPLAIN QUERY PLAN) das consultas mais frequentes de pedidos.
+
+Cria o esquema em um banco SQLite temporário, com os índices declarados em models.py, e confere
+que as consultas usadas pelas rotas de pedidos (pedidos por usuário, listagens por status com
+cursor, carregamento dos itens de um ou vários pedidos, leituras no arquivo de pedidos) e a busca
+das tarefas pendentes pelos workers da fila buscam as
+linhas por índice em vez de percorrer a tabela inteira (SCAN). Se alguma consulta fizer uma
+varredura completa, o script termina com código de saída 1.
+
+Uso:
+    python -m benchmarks.plano_consultas
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("SECRET_KEY", "chave-benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects import sqlite
+
+from database import criar_engine
+from models import Base, Pedido, ItemPedido, ResumoPedido, PedidoArquivado, ItemPedidoArquivado, StatusPedido, Tarefa
+
+CONSULTAS = {
+    "pedidos_usuario": select(Pedido).filter(Pedido.usuario == 1),
+    "etag_pedidos_usuario": select(func.count(Pedido.id), func.max(Pedido.id), func.sum(Pedido.versao)).filter(Pedido.usuario == 1),
+    "pedidos_usuario_cursor": select(Pedido).filter(Pedido.usuario == 1, Pedido.id > 100).order_by(Pedido.id).limit(51),
+    "pedidos_status_cursor": select(Pedido).filter(Pedido.status == StatusPedido.PENDENTE, Pedido.id > 100).order_by(Pedido.id).limit(51),
+    "pedidos_abertos_usuario": select(Pedido).filter(Pedido.status == StatusPedido.PENDENTE, Pedido.usuario == 1),
+    "resumo_pedidos_usuario_cursor": select(ResumoPedido).filter(ResumoPedido.usuario == 1, ResumoPedido.pedido < 100).order_by(ResumoPedido.pedido.desc()).limit(51),
+    "itens_pedido": select(ItemPedido).filter(ItemPedido.pedido == 1),
+    "itens_varios_pedidos": select(ItemPedido).filter(ItemPedido.pedido.in_([1, 2, 3])),
+    "pedido_arquivado": select(PedidoArquivado).filter(PedidoArquivado.id == 1),
+    "itens_pedido_arquivado": select(ItemPedidoArquivado).filter(ItemPedidoArquivado.pedido == 1),
+    "arquivados_usuario_cursor": select(PedidoArquivado).filter(PedidoArquivado.usuario == 1, PedidoArquivado.id < 100).order_by(PedidoArquivado.id.desc()).limit(51),
+    "encerrados_para_arquivar": select(Pedido.id).filter(Pedido.status.in_([StatusPedido.FINALIZADO, StatusPedido.CANCELADO]), Pedido.criado_em < "2026-01-01").order_by(Pedido.id).limit(500),
+    "tarefas_disponiveis": select(Tarefa.id).filter(Tarefa.concluida_em.is_(None), Tarefa.disponivel_em <= "2026-01-01").order_by(Tarefa.disponivel_em).limit(4),
+    "tarefas_pendentes": select(func.count(Tarefa.id), func.min(Tarefa.criado_em)).filter(Tarefa.concluida_em.is_(None)),
+    "tarefas_concluidas_antigas": select(Tarefa.id).filter(Tarefa.concluida_em < "2026-01-01"),
+}
+
+
+def varreduras_completas(plano):
+    # no SQLite, uma linha "SCAN <tabela>" sem "USING ... INDEX" indica leitura da tabela inteira
+    return [linha for linha in plano if linha.startswith("SCAN") and "INDEX" not in linha]
+
+
+async def obter_planos(pasta):
+    """
+    Cria o esquema em um banco SQLite na pasta informada e devolve, para cada consulta de
+    CONSULTAS, as linhas do EXPLAIN QUERY PLAN e se alguma delas percorre a tabela inteira.
+    """
+    resultados = {}
+    engine = criar_engine(f"sqlite+aiosqlite:///{os.path.join(pasta, 'plano.db')}")
+    async with engine.begin() as conexao:
+        await conexao.run_sync(Base.metadata.create_all)
+        for nome, consulta in CONSULTAS.items():
+            sql = str(consulta.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+            plano = [linha[-1] for linha in (await conexao.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)).all()]
+            resultados[nome] = {"plano": plano, "varredura_completa": bool(varreduras_completas(plano))}
+    await engine.dispose()
+    return resultados
+
+
+async def executar():
+    with tempfile.TemporaryDirectory() as pasta:
+        resultados = await obter_planos(pasta)
+
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+    if any(resultado["varredura_completa"] for resultado in resultados.values()):
+        print("Há consultas frequentes percorrendo a tabela inteira (sem índice).")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(executar())
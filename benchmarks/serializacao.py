@@ -0,0 +1,83 @@
+"""
+Benchmark do custo de serialização de uma resposta de pedido com muitos itens.
+
+Compara, para a resposta de POST /orders/pedido/{id} (pedido com N itens), o caminho anterior,
+em que o objeto do SQLAlchemy era percorrido por reflexão pelo jsonable_encoder e renderizado com
+o JSONResponse padrão, com o caminho atual: validação pelo response_model a partir dos atributos
+(from_attributes) e renderização com ORJSONResponse.
+
+Uso:
+    python -m benchmarks.serializacao --itens 10 100 1000 --repeticoes 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault("SECRET_KEY", "chave-benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from models import Pedido, ItemPedido
+from catalogo import catalogo_produtos, IndiceProdutos, ProdutoCatalogo
+from schemas import ResponseObterPedidoSchema
+
+
+# o sabor e o tamanho dos itens vêm do índice do catálogo, montado aqui sem banco de dados
+catalogo_produtos.indice = IndiceProdutos(1, [ProdutoCatalogo(1, "calabresa", "G", 39.9, True)])
+
+
+def montar_pedido(quantidade_itens):
+    pedido = Pedido(usuario=1, total=quantidade_itens * 39.9, qtde_itens=quantidade_itens)
+    pedido.id = 1
+    pedido.versao = 1
+    pedido.itens = []
+    for indice in range(quantidade_itens):
+        item = ItemPedido(1, 1, 1, 39.9)
+        item.id = indice + 1
+        pedido.itens.append(item)
+    return pedido
+
+
+def serializar_antes(pedido):
+    return JSONResponse(jsonable_encoder({"qtde_itens": len(pedido.itens), "pedido": pedido})).body
+
+
+def serializar_depois(pedido):
+    resposta = ResponseObterPedidoSchema.model_validate({"qtde_itens": pedido.qtde_itens, "pedido": pedido})
+    return ORJSONResponse(resposta.model_dump(mode="json")).body
+
+
+def medir(funcao, pedido, repeticoes):
+    funcao(pedido)
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao(pedido)
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+def executar(args):
+    resultados = {}
+    for quantidade_itens in args.itens:
+        pedido = montar_pedido(quantidade_itens)
+        antes = medir(serializar_antes, pedido, args.repeticoes)
+        depois = medir(serializar_depois, pedido, args.repeticoes)
+        resultados[quantidade_itens] = {
+            "antes_jsonable_encoder_us": round(antes * 1_000_000, 1),
+            "depois_response_model_orjson_us": round(depois * 1_000_000, 1),
+            "aceleracao": round(antes / depois, 1),
+            "bytes": len(serializar_depois(pedido)),
+        }
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--itens", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeticoes", type=int, default=200)
+    executar(parser.parse_args())
@@ -0,0 +1,203 @@
+"""
+Benchmark e verificação da fila de tarefas em segundo plano.
+
+Compara a latência da finalização de pedidos com as tarefas posteriores executadas na própria
+requisição (backend "memoria", o comportamento de antes da fila) e enfileiradas para os workers
+(backend "banco"). A emissão da comanda é atrasada em --trabalho-ms para simular um trabalho lento,
+como a impressão na cozinha ou o envio de um e-mail; no modo "banco" também é medido o tempo até a
+fila esvaziar. Em seguida verifica, com esperas curtas, a chave de idempotência (a mesma tarefa
+enfileirada duas vezes executa uma vez), as novas tentativas com espera exponencial de uma tarefa que
+falha algumas vezes, a ida para tarefas_falhas de uma que falha sempre e a sua devolução à fila, nos
+dois backends. O banco é um SQLite temporário; o script termina com código de saída 1 se alguma
+verificação falhar.
+
+Uso:
+    python -m benchmarks.tarefas --pedidos 200 --concorrencia 5 --trabalho-ms 50 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SECRET_KEY", "chave-benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import select, func
+
+from configuracoes import configuracoes
+from database import criar_engine, criar_fabrica_sessao
+from models import Base, Usuario, Produto, VersaoCatalogo, ItemPedido, StatusPedido, Tarefa, TarefaFalha
+from order_routes import inserir_pedido, inserir_item_pedido, alterar_status_pedido
+from tarefas import BackendBanco, BackendMemoria, TIPOS_TAREFA, tipo_tarefa
+
+
+def percentil(valores, fracao):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * fracao))]
+
+
+async def preparar_banco(caminho, conexoes):
+    engine = criar_engine(f"sqlite+aiosqlite:///{caminho}", pool_size=conexoes, max_overflow=0)
+    async with engine.begin() as conexao:
+        await conexao.run_sync(Base.metadata.create_all)
+    fabrica_sessao = criar_fabrica_sessao(engine)
+    async with fabrica_sessao() as session:
+        session.add(Usuario("benchmark", "benchmark@delivery", "-", admin=True))
+        session.add(Produto(sabor="calabresa", tamanho="G", preco=45.9, versao=1))
+        await session.execute(VersaoCatalogo.incrementar())
+        await session.commit()
+    return engine, fabrica_sessao
+
+
+async def aguardar_fila_vazia(fabrica_sessao, limite_segundos=120):
+    inicio = time.perf_counter()
+    while time.perf_counter() - inicio < limite_segundos:
+        async with fabrica_sessao() as session:
+            if not await session.scalar(select(func.count(Tarefa.id)).filter(Tarefa.concluida_em.is_(None))):
+                return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+async def medir_modo(modo, caminho, args):
+    engine, fabrica_sessao = await preparar_banco(caminho, args.concorrencia + args.workers + 1)
+    async with fabrica_sessao() as session:
+        for id_pedido in range(1, args.pedidos + 1):
+            await inserir_pedido(session, 1)
+            await inserir_item_pedido(session, ItemPedido(id_pedido, 1, 1, 45.9))
+        await session.commit()
+        usuario = await session.get(Usuario, 1)
+
+    fila = BackendMemoria() if modo == "memoria" else BackendBanco()
+    await fila.iniciar(fabrica_sessao, args.workers)
+
+    semaforo = asyncio.Semaphore(args.concorrencia)
+    latencias = []
+
+    async def finalizar(id_pedido):
+        async with semaforo:
+            inicio = time.perf_counter()
+            async with fabrica_sessao() as session:
+                await alterar_status_pedido(session, id_pedido, StatusPedido.FINALIZADO, usuario, fila=fila)
+                await fila.despachar(session)
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(finalizar(id_pedido) for id_pedido in range(1, args.pedidos + 1)))
+    duracao = time.perf_counter() - inicio
+    resultado = {
+        "pedidos": args.pedidos,
+        "duracao_s": round(duracao, 4),
+        "finalizacoes_por_s": round(args.pedidos / duracao, 1),
+        "latencia_p50_ms": round(percentil(latencias, 0.50) * 1000, 2),
+        "latencia_p99_ms": round(percentil(latencias, 0.99) * 1000, 2),
+    }
+    if modo == "banco":
+        fila_vazia = await aguardar_fila_vazia(fabrica_sessao)
+        resultado["fila_vazia_s"] = round(time.perf_counter() - inicio, 4) if fila_vazia else None
+    await fila.parar()
+    resultado["tarefas_concluidas"] = sum(q for (_, estado), q in fila.resultados.items() if estado == "concluida")
+    await engine.dispose()
+    return resultado
+
+
+async def verificar_backend(modo, caminho):
+    """
+    Executa as verificações de idempotência, novas tentativas e dead letter em um backend e
+    retorna o resultado de cada uma.
+    """
+    engine, fabrica_sessao = await preparar_banco(caminho, 4)
+    fila = BackendMemoria() if modo == "memoria" else BackendBanco()
+    execucoes = {}
+    falhas_restantes = {"instavel": 2, "quebrada": configuracoes.TAREFAS_MAXIMO_TENTATIVAS}
+
+    def registrar_tipo(tipo):
+        @tipo_tarefa(tipo)
+        async def executar(session, dados):
+            execucoes[tipo] = execucoes.get(tipo, 0) + 1
+            if falhas_restantes.get(tipo, 0) > 0:
+                falhas_restantes[tipo] -= 1
+                raise RuntimeError(f"falha simulada em {tipo}")
+    for tipo in ("unica", "instavel", "quebrada"):
+        registrar_tipo(tipo)
+
+    await fila.iniciar(fabrica_sessao, 2)
+    for chave in ("unica", "unica", "instavel", "quebrada"):
+        async with fabrica_sessao() as session:
+            await fila.enfileirar(session, chave, {}, f"{modo}:{chave}")
+            await session.commit()
+            await fila.despachar(session)
+
+    if modo == "banco":
+        await aguardar_fila_vazia(fabrica_sessao)
+        async with fabrica_sessao() as session:
+            tentativas_instavel = await session.scalar(select(Tarefa.tentativas).filter(Tarefa.chave == "banco:instavel"))
+            na_fila_quebrada = await session.scalar(select(func.count(Tarefa.id)).filter(Tarefa.chave == "banco:quebrada"))
+            falhas = (await session.scalars(select(TarefaFalha.chave))).all()
+            # a tarefa quebrada é corrigida (não falha mais) e devolvida à fila
+            devolvidas = await fila.reprocessar_falhas(session)
+        await aguardar_fila_vazia(fabrica_sessao)
+        async with fabrica_sessao() as session:
+            reprocessada = await session.scalar(select(Tarefa.concluida_em).filter(Tarefa.chave == "banco:quebrada")) is not None
+            falhas_depois = await session.scalar(select(func.count(TarefaFalha.id)))
+        verificacoes = {
+            "idempotencia": execucoes.get("unica") == 1,
+            "novas_tentativas": execucoes.get("instavel") == 3 and tentativas_instavel == 3,
+            "dead_letter": falhas == ["banco:quebrada"] and na_fila_quebrada == 0,
+            "reprocessamento": devolvidas == 1 and reprocessada and falhas_depois == 0,
+        }
+    else:
+        verificacoes = {
+            "idempotencia": execucoes.get("unica") == 1,
+            "novas_tentativas": execucoes.get("instavel") == 3,
+            "dead_letter": [falha["chave"] for falha in fila.falhas] == ["memoria:quebrada"],
+        }
+
+    await fila.parar()
+    await engine.dispose()
+    for tipo in ("unica", "instavel", "quebrada"):
+        del TIPOS_TAREFA[tipo]
+    return {"execucoes": execucoes, "verificacoes": verificacoes, "resultados": {f"{t}:{r}": q for (t, r), q in fila.resultados.items()}}
+
+
+async def executar(args):
+    # simula um trabalho lento na emissão da comanda, que continua publicando o evento depois
+    emitir_comanda = TIPOS_TAREFA["emitir_comanda"]
+
+    @tipo_tarefa("emitir_comanda")
+    async def emitir_comanda_lenta(session, dados):
+        await asyncio.sleep(args.trabalho_ms / 1000)
+        await emitir_comanda(session, dados)
+
+    configuracoes.TAREFAS_INTERVALO = 0.05
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        for modo in ("memoria", "banco"):
+            resultados[modo] = await medir_modo(modo, os.path.join(pasta, f"{modo}.db"), args)
+
+        # esperas curtas para as novas tentativas não atrasarem a verificação
+        configuracoes.TAREFAS_BACKOFF_BASE = 0.02
+        configuracoes.TAREFAS_BACKOFF_MAXIMO = 0.2
+        configuracoes.TAREFAS_MAXIMO_TENTATIVAS = 3
+        resultados["verificacoes"] = {
+            modo: await verificar_backend(modo, os.path.join(pasta, f"verificacao_{modo}.db"))
+            for modo in ("memoria", "banco")
+        }
+
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+    aprovado = all(all(v["verificacoes"].values()) for v in resultados["verificacoes"].values())
+    return 0 if aprovado else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pedidos", type=int, default=200)
+    parser.add_argument("--concorrencia", type=int, default=5)
+    parser.add_argument("--trabalho-ms", type=float, default=50)
+    parser.add_argument("--workers", type=int, default=4)
+    sys.exit(asyncio.run(executar(parser.parse_args())))
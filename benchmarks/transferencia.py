@@ -0,0 +1,116 @@
+"""
+Benchmark da exportação e da importação em massa de pedidos.
+
+Gera um arquivo NDJSON sintético com --pedidos pedidos (cada um com --itens-por-pedido
+itens), importa o arquivo em um banco SQLite temporário vazio com transferencia.importar
+(lotes de --tamanho-lote registros, INSERTs em lote por transação) e depois exporta todos
+os pedidos de volta com transferencia.exportar. O resultado traz os pedidos e linhas por
+segundo de cada etapa e o pico de memória (RSS) do processo, que deve ficar estável com
+o aumento do volume.
+
+Uso:
+    python -m benchmarks.transferencia --pedidos 200000 --itens-por-pedido 3 --tamanho-lote 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SECRET_KEY", "chave-benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import orjson
+
+from database import criar_engine, criar_fabrica_sessao
+from models import Base, Usuario, Produto, VersaoCatalogo
+from transferencia import exportar, importar, dividir_linhas, ler_arquivo
+
+USUARIOS = 100
+
+
+def gerar_arquivo(caminho, args):
+    with open(caminho, "wb") as arquivo:
+        for id_pedido in range(1, args.pedidos + 1):
+            arquivo.write(orjson.dumps({
+                "id": id_pedido,
+                "usuario": id_pedido % USUARIOS + 1,
+                "status": "FINALIZADO",
+                "criado_em": f"2025-{id_pedido % 12 + 1:02d}-01T12:00:00",
+                "itens": [
+                    {"quantidade": 1 + indice % 3, "sabor": "calabresa", "tamanho": "G", "preco_unitario": 39.9}
+                    for indice in range(args.itens_por_pedido)
+                ],
+            }) + b"\n")
+
+
+def pico_rss_mib():
+    # no Linux ru_maxrss é informado em KiB
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+async def executar(args):
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "pedidos.ndjson")
+        gerar_arquivo(caminho, args)
+
+        engine = criar_engine(f"sqlite+aiosqlite:///{os.path.join(pasta, 'transferencia.db')}")
+        async with engine.begin() as conexao:
+            await conexao.run_sync(Base.metadata.create_all)
+        fabrica_sessao = criar_fabrica_sessao(engine)
+        async with fabrica_sessao() as session:
+            session.add_all(Usuario(f"usuario{i}", f"usuario{i}@transferencia", "-") for i in range(USUARIOS))
+            session.add(Produto(sabor="calabresa", tamanho="G", preco=39.9, versao=1))
+            await session.execute(VersaoCatalogo.incrementar())
+            await session.commit()
+
+        rss_inicial = pico_rss_mib()
+        inicio = time.perf_counter()
+        importados = await importar(fabrica_sessao, dividir_linhas(ler_arquivo(caminho)), "pedidos", "ndjson", args.tamanho_lote)
+        duracao_importacao = time.perf_counter() - inicio
+        rss_importacao = pico_rss_mib()
+
+        inicio = time.perf_counter()
+        exportados = 0
+        tamanho = 0
+        async with fabrica_sessao() as session:
+            async for bloco in exportar(session, "pedidos", "ndjson", args.tamanho_lote):
+                exportados += bloco.count(b"\n")
+                tamanho += len(bloco)
+        duracao_exportacao = time.perf_counter() - inicio
+        await engine.dispose()
+
+    linhas_itens = args.pedidos * args.itens_por_pedido
+    print(json.dumps({
+        "pedidos": args.pedidos,
+        "itens": linhas_itens,
+        "tamanho_lote": args.tamanho_lote,
+        "importacao": {
+            "pedidos": importados,
+            "duracao_s": round(duracao_importacao, 2),
+            "pedidos_por_s": round(importados / duracao_importacao),
+            "itens_por_s": round(linhas_itens / duracao_importacao),
+        },
+        "exportacao": {
+            "pedidos": exportados,
+            "mib": round(tamanho / 1024 / 1024, 1),
+            "duracao_s": round(duracao_exportacao, 2),
+            "pedidos_por_s": round(exportados / duracao_exportacao),
+        },
+        "rss_antes_mib": rss_inicial,
+        "rss_apos_importacao_mib": rss_importacao,
+        "pico_rss_mib": pico_rss_mib(),
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pedidos", type=int, default=200000)
+    parser.add_argument("--itens-por-pedido", type=int, default=3)
+    parser.add_argument("--tamanho-lote", type=int, default=5000)
+    asyncio.run(executar(parser.parse_args()))
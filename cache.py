@@ -0,0 +1,65 @@
+from collections import OrderedDict
+import time
+
+class CacheLRU:
+    """
+    Cache em memória com tamanho máximo (as entradas usadas há mais tempo são descartadas
+    primeiro) e tempo de vida (TTL) por entrada. Cada entrada pode ter um prazo próprio menor
+    que o TTL, usado por exemplo para não manter um token depois da sua expiração. Os contadores
+    de acertos, falhas e descartes ficam disponíveis em estatisticas(). Um tamanho máximo igual
+    a zero desativa o cache.
+    """
+
+    def __init__(self, tamanho_maximo, ttl):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self.acertos = 0
+        self.falhas = 0
+        self.descartes = 0
+        self._itens = OrderedDict()
+
+    def obter(self, chave):
+        item = self._itens.get(chave)
+        if item is None:
+            self.falhas += 1
+            return None
+
+        valor, expira_em = item
+        if expira_em <= time.monotonic():
+            del self._itens[chave]
+            self.falhas += 1
+            return None
+
+        self._itens.move_to_end(chave)
+        self.acertos += 1
+        return valor
+
+    def definir(self, chave, valor, expira_em=None):
+        # expira_em usa o relógio de time.monotonic()
+        if self.tamanho_maximo <= 0:
+            return
+
+        limite = time.monotonic() + self.ttl
+        if expira_em is not None:
+            limite = min(limite, expira_em)
+
+        self._itens[chave] = (valor, limite)
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.tamanho_maximo:
+            self._itens.popitem(last=False)
+            self.descartes += 1
+
+    def invalidar(self, chave):
+        self._itens.pop(chave, None)
+
+    def limpar(self):
+        self._itens.clear()
+
+    def estatisticas(self):
+        return {
+            "tamanho": len(self._itens),
+            "tamanho_maximo": self.tamanho_maximo,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "descartes": self.descartes
+        }
@@ -0,0 +1,94 @@
+from fastapi import APIRouter, Depends, HTTPException
+from dependencies import getSession, verificar_token
+from catalogo import CatalogoProdutos, obter_catalogo_requisicao
+from schemas import ProdutoSchema, AlterarProdutoSchema, ResponseCatalogoSchema, ResponseMensagemProdutoSchema
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Produto, Usuario, VersaoCatalogo
+
+catalog_router = APIRouter(prefix="/catalog", tags=["catalog"], dependencies=[Depends(verificar_token)])
+
+
+def verificar_admin(usuario):
+    if not usuario.admin:
+        raise HTTPException(status_code=401, detail="Você não tem autorização para acessar essa rota")
+
+def validar_preco(preco):
+    if preco is not None and preco < 0:
+        raise HTTPException(status_code=400, detail="O preço do produto não pode ser negativo")
+
+@catalog_router.get("/produtos", response_model=ResponseCatalogoSchema)
+async def listar_produtos(disponiveis: bool = False, session: AsyncSession = Depends(getSession), catalogo: CatalogoProdutos = Depends(obter_catalogo_requisicao)):
+    """
+    Essa é a rota para listar os produtos do catálogo (sabor, tamanho, preço e disponibilidade), com a
+    versão do catálogo. A resposta é montada a partir do índice em memória, sem consultar os produtos
+    no banco de dados; com disponiveis=true, só os produtos disponíveis são listados.
+    """
+    indice = await catalogo.atualizar(session)
+    produtos = sorted(indice.por_id.values(), key=lambda produto: produto.id)
+    return {
+        "versao": indice.versao,
+        "produtos": [produto for produto in produtos if produto.disponivel or not disponiveis]
+    }
+
+@catalog_router.post("/produto", response_model=ResponseMensagemProdutoSchema)
+async def criar_produto(produto_schema: ProdutoSchema, session: AsyncSession = Depends(getSession), usuario: Usuario = Depends(verificar_token), catalogo: CatalogoProdutos = Depends(obter_catalogo_requisicao)):
+    """
+    Essa é a rota para incluir um produto (um sabor em um tamanho) no catálogo, disponível apenas para
+    administradores. Cada combinação de sabor e tamanho só pode ser cadastrada uma vez. A versão do
+    catálogo é incrementada na mesma transação e, depois do commit, o índice de preços do app é
+    trocado por um novo, com a nova versão.
+    """
+    verificar_admin(usuario)
+    validar_preco(produto_schema.preco)
+    try:
+        versao = await session.scalar(VersaoCatalogo.incrementar())
+        id_produto = await session.scalar(
+            insert(Produto)
+            .values(**produto_schema.model_dump(), versao=versao)
+            .returning(Produto.id)
+        )
+        await session.commit()
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail=f"Produto já cadastrado: {produto_schema.sabor} {produto_schema.tamanho}")
+
+    indice = await catalogo.atualizar(session, forcar=True)
+    return {
+        "mensagem": f"Produto {id_produto} incluído no catálogo",
+        "versao": indice.versao,
+        "produto": indice[id_produto]
+    }
+
+@catalog_router.patch("/produto/{id_produto}", response_model=ResponseMensagemProdutoSchema)
+async def alterar_produto(id_produto: int, alteracao_schema: AlterarProdutoSchema, session: AsyncSession = Depends(getSession), usuario: Usuario = Depends(verificar_token), catalogo: CatalogoProdutos = Depends(obter_catalogo_requisicao)):
+    """
+    Essa é a rota para alterar o preço ou a disponibilidade de um produto do catálogo, disponível
+    apenas para administradores. Os itens já incluídos nos pedidos mantêm o preço cobrado; o novo
+    preço vale para os itens incluídos depois. O índice de preços do app é trocado logo depois do
+    commit e os demais processos passam a usar a nova versão na próxima conferência do catálogo.
+    """
+    verificar_admin(usuario)
+    validar_preco(alteracao_schema.preco)
+    valores = alteracao_schema.model_dump(exclude_none=True)
+    if not valores:
+        raise HTTPException(status_code=400, detail="Informe o preço ou a disponibilidade do produto")
+
+    versao = await session.scalar(VersaoCatalogo.incrementar())
+    alterado = await session.scalar(
+        update(Produto)
+        .filter(Produto.id == id_produto)
+        .values(**valores, versao=versao)
+        .returning(Produto.id)
+        .execution_options(synchronize_session=False)
+    )
+    if alterado is None:
+        raise HTTPException(status_code=400, detail="Produto não encontrado")
+    await session.commit()
+
+    indice = await catalogo.atualizar(session, forcar=True)
+    return {
+        "mensagem": f"Produto {id_produto} alterado",
+        "versao": indice.versao,
+        "produto": indice[id_produto]
+    }
@@ -0,0 +1,142 @@
+from sqlalchemy import select
+from configuracoes import configuracoes
+from metricas import registrar_coletor
+from models import Produto, VersaoCatalogo
+from starlette.requests import HTTPConnection
+from collections import namedtuple
+from types import MappingProxyType
+import contextvars
+import time
+import weakref
+
+# produto como guardado no índice: uma tupla imutável, compartilhada por todas as requisições
+ProdutoCatalogo = namedtuple("ProdutoCatalogo", ["id", "sabor", "tamanho", "preco", "disponivel"])
+
+
+class IndiceProdutos:
+    """
+    Índice imutável com os produtos de uma versão do catálogo, por id e por (sabor, tamanho). É
+    montado de uma vez a partir da tabela produtos e nunca alterado: uma mudança no catálogo gera um
+    novo índice, que substitui o anterior com uma única atribuição. As requisições em andamento
+    continuam com o índice que já tinham e as leituras não precisam de lock.
+    """
+
+    def __init__(self, versao, produtos):
+        self.versao = versao
+        self.por_id = MappingProxyType({produto.id: produto for produto in produtos})
+        self.por_nome = MappingProxyType({(produto.sabor, produto.tamanho): produto for produto in produtos})
+
+    def __len__(self):
+        return len(self.por_id)
+
+    def __contains__(self, id_produto):
+        return id_produto in self.por_id
+
+    def __getitem__(self, id_produto):
+        return self.por_id[id_produto]
+
+    def resolver(self, produto=None, sabor=None, tamanho=None):
+        """
+        Devolve o produto pelo id ou, quando o id não é informado, pelo sabor e pelo tamanho. Retorna
+        None se o produto não estiver no catálogo.
+        """
+        if produto is not None:
+            return self.por_id.get(produto)
+        return self.por_nome.get((sabor, tamanho))
+
+
+class CatalogoProdutos:
+    """
+    Catálogo de produtos em memória de um app. O índice é carregado na inicialização do app e a
+    versão do catálogo no banco (a linha da tabela versao_catalogo) é conferida, com uma consulta de
+    uma linha, no máximo a cada intervalo segundos; só quando ela mudou os produtos são lidos de novo
+    e o índice é trocado. O processo que altera o catálogo troca o índice logo depois do commit, e os
+    demais passam a ver a alteração na conferência seguinte.
+    """
+
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self.indice = IndiceProdutos(0, [])
+        self.recargas = 0
+        self._conferido_em = None
+
+    async def atualizar(self, session, forcar=False):
+        """
+        Confere a versão do catálogo (se o intervalo já passou ou forcar=True), recarrega o índice se
+        ela mudou e devolve o índice atual.
+        """
+        agora = time.monotonic()
+        if not forcar and self._conferido_em is not None and agora - self._conferido_em < self.intervalo:
+            return self.indice
+        # marcado antes da consulta para que requisições simultâneas não confiram ao mesmo tempo
+        self._conferido_em = agora
+        versao = await session.scalar(select(VersaoCatalogo.versao).filter(VersaoCatalogo.id == 1))
+        if versao != self.indice.versao:
+            produtos = (await session.execute(
+                select(Produto.id, Produto.sabor, Produto.tamanho, Produto.preco, Produto.disponivel)
+            )).all()
+            self.indice = IndiceProdutos(versao, [ProdutoCatalogo(*linha) for linha in produtos])
+            self.recargas += 1
+        return self.indice
+
+    async def garantir(self, session, ids_produtos):
+        """
+        Devolve um índice com todos os produtos informados. Se faltar algum (um produto incluído em
+        outro processo desde a última conferência), a versão do catálogo é conferida na hora.
+        """
+        if all(id_produto in self.indice for id_produto in ids_produtos):
+            return self.indice
+        return await self.atualizar(session, forcar=True)
+
+
+# catálogos dos apps do processo, somados na exportação das métricas
+catalogos_produtos = weakref.WeakSet()
+
+def criar_catalogo_produtos(configuracoes_app=configuracoes):
+    """
+    Função para criar o catálogo de um app, com o intervalo de conferência CATALOGO_INTERVALO das
+    configurações do app. Cada app tem o seu catálogo (em app.state.catalogo_produtos, carregado no
+    lifespan), com o índice do seu próprio banco de dados.
+    """
+    catalogo = CatalogoProdutos(configuracoes_app.CATALOGO_INTERVALO)
+    catalogos_produtos.add(catalogo)
+    return catalogo
+
+# catálogo do processo, usado pelos scripts de linha de comando (transferência, fila de tarefas)
+catalogo_produtos = criar_catalogo_produtos()
+
+# catálogo do app que atende a requisição (ou cuja fila executa a tarefa), usado na serialização dos
+# itens dos pedidos, que não tem acesso ao app; fora de um app vale o catálogo do processo
+catalogo_atual = contextvars.ContextVar("catalogo_atual", default=catalogo_produtos)
+
+def obter_catalogo_produtos(app):
+    """
+    Função para obter o catálogo do app. Normalmente ele já foi criado e carregado no lifespan; quando
+    o app é executado sem o lifespan (por exemplo pelo transporte ASGI do httpx), o catálogo é criado
+    no primeiro uso e o índice é carregado na primeira conferência.
+    """
+    if getattr(app.state, "catalogo_produtos", None) is None:
+        app.state.catalogo_produtos = criar_catalogo_produtos(app.state.configuracoes)
+    return app.state.catalogo_produtos
+
+async def obter_catalogo_requisicao(conexao: HTTPConnection):
+    """
+    Dependência que devolve o catálogo do app da requisição e o define como catalogo_atual, para que
+    os itens da resposta tragam o sabor e o tamanho do índice desse catálogo.
+    """
+    catalogo = obter_catalogo_produtos(conexao.app)
+    catalogo_atual.set(catalogo)
+    return catalogo
+
+def exportar_metricas_catalogo():
+    catalogos = list(catalogos_produtos)
+    return [
+        "# TYPE delivery_catalogo_versao gauge",
+        f"delivery_catalogo_versao {max((catalogo.indice.versao for catalogo in catalogos), default=0)}",
+        "# TYPE delivery_catalogo_produtos gauge",
+        f"delivery_catalogo_produtos {max((len(catalogo.indice) for catalogo in catalogos), default=0)}",
+        "# TYPE delivery_catalogo_recargas_total counter",
+        f"delivery_catalogo_recargas_total {sum(catalogo.recargas for catalogo in catalogos)}",
+    ]
+
+registrar_coletor(exportar_metricas_catalogo)
@@ -0,0 +1,105 @@
+from pydantic import BaseModel
+from dotenv import load_dotenv
+from typing import Literal
+import os
+
+
+class Configuracoes(BaseModel):
+    """
+    Configurações da aplicação, com o tipo e o valor padrão de cada uma. Os nomes dos campos são os
+    das variáveis de ambiente: carregar_configuracoes() lê o ambiente (e o arquivo .env), e o pydantic
+    converte e valida os valores, de modo que uma variável inválida falha já na inicialização e não
+    na primeira requisição que a usa. create_app() também aceita um objeto montado diretamente.
+    """
+
+    SECRET_KEY: str
+    ALGORITHM: str
+    ACCESS_TOKEN_EXPIRE_MINUTES: int
+    # custo do bcrypt (log2 do número de iterações), hashes com custo diferente são refeitos no próximo login
+    BCRYPT_ROUNDS: int = 12
+    # quantidade de threads dedicadas ao bcrypt e limite de senhas aguardando processamento
+    SENHA_WORKERS: int = os.cpu_count() or 1
+    SENHA_FILA_MAXIMA: int = 32
+    # cache dos usuários autenticados (por id) e dos tokens já decodificados, tamanho 0 desativa o cache
+    CACHE_USUARIOS_TAMANHO: int = 1024
+    CACHE_USUARIOS_TTL: int = 60
+    CACHE_TOKENS_TAMANHO: int = 4096
+    # paginação da listagem de pedidos e tamanho dos lotes lidos do cursor no modo streaming
+    PAGINA_TAMANHO_PADRAO: int = 50
+    PAGINA_TAMANHO_MAXIMO: int = 500
+    STREAM_TAMANHO_LOTE: int = 1000
+    # eventos de pedidos enviados por SSE/WebSocket: tamanho da fila de cada cliente e intervalo do ping (segundos)
+    EVENTOS_TAMANHO_FILA: int = 100
+    EVENTOS_INTERVALO_PING: int = 15
+    # agrupamento das escritas de pedidos e itens em um único commit: espera máxima (ms) e tamanho do lote
+    GRAVACAO_LOTE: bool = False
+    GRAVACAO_LOTE_JANELA_MS: float = 5
+    GRAVACAO_LOTE_TAMANHO: int = 100
+    # cache dos relatórios de vendas por período (segundos), para os painéis não refazerem as agregações a cada atualização
+    ANALISE_CACHE_TAMANHO: int = 256
+    ANALISE_CACHE_TTL: int = 300
+    # quantidade de registros por lote lido do cursor na exportação e por transação na importação
+    TRANSFERENCIA_TAMANHO_LOTE: int = 5000
+    # pedidos finalizados ou cancelados criados há mais de ARQUIVAMENTO_IDADE_DIAS dias são movidos para as
+    # tabelas de arquivo em lotes de ARQUIVAMENTO_TAMANHO_LOTE, com uma pausa entre os lotes
+    ARQUIVAMENTO_IDADE_DIAS: int = 90
+    ARQUIVAMENTO_TAMANHO_LOTE: int = 500
+    ARQUIVAMENTO_PAUSA_MS: float = 50
+    # controle de admissão: baldes de fichas por IP nas rotas de autenticação e por usuário nas escritas de
+    # pedidos (capacidade = rajada, reposição = fichas por segundo) e requisições simultâneas por classe de
+    # rota; valores iguais a zero desativam o respectivo limite
+    ADMISSAO_ATIVA: bool = True
+    ADMISSAO_IP_RAJADA: int = 20
+    ADMISSAO_IP_TAXA: float = 2
+    ADMISSAO_USUARIO_RAJADA: int = 50
+    ADMISSAO_USUARIO_TAXA: float = 20
+    ADMISSAO_CONCORRENCIA_AUTENTICACAO: int = 64
+    ADMISSAO_CONCORRENCIA_ESCRITA: int = 128
+    ADMISSAO_BALDES_MAXIMO: int = 100000
+    # modo sem estado: o access token leva admin e ativo assinados e a verificação não consulta o banco de dados;
+    # os tokens revogados (logout) são recarregados do banco a cada TOKEN_REVOGADOS_INTERVALO segundos
+    TOKEN_SEM_ESTADO: bool = False
+    TOKEN_REVOGADOS_INTERVALO: float = 5
+    # fila de tarefas em segundo plano: "banco" (tabela tarefas, executada por TAREFAS_WORKERS tarefas
+    # asyncio em cada processo) ou "memoria" (síncrona, executada na própria requisição, para testes);
+    # a fila é consultada a cada TAREFAS_INTERVALO segundos, cada tarefa é tentada até
+    # TAREFAS_MAXIMO_TENTATIVAS vezes com espera exponencial a partir de TAREFAS_BACKOFF_BASE segundos
+    # (no máximo TAREFAS_BACKOFF_MAXIMO) e volta para a fila se não terminar em TAREFAS_PRAZO_EXECUCAO
+    # segundos; as tarefas concluídas são mantidas por TAREFAS_RETENCAO_HORAS para a chave de idempotência
+    TAREFAS_BACKEND: Literal["banco", "memoria"] = "banco"
+    TAREFAS_WORKERS: int = 2
+    TAREFAS_INTERVALO: float = 1
+    TAREFAS_MAXIMO_TENTATIVAS: int = 5
+    TAREFAS_BACKOFF_BASE: float = 2
+    TAREFAS_BACKOFF_MAXIMO: float = 300
+    TAREFAS_PRAZO_EXECUCAO: float = 60
+    TAREFAS_RETENCAO_HORAS: float = 24
+    # catálogo de produtos: intervalo (segundos) entre as conferências da versão do catálogo no banco,
+    # que recarregam o índice de preços em memória quando outro processo alterou o catálogo
+    CATALOGO_INTERVALO: float = 5
+    # conexão com o banco de dados: tamanho do pool, overflow permitido e pre-ping das conexões
+    DATABASE_URL: str = "sqlite+aiosqlite:///database.db"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_PRE_PING: bool = True
+    # o echo imprime cada comando SQL, por isso fica desligado por padrão
+    DB_ECHO: bool = False
+    # conexões do pool abertas e testadas na inicialização do app, antes da primeira requisição
+    DB_AQUECIMENTO_CONEXOES: int = 1
+    # ajustes específicos do SQLite (busy_timeout em milissegundos, mmap_size em bytes,
+    # cache_size negativo indica o tamanho em KiB em vez de número de páginas)
+    SQLITE_BUSY_TIMEOUT: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE: int = -65536
+
+
+def carregar_configuracoes():
+    """
+    Função para montar as configurações a partir das variáveis de ambiente (e do arquivo .env).
+    Variáveis não definidas ficam com o valor padrão do campo.
+    """
+    load_dotenv()
+    return Configuracoes(**{campo: os.environ[campo] for campo in Configuracoes.model_fields if campo in os.environ})
+
+# configurações do processo, usadas pelos módulos (caches, limites, pool do bcrypt) e pelo app padrão
+configuracoes = carregar_configuracoes()
@@ -0,0 +1,67 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from dependencies import verificar_token
+from database import obter_fabrica_sessao
+from catalogo import obter_catalogo_produtos
+from schemas import ResponseImportacaoSchema
+from transferencia import exportar, importar, dividir_linhas, ErroImportacao, FORMATOS, CONTEUDOS
+from models import Usuario
+
+data_router = APIRouter(prefix="/data", tags=["data"], dependencies=[Depends(verificar_token)])
+
+TIPOS_CONTEUDO = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def validar_transferencia(usuario, conteudo, formato):
+    if not usuario.admin:
+        raise HTTPException(status_code=401, detail="Você não tem autorização para acessar essa rota")
+    if conteudo not in CONTEUDOS:
+        raise HTTPException(status_code=400, detail=f"Conteúdo inválido, use um destes: {', '.join(CONTEUDOS)}")
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail=f"Formato inválido, use um destes: {', '.join(FORMATOS)}")
+
+@data_router.get("/exportar/{conteudo}")
+async def exportar_dados(conteudo: str, request: Request, formato: str = "ndjson", usuario: Usuario = Depends(verificar_token)):
+    """
+    Essa é a rota para exportar todos os usuários, todos os produtos do catálogo ou todos os pedidos
+    (com os itens aninhados no NDJSON, ou um item por linha no CSV), disponível apenas para
+    administradores. Os registros são lidos de um
+    cursor no servidor em lotes de TRANSFERENCIA_TAMANHO_LOTE e enviados à medida que são lidos, com
+    uso de memória constante independentemente do tamanho das tabelas.
+    """
+    validar_transferencia(usuario, conteudo, formato)
+
+    async def gerar_blocos():
+        # a sessão é aberta dentro do gerador para durar enquanto a resposta estiver sendo enviada
+        async with obter_fabrica_sessao(request.app)() as session:
+            async for bloco in exportar(session, conteudo, formato):
+                yield bloco
+
+    return StreamingResponse(
+        gerar_blocos(),
+        media_type=TIPOS_CONTEUDO[formato],
+        headers={"Content-Disposition": f'attachment; filename="{conteudo}.{formato}"'}
+    )
+
+@data_router.post("/importar/{conteudo}", response_model=ResponseImportacaoSchema)
+async def importar_dados(conteudo: str, request: Request, formato: str = "ndjson", usuario: Usuario = Depends(verificar_token)):
+    """
+    Essa é a rota para importar usuários, produtos ou pedidos no mesmo formato da exportação (NDJSON
+    ou CSV enviado no corpo da requisição), disponível apenas para administradores. Os produtos
+    precisam ser importados antes dos pedidos, cujos itens são ligados a eles pelo sabor e tamanho. O corpo é lido aos
+    poucos e os registros são gravados em lotes, cada um em uma transação com INSERTs em lote. Se
+    algum lote falhar, a rota responde 400 indicando o problema; os lotes anteriores permanecem
+    gravados.
+    """
+    validar_transferencia(usuario, conteudo, formato)
+
+    try:
+        quantidade = await importar(obter_fabrica_sessao(request.app), dividir_linhas(request.stream()), conteudo, formato,
+                                    catalogo=obter_catalogo_produtos(request.app))
+    except ErroImportacao as erro:
+        raise HTTPException(status_code=400, detail=str(erro))
+
+    return {
+        "mensagem": f"{quantidade} registro(s) de {conteudo} importado(s)",
+        "importados": quantidade
+    }
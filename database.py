@@ -0,0 +1,95 @@
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from configuracoes import configuracoes as configuracoes_processo
+
+def configurar_sqlite(conexao_dbapi, configuracoes):
+    """
+    Função executada a cada nova conexão física com um banco SQLite. Ela ativa o modo WAL,
+    que permite que as leituras de pedidos continuem enquanto uma escrita está em andamento,
+    reduz o custo de fsync com synchronous=NORMAL (seguro em conjunto com o WAL), define quanto
+    tempo uma conexão espera pelo bloqueio de escrita antes de falhar com "database is locked"
+    e aumenta o mmap e o cache de páginas para que as consultas frequentes fiquem em memória.
+    """
+    cursor = conexao_dbapi.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={configuracoes.SQLITE_BUSY_TIMEOUT}")
+    cursor.execute(f"PRAGMA mmap_size={configuracoes.SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size={configuracoes.SQLITE_CACHE_SIZE}")
+    cursor.close()
+
+def criar_engine(url=None, pool_size=None, max_overflow=None, pool_pre_ping=None, echo=None, configuracoes=None):
+    """
+    Função para criar a engine assíncrona do banco de dados a partir das configurações.
+    Ela define o tamanho do pool de conexões, o overflow permitido, o pre-ping (que descarta
+    conexões quebradas antes de entregá-las) e o echo dos comandos SQL. Quando o banco é
+    SQLite, os PRAGMAs de desempenho são aplicados em cada conexão aberta pelo pool. Os
+    parâmetros não informados vêm de configuracoes (por padrão, as configurações do processo).
+    """
+    configuracoes = configuracoes or configuracoes_processo
+    url = url or configuracoes.DATABASE_URL
+    opcoes = {
+        "echo": configuracoes.DB_ECHO if echo is None else echo,
+        "pool_pre_ping": configuracoes.DB_POOL_PRE_PING if pool_pre_ping is None else pool_pre_ping,
+    }
+    # bancos SQLite em memória usam um pool de conexão única, que não aceita tamanho de pool
+    if ":memory:" not in url and "mode=memory" not in url:
+        opcoes["pool_size"] = configuracoes.DB_POOL_SIZE if pool_size is None else pool_size
+        opcoes["max_overflow"] = configuracoes.DB_MAX_OVERFLOW if max_overflow is None else max_overflow
+
+    engine = create_async_engine(url, **opcoes)
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine.sync_engine, "connect")
+        def ao_conectar(conexao_dbapi, registro_conexao):
+            configurar_sqlite(conexao_dbapi, configuracoes)
+    return engine
+
+def criar_fabrica_sessao(engine):
+    """
+    Função para criar a fábrica de sessões assíncronas ligada a uma engine. A fábrica é criada
+    uma única vez e reaproveitada por todas as requisições. O expire_on_commit=False mantém os
+    atributos acessíveis após o commit, já que a sessão assíncrona não consegue recarregá-los
+    de forma implícita.
+    """
+    return async_sessionmaker(bind=engine, expire_on_commit=False)
+
+async def aquecer_banco(engine, conexoes=1):
+    """
+    Função para abrir e testar (SELECT 1) até "conexoes" conexões do pool antes da primeira
+    requisição. As conexões voltam para o pool já abertas, de modo que o custo da conexão física
+    (e dos PRAGMAs do SQLite) é pago na inicialização do worker e não na latência das primeiras
+    requisições; uma falha de conexão também aparece já na inicialização.
+    """
+    abertas = []
+    try:
+        for _ in range(conexoes):
+            conexao = await engine.connect()
+            abertas.append(conexao)
+            await conexao.execute(text("SELECT 1"))
+    finally:
+        for conexao in abertas:
+            await conexao.close()
+
+def abrir_banco(app):
+    """
+    Função para criar a engine e a fábrica de sessões de um app, a partir das configurações
+    guardadas em app.state.configuracoes. Ela é chamada no lifespan do app.
+    """
+    app.state.engine = criar_engine(configuracoes=app.state.configuracoes)
+    app.state.fabrica_sessao = criar_fabrica_sessao(app.state.engine)
+    return app.state.engine
+
+def obter_fabrica_sessao(app):
+    """
+    Função para obter a fábrica de sessões do app. Normalmente ela já foi criada no lifespan; quando
+    o app é executado sem o lifespan (por exemplo pelo transporte ASGI do httpx), a engine é criada
+    no primeiro uso.
+    """
+    if getattr(app.state, "fabrica_sessao", None) is None:
+        abrir_banco(app)
+    return app.state.fabrica_sessao
+
+# conexão do banco de dados e fábrica de sessões do processo, usadas pelos scripts de linha de comando
+# (resumo, reconciliação, arquivamento, transferência); a engine não abre conexões até o primeiro uso
+db = criar_engine()
+SessionLocal = criar_fabrica_sessao(db)
@@ -1,44 +1,139 @@
 from fastapi import Depends, HTTPException
-from models import db
-from sqlalchemy.orm import sessionmaker, Session
+from starlette.requests import HTTPConnection
+from database import obter_fabrica_sessao
+from sqlalchemy import select, event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import Usuario
-from main import SECRET_KEY, ALGORITHM, oauth2_schema
-from jose import JWTError, jwt
+from fastapi.security import OAuth2PasswordBearer
+from configuracoes import configuracoes
+from cache import CacheLRU
+from metricas import medir, registrar_coletor
+from tokens import verificador_token, tokens_revogados, IdentidadeToken
+from jose import JWTError
+import hashlib
+import time
 
-def getSession():
+oauth2_schema = OAuth2PasswordBearer(tokenUrl="auth/login-form")
+
+# usuários autenticados por id e dados já decodificados de cada token (id do usuário, jti e, no modo
+# sem estado, a identidade montada a partir das claims) por hash do token
+cache_usuarios = CacheLRU(configuracoes.CACHE_USUARIOS_TAMANHO, configuracoes.CACHE_USUARIOS_TTL)
+cache_tokens = CacheLRU(configuracoes.CACHE_TOKENS_TAMANHO, configuracoes.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+# caches exportados em /metrics, identificados pelo nome; outros módulos podem incluir os seus
+caches_monitorados = {"usuarios": cache_usuarios, "tokens": cache_tokens}
+
+def exportar_metricas_cache():
+    linhas = []
+    for campo, nome, tipo in (
+        ("acertos", "delivery_cache_acertos_total", "counter"),
+        ("falhas", "delivery_cache_falhas_total", "counter"),
+        ("descartes", "delivery_cache_descartes_total", "counter"),
+        ("tamanho", "delivery_cache_tamanho", "gauge"),
+    ):
+        linhas.append(f"# TYPE {nome} {tipo}")
+        for nome_cache, cache in caches_monitorados.items():
+            linhas.append(f'{nome}{{cache="{nome_cache}"}} {cache.estatisticas()[campo]}')
+    return linhas
+
+registrar_coletor(exportar_metricas_cache)
+
+async def getSession(conexao: HTTPConnection):
     """
-    Função de dependência para obter uma sessão do banco de dados. 
+    Função de dependência para obter uma sessão assíncrona do banco de dados. 
     Ela é usada para garantir que a sessão seja criada e fechada 
     corretamente em cada solicitação. A função pode ser usada em 
     rotas que precisam acessar o banco de dados, garantindo que a 
-    conexão seja gerenciada de forma eficiente e segura.
+    conexão seja gerenciada de forma eficiente e segura, sem bloquear
+    o event loop enquanto as consultas e commits são executados.
     """
-    Session = sessionmaker(bind=db)
-    session = Session()
-    try:
+    # a fábrica de sessões é criada uma única vez, no lifespan do app (HTTP ou WebSocket)
+    async with obter_fabrica_sessao(conexao.app)() as session:
         yield session
-    finally:
-        session.close()
 
-def verificar_token(token: str = Depends(oauth2_schema), session: Session = Depends(getSession)):
+def invalidar_usuario(id_usuario):
     """
-    Função para verificar a validade de um token JWT (JSON Web Token). Ela decodifica o token usando 
-    a chave secreta (SECRET_KEY) e o algoritmo de criptografia (ALGORITHM) definidos no sistema. Se 
-    o token for válido, a função extrai o ID do usuário (sub) do payload do token e consulta o banco
-    de dados para encontrar o usuário correspondente. Se o usuário for encontrado, ele é retornado; 
-    caso contrário, ou se o token for inválido, a função levanta uma exceção HTTP 401 (Unauthorized)
-    indicando que o token é inválido.
+    Função para remover um usuário do cache de autenticação. Ela é chamada automaticamente
+    após o commit de alterações nos campos admin e ativo (ou da exclusão do usuário) feitas
+    pelo ORM, e deve ser chamada explicitamente quando esses campos forem alterados por um
+    UPDATE direto no banco de dados.
     """
-    try:
-        payload_dict = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        id_usuario = int(payload_dict.get("sub"))
-        if id_usuario is None:
-            raise HTTPException(status_code=401, detail="Acesso inválido.")
+    cache_usuarios.invalidar(id_usuario)
+
+@event.listens_for(Session, "after_flush")
+def registrar_usuarios_alterados(session, flush_context):
+    alterados = session.info.setdefault("usuarios_alterados", set())
+    for objeto in session.dirty:
+        if isinstance(objeto, Usuario):
+            estado = inspect(objeto)
+            if estado.attrs.admin.history.has_changes() or estado.attrs.ativo.history.has_changes():
+                alterados.add(objeto.id)
+    for objeto in session.deleted:
+        if isinstance(objeto, Usuario):
+            alterados.add(objeto.id)
+
+@event.listens_for(Session, "after_commit")
+def invalidar_usuarios_alterados(session):
+    for id_usuario in session.info.pop("usuarios_alterados", ()):
+        invalidar_usuario(id_usuario)
+
+@event.listens_for(Session, "after_rollback")
+def descartar_usuarios_alterados(session):
+    session.info.pop("usuarios_alterados", None)
 
-        usuario = session.query(Usuario).filter(Usuario.id==id_usuario).first()
+async def carregar_usuario(session, id_usuario):
+    """
+    Função para obter um usuário pelo id a partir do cache de usuários ou, na falta dele, do banco de
+    dados. Se o usuário não existir, ela levanta uma exceção HTTP 401 (Unauthorized).
+    """
+    usuario = cache_usuarios.obter(id_usuario)
+    if usuario is None:
+        usuario = await session.scalar(select(Usuario).filter(Usuario.id==id_usuario))
         if not usuario:
             raise HTTPException(status_code=401, detail="Acesso inválido.")
+        # o objeto em cache é compartilhado entre requisições, por isso ele é desligado
+        # da sessão e deve ser tratado apenas como leitura pelas rotas
+        session.expunge(usuario)
+        cache_usuarios.definir(id_usuario, usuario)
+    return usuario
 
+async def verificar_token(token: str = Depends(oauth2_schema), session: AsyncSession = Depends(getSession)):
+    """
+    Função para verificar a validade de um token JWT (JSON Web Token). Ela decodifica o token com o
+    verificador montado a partir da chave secreta (SECRET_KEY) e do algoritmo (ALGORITHM) definidos no
+    sistema e recusa os tokens revogados (logout). No modo sem estado (TOKEN_SEM_ESTADO), o access
+    token traz o admin e o ativo do usuário assinados, e o usuário é montado a partir dessas claims sem
+    consulta ao banco de dados; nos demais casos (e para tokens sem essas claims, como o refresh token)
+    o ID do usuário (sub) é usado para consultar o usuário no banco de dados. Se o token for inválido,
+    revogado, de um usuário inexistente ou inativo, a função levanta uma exceção HTTP 401
+    (Unauthorized). Tokens já decodificados e usuários já consultados ficam em cache, evitando a
+    decodificação e a ida ao banco de dados a cada requisição.
+    """
+    try:
+        # o token é guardado pelo seu hash e nunca permanece no cache depois de expirar
+        chave_token = hashlib.sha256(token.encode()).digest()
+        dados_token = cache_tokens.obter(chave_token)
+        if dados_token is None:
+            with medir("jwt"):
+                payload_dict = verificador_token.decodificar(token)
+            if payload_dict.get("sub") is None:
+                raise HTTPException(status_code=401, detail="Acesso inválido.")
+            id_usuario = int(payload_dict["sub"])
+            identidade = None
+            if configuracoes.TOKEN_SEM_ESTADO and "adm" in payload_dict and "atv" in payload_dict:
+                identidade = IdentidadeToken(id_usuario, bool(payload_dict["adm"]), bool(payload_dict["atv"]))
+            dados_token = (id_usuario, payload_dict.get("jti"), identidade)
+            expira_em = time.monotonic() + payload_dict["exp"] - time.time()
+            cache_tokens.definir(chave_token, dados_token, expira_em=expira_em)
+        id_usuario, jti, identidade = dados_token
+
+        await tokens_revogados.atualizar(session)
+        if jti is not None and jti in tokens_revogados:
+            raise HTTPException(status_code=401, detail="Acesso inválido.")
+
+        usuario = identidade if identidade is not None else await carregar_usuario(session, id_usuario)
+        if not usuario.ativo:
+            raise HTTPException(status_code=401, detail="Acesso inválido.")
         return usuario
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Acesso inválido.")
\ No newline at end of file
+    except (JWTError, ValueError):
+        raise HTTPException(status_code=401, detail="Acesso inválido.")
@@ -0,0 +1,102 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from configuracoes import configuracoes
+from metricas import registrar_coletor
+import asyncio
+
+# canal usado pelos administradores para receber os eventos de todos os usuários
+TODOS_USUARIOS = "*"
+
+
+class BackendEventos(ABC):
+    """
+    Interface do transporte dos eventos entre os processos da aplicação. O hub publica cada evento
+    no backend, e o backend entrega a todos os processos (inclusive o que publicou) chamando a função
+    registrada em conectar(), que repassa o evento aos assinantes locais. Em uma implantação com
+    vários workers, um backend baseado em um serviço compartilhado (Redis pub/sub, LISTEN/NOTIFY do
+    PostgreSQL etc.) permite que um cliente conectado a um worker receba eventos gerados em outro.
+    """
+
+    @abstractmethod
+    def conectar(self, entregar):
+        """Registra a função entregar(id_usuario, evento) chamada para cada evento recebido."""
+
+    @abstractmethod
+    async def publicar(self, id_usuario, evento):
+        """Envia o evento de um usuário para todos os processos."""
+
+
+class BackendMemoria(BackendEventos):
+    """
+    Backend em memória, para um único processo: o evento publicado é entregue imediatamente aos
+    assinantes do próprio processo.
+    """
+
+    def __init__(self):
+        self._entregar = None
+
+    def conectar(self, entregar):
+        self._entregar = entregar
+
+    async def publicar(self, id_usuario, evento):
+        self._entregar(id_usuario, evento)
+
+
+class HubEventos:
+    """
+    Hub de publicação e assinatura de eventos de pedidos com distribuição por usuário. Cada assinante
+    recebe uma fila própria e limitada; quando um cliente lento deixa a fila encher, o evento mais
+    antigo é descartado para dar lugar ao novo, de forma que quem publica nunca fica bloqueado e o
+    cliente sempre recebe o estado mais recente do pedido.
+    """
+
+    def __init__(self, backend, tamanho_fila):
+        self.backend = backend
+        self.tamanho_fila = tamanho_fila
+        self.descartados = 0
+        self._assinantes = {}
+        backend.conectar(self._entregar)
+
+    @contextmanager
+    def assinar(self, canal):
+        """
+        Gerenciador de contexto que cria uma fila de eventos para o canal informado (o id de um
+        usuário ou TODOS_USUARIOS) e a remove ao final, quando o cliente se desconecta.
+        """
+        fila = asyncio.Queue(maxsize=self.tamanho_fila)
+        self._assinantes.setdefault(canal, set()).add(fila)
+        try:
+            yield fila
+        finally:
+            filas = self._assinantes.get(canal)
+            filas.discard(fila)
+            if not filas:
+                del self._assinantes[canal]
+
+    async def publicar(self, id_usuario, evento):
+        await self.backend.publicar(id_usuario, evento)
+
+    def _entregar(self, id_usuario, evento):
+        for canal in (id_usuario, TODOS_USUARIOS):
+            for fila in self._assinantes.get(canal, ()):
+                if fila.full():
+                    fila.get_nowait()
+                    self.descartados += 1
+                fila.put_nowait(evento)
+
+    def quantidade_assinantes(self):
+        return sum(len(filas) for filas in self._assinantes.values())
+
+
+# hub usado pelas rotas; para vários workers, basta trocar o BackendMemoria por um backend compartilhado
+hub_eventos = HubEventos(BackendMemoria(), configuracoes.EVENTOS_TAMANHO_FILA)
+
+def exportar_metricas_eventos():
+    return [
+        "# TYPE delivery_eventos_assinantes gauge",
+        f"delivery_eventos_assinantes {hub_eventos.quantidade_assinantes()}",
+        "# TYPE delivery_eventos_descartados_total counter",
+        f"delivery_eventos_descartados_total {hub_eventos.descartados}",
+    ]
+
+registrar_coletor(exportar_metricas_eventos)
@@ -0,0 +1,159 @@
+from sqlalchemy import exc
+from starlette.requests import HTTPConnection
+from database import obter_fabrica_sessao
+from metricas import registrar_coletor
+import asyncio
+import contextvars
+import weakref
+
+
+class GravadorLote:
+    """
+    Agrupador de escritas (group commit). As operações enviadas pelas requisições concorrentes entram
+    em uma fila e uma única tarefa gravadora as executa em lotes: ela espera no máximo "janela"
+    segundos ou até juntar "tamanho_lote" operações, executa todas na mesma transação e faz um só
+    commit, pagando um único fsync pelo lote inteiro. Como só a tarefa gravadora escreve, as
+    requisições não disputam o bloqueio de escrita do SQLite. Cada requisição recebe, pelo seu
+    future, o resultado da própria operação (por exemplo o id gerado). Se o lote falhar por causa de
+    uma operação, as operações são refeitas uma a uma para que só ela falhe; se faltar a conexão
+    (pool esgotado, banco fora do ar), todas falham de uma vez, sem novas esperas pelo pool.
+    """
+
+    def __init__(self, fabrica_sessao, janela, tamanho_lote):
+        self.fabrica_sessao = fabrica_sessao
+        self.janela = janela
+        self.tamanho_lote = tamanho_lote
+        self.lotes = 0
+        self.operacoes = 0
+        self._fila = None
+        self._tarefa = None
+
+    async def executar(self, operacao, *args):
+        """
+        Envia operacao(session, *args) para o próximo lote e aguarda o commit, devolvendo o resultado
+        da operação ou levantando a exceção que ela gerou.
+        """
+        loop = asyncio.get_running_loop()
+        if self._tarefa is None or self._tarefa.done() or self._tarefa.get_loop() is not loop:
+            self._fila = asyncio.Queue()
+            # contexto vazio para que os comandos SQL do gravador não sejam somados às métricas
+            # da requisição que por acaso iniciou a tarefa
+            self._tarefa = loop.create_task(self._gravar(), context=contextvars.Context())
+        futuro = loop.create_future()
+        self._fila.put_nowait((operacao, args, futuro))
+        return await futuro
+
+    async def parar(self):
+        """Interrompe a tarefa gravadora; as operações ainda na fila são descartadas."""
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            await asyncio.gather(self._tarefa, return_exceptions=True)
+            self._tarefa = None
+
+    async def _gravar(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = [await self._fila.get()]
+            limite = loop.time() + self.janela
+            while len(lote) < self.tamanho_lote:
+                if not self._fila.empty():
+                    lote.append(self._fila.get_nowait())
+                    continue
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(await asyncio.wait_for(self._fila.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+            await self._gravar_lote(lote)
+
+    async def _gravar_lote(self, lote):
+        # operações de requisições que já desistiram (cliente desconectado) não são gravadas
+        lote = [pendente for pendente in lote if not pendente[2].done()]
+        if not lote:
+            return
+        try:
+            async with self.fabrica_sessao() as session:
+                resultados = [await operacao(session, *args) for operacao, args, _ in lote]
+                await session.commit()
+        except Exception as erro:
+            if len(lote) == 1 or erro_conexao(erro):
+                for _, _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(erro)
+                return
+            # refaz as operações uma a uma para que só a operação com erro falhe
+            for pendente in lote:
+                await self._gravar_lote([pendente])
+            return
+
+        self.lotes += 1
+        self.operacoes += len(lote)
+        for (_, _, futuro), resultado in zip(lote, resultados):
+            if not futuro.done():
+                futuro.set_result(resultado)
+
+
+def erro_conexao(erro):
+    """
+    Indica se o erro é da obtenção ou da perda da conexão (tempo de espera do pool esgotado, conexão
+    caída), e não de uma operação do lote.
+    """
+    return isinstance(erro, (exc.TimeoutError, exc.DisconnectionError)) or (
+        isinstance(erro, exc.DBAPIError) and erro.connection_invalidated
+    )
+
+# gravadores dos apps do processo, somados na exportação das métricas
+gravadores_lote = weakref.WeakSet()
+
+def criar_gravador(configuracoes_app, fabrica_sessao):
+    """
+    Função para criar o gravador em lote de um app, com a janela e o tamanho de lote das configurações
+    do app. O agrupamento é opcional: com GRAVACAO_LOTE desligado a função retorna None e cada
+    requisição grava e faz commit na própria sessão.
+    """
+    if not configuracoes_app.GRAVACAO_LOTE:
+        return None
+    gravador = GravadorLote(fabrica_sessao, configuracoes_app.GRAVACAO_LOTE_JANELA_MS / 1000, configuracoes_app.GRAVACAO_LOTE_TAMANHO)
+    gravadores_lote.add(gravador)
+    return gravador
+
+async def obter_gravador(conexao: HTTPConnection):
+    """
+    Dependência que devolve o gravador em lote do app da requisição, ou None com GRAVACAO_LOTE
+    desligado. Normalmente ele já foi criado no lifespan; sem o lifespan, é criado no primeiro uso.
+    """
+    app = conexao.app
+    if app.state.configuracoes.GRAVACAO_LOTE and getattr(app.state, "gravador_lote", None) is None:
+        app.state.gravador_lote = criar_gravador(app.state.configuracoes, obter_fabrica_sessao(app))
+    return getattr(app.state, "gravador_lote", None)
+
+async def gravar(session, gravador, operacao, *args):
+    """
+    Função para executar uma operação de escrita operacao(session, *args) e gravá-la. Com um gravador
+    em lote (GRAVACAO_LOTE) a operação vai para ele, que usa a sua própria sessão; caso contrário ela
+    é executada na sessão da requisição, seguida de um commit.
+    """
+    if gravador is not None:
+        # a transação da sessão da requisição (só leituras) é encerrada antes da espera, devolvendo a
+        # conexão ao pool: o gravador usa outra conexão do mesmo pool e, com todas presas por
+        # requisições à espera do lote, ele nunca conseguiria gravar
+        await session.commit()
+        return await gravador.executar(operacao, *args)
+    resultado = await operacao(session, *args)
+    await session.commit()
+    return resultado
+
+def exportar_metricas_gravacao():
+    gravadores = list(gravadores_lote)
+    if not gravadores:
+        return []
+    return [
+        "# TYPE delivery_gravacao_lotes_total counter",
+        f"delivery_gravacao_lotes_total {sum(gravador.lotes for gravador in gravadores)}",
+        "# TYPE delivery_gravacao_operacoes_total counter",
+        f"delivery_gravacao_operacoes_total {sum(gravador.operacoes for gravador in gravadores)}",
+    ]
+
+registrar_coletor(exportar_metricas_gravacao)
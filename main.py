@@ -1,22 +1,88 @@
 from fastapi import FastAPI
-from passlib.context import CryptContext
-from fastapi.security import OAuth2PasswordBearer
-from dotenv import load_dotenv
-import os
+from fastapi.responses import ORJSONResponse
+from contextlib import asynccontextmanager
+from configuracoes import Configuracoes, configuracoes as configuracoes_processo
+import time
 
-load_dotenv()
-SECRET_KEY = os.getenv('SECRET_KEY')
-ALGORITHM = os.getenv('ALGORITHM')
-# ao difinir uma variável de ambiente ela é armazenada como string, por isso é necessário converter para int
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv('ACCESS_TOKEN_EXPIRE_MINUTES'))
 
-app = FastAPI()
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    """
+    Lifespan do app: cria a engine e o pool de conexões do banco de dados na inicialização do worker,
+    abre e testa DB_AQUECIMENTO_CONEXOES conexões antes de aceitar requisições, cria o catálogo de
+    produtos do app e carrega o seu índice, cria o gravador em lote (com GRAVACAO_LOTE) e a fila de
+    tarefas do app e inicia os seus workers; no encerramento, para os workers e o gravador e fecha as
+    conexões do pool.
+    """
+    from database import abrir_banco, aquecer_banco
+    from metricas import duracao_inicializacao
+    from tarefas import criar_fila_tarefas
+    from gravacao import criar_gravador
+    from catalogo import criar_catalogo_produtos
 
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_schema = OAuth2PasswordBearer(tokenUrl="auth/login-form")
+    inicio = time.perf_counter()
+    engine = abrir_banco(app)
+    await aquecer_banco(engine, app.state.configuracoes.DB_AQUECIMENTO_CONEXOES)
+    duracao_inicializacao["banco"] = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    app.state.catalogo_produtos = criar_catalogo_produtos(app.state.configuracoes)
+    async with app.state.fabrica_sessao() as session:
+        await app.state.catalogo_produtos.atualizar(session, forcar=True)
+    duracao_inicializacao["catalogo"] = time.perf_counter() - inicio
+    app.state.gravador_lote = criar_gravador(app.state.configuracoes, app.state.fabrica_sessao)
+    app.state.fila_tarefas = criar_fila_tarefas(app.state.configuracoes)
+    await app.state.fila_tarefas.iniciar(app.state.fabrica_sessao, app.state.configuracoes.TAREFAS_WORKERS, app.state.catalogo_produtos)
+    try:
+        yield
+    finally:
+        await app.state.fila_tarefas.parar()
+        app.state.fila_tarefas = None
+        if app.state.gravador_lote is not None:
+            await app.state.gravador_lote.parar()
+            app.state.gravador_lote = None
+        app.state.fabrica_sessao = None
+        await engine.dispose()
 
-from auth_routes import auth_router
-from order_routes import order_router
+def create_app(configuracoes: Configuracoes = None):
+    """
+    Função para montar o app FastAPI. As configurações são as informadas ou, se nenhuma for passada,
+    as das variáveis de ambiente; a engine do banco de dados usa as do app. As rotas (e com elas o
+    SQLAlchemy, o bcrypt e o JWT) só são importadas aqui e a engine só é criada no lifespan, então
+    importar este módulo é barato e não abre conexões. Os caches, os limites de admissão e o pool
+    do bcrypt são do processo e usam as configurações do ambiente.
+    """
+    inicio = time.perf_counter()
+    from metricas import medir_requisicao, metricas_router, duracao_inicializacao
+    from auth_routes import auth_router
+    from order_routes import order_router, order_ws_router
+    from analytics_routes import analytics_router
+    from data_routes import data_router
+    from catalog_routes import catalog_router
 
-app.include_router(auth_router)
-app.include_router(order_router)
\ No newline at end of file
+    # as respostas são serializadas com orjson, bem mais rápido que o json da biblioteca padrão
+    app = FastAPI(default_response_class=ORJSONResponse, lifespan=ciclo_de_vida)
+    app.state.configuracoes = configuracoes or configuracoes_processo
+    app.state.fabrica_sessao = None
+    app.state.fila_tarefas = None
+    app.state.catalogo_produtos = None
+    app.state.gravador_lote = None
+
+    app.middleware("http")(medir_requisicao)
+
+    app.include_router(auth_router)
+    app.include_router(order_router)
+    app.include_router(order_ws_router)
+    app.include_router(analytics_router)
+    app.include_router(data_router)
+    app.include_router(catalog_router)
+    app.include_router(metricas_router)
+    duracao_inicializacao["app"] = time.perf_counter() - inicio
+    return app
+
+def __getattr__(nome):
+    # o app padrão é montado no primeiro acesso a main.app, então "uvicorn main:app" e "from main
+    # import app" continuam funcionando; "uvicorn main:create_app --factory" monta o app diretamente
+    if nome == "app":
+        app = globals()["app"] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
@@ -0,0 +1,195 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from contextlib import contextmanager
+import contextvars
+import os
+import time
+
+# apenas as rotas da API são medidas
+PREFIXOS_MEDIDOS = ("/auth", "/orders", "/analytics", "/data", "/catalog")
+# limites (em segundos) dos buckets do histograma de latência
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# medições da requisição em andamento: quantidade de comandos SQL e tempo gasto em cada componente
+medicoes_requisicao = contextvars.ContextVar("medicoes_requisicao", default=None)
+
+metricas_router = APIRouter(tags=["metricas"])
+
+
+class Histograma:
+    """
+    Histograma cumulativo no formato do Prometheus: conta quantas observações ficaram abaixo de
+    cada limite e guarda a soma e a quantidade total de observações.
+    """
+
+    def __init__(self, limites=LIMITES_LATENCIA):
+        self.limites = limites
+        self.contagens = [0] * len(limites)
+        self.soma = 0.0
+        self.quantidade = 0
+
+    def observar(self, valor):
+        for indice, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.contagens[indice] += 1
+        self.soma += valor
+        self.quantidade += 1
+
+
+class Metricas:
+    """
+    Acumula as medições de todas as requisições por rota e as exporta no formato texto do
+    Prometheus. Outros módulos podem registrar coletores, funções que devolvem linhas de
+    métricas próprias a serem incluídas na exportação.
+    """
+
+    def __init__(self):
+        self.latencias = {}
+        self.respostas = {}
+        self.componentes = {}
+        self.coletores = []
+
+    def registrar(self, metodo, rota, status, duracao, medicoes):
+        chave = (metodo, rota)
+        self.latencias.setdefault(chave, Histograma()).observar(duracao)
+        self.respostas[(metodo, rota, status)] = self.respostas.get((metodo, rota, status), 0) + 1
+        acumulado = self.componentes.setdefault(chave, {})
+        for componente, valor in medicoes.items():
+            acumulado[componente] = acumulado.get(componente, 0) + valor
+
+    def exportar(self):
+        linhas = [
+            "# HELP delivery_requisicao_duracao_segundos Latência das requisições por rota.",
+            "# TYPE delivery_requisicao_duracao_segundos histogram",
+        ]
+        for (metodo, rota), histograma in sorted(self.latencias.items()):
+            rotulos = f'metodo="{metodo}",rota="{rota}"'
+            for limite, contagem in zip(histograma.limites, histograma.contagens):
+                linhas.append(f'delivery_requisicao_duracao_segundos_bucket{{{rotulos},le="{limite}"}} {contagem}')
+            linhas.append(f'delivery_requisicao_duracao_segundos_bucket{{{rotulos},le="+Inf"}} {histograma.quantidade}')
+            linhas.append(f"delivery_requisicao_duracao_segundos_sum{{{rotulos}}} {histograma.soma}")
+            linhas.append(f"delivery_requisicao_duracao_segundos_count{{{rotulos}}} {histograma.quantidade}")
+
+        linhas.append("# HELP delivery_respostas_total Respostas por rota e status HTTP.")
+        linhas.append("# TYPE delivery_respostas_total counter")
+        for (metodo, rota, status), quantidade in sorted(self.respostas.items()):
+            linhas.append(f'delivery_respostas_total{{metodo="{metodo}",rota="{rota}",status="{status}"}} {quantidade}')
+
+        for componente, nome, ajuda in (
+            ("sql_comandos", "delivery_sql_comandos_total", "Comandos SQL executados por rota."),
+            ("db", "delivery_db_segundos_total", "Tempo gasto em comandos SQL por rota."),
+            ("bcrypt", "delivery_bcrypt_segundos_total", "Tempo gasto com bcrypt por rota."),
+            ("jwt", "delivery_jwt_segundos_total", "Tempo gasto codificando e decodificando JWT por rota."),
+        ):
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} counter")
+            for (metodo, rota), acumulado in sorted(self.componentes.items()):
+                linhas.append(f'{nome}{{metodo="{metodo}",rota="{rota}"}} {acumulado.get(componente, 0)}')
+
+        for coletor in self.coletores:
+            linhas.extend(coletor())
+        return "\n".join(linhas) + "\n"
+
+
+metricas = Metricas()
+
+
+def registrar_coletor(coletor):
+    """
+    Função para incluir na exportação de /metrics as linhas devolvidas pelo coletor informado.
+    """
+    metricas.coletores.append(coletor)
+
+
+# duração (em segundos) de cada etapa da inicialização do worker: montagem do app e conexão com o banco
+duracao_inicializacao = {}
+
+def exportar_metricas_inicializacao():
+    # o pid identifica o worker que respondeu quando há vários processos atrás da mesma porta
+    linhas = ["# TYPE delivery_processo_pid gauge", f"delivery_processo_pid {os.getpid()}"]
+    linhas.append("# TYPE delivery_inicializacao_segundos gauge")
+    for etapa, duracao in sorted(duracao_inicializacao.items()):
+        linhas.append(f'delivery_inicializacao_segundos{{etapa="{etapa}"}} {duracao}')
+    return linhas
+
+registrar_coletor(exportar_metricas_inicializacao)
+
+
+@contextmanager
+def medir(componente):
+    """
+    Gerenciador de contexto que soma o tempo gasto no bloco ao componente informado (por exemplo
+    "bcrypt" ou "jwt") nas medições da requisição em andamento.
+    """
+    medicoes = medicoes_requisicao.get()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        if medicoes is not None:
+            medicoes[componente] = medicoes.get(componente, 0) + time.perf_counter() - inicio
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def iniciar_comando_sql(conexao, cursor, comando, parametros, contexto, executemany):
+    conexao.info.setdefault("inicio_comandos", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def finalizar_comando_sql(conexao, cursor, comando, parametros, contexto, executemany):
+    inicio = conexao.info["inicio_comandos"].pop()
+    medicoes = medicoes_requisicao.get()
+    if medicoes is not None:
+        medicoes["sql_comandos"] += 1
+        medicoes["db"] += time.perf_counter() - inicio
+
+
+@event.listens_for(Engine, "handle_error")
+def descartar_comando_sql(contexto_erro):
+    if contexto_erro.connection is not None and contexto_erro.connection.info.get("inicio_comandos"):
+        contexto_erro.connection.info["inicio_comandos"].pop()
+
+
+async def medir_requisicao(request: Request, call_next):
+    """
+    Middleware que mede cada requisição das rotas de autenticação e de pedidos: a latência total,
+    a quantidade de comandos SQL e o tempo gasto no banco de dados (obtidos pelos eventos da engine
+    do SQLAlchemy), e o tempo gasto com bcrypt e JWT. As medições são acumuladas por rota para o
+    endpoint /metrics e devolvidas ao cliente no cabeçalho Server-Timing.
+    """
+    if not request.url.path.startswith(PREFIXOS_MEDIDOS):
+        return await call_next(request)
+
+    medicoes = {"sql_comandos": 0, "db": 0.0, "bcrypt": 0.0, "jwt": 0.0}
+    token = medicoes_requisicao.set(medicoes)
+    inicio = time.perf_counter()
+    try:
+        resposta = await call_next(request)
+    finally:
+        medicoes_requisicao.reset(token)
+    duracao = time.perf_counter() - inicio
+
+    # usa o caminho da rota (com os parâmetros sem valor) para não criar uma série por id
+    rota = request.scope.get("route")
+    caminho = rota.path if rota is not None else "nao_encontrada"
+    metricas.registrar(request.method, caminho, resposta.status_code, duracao, medicoes)
+
+    resposta.headers["Server-Timing"] = ", ".join([
+        f"app;dur={duracao * 1000:.2f}",
+        f'db;dur={medicoes["db"] * 1000:.2f};desc="{medicoes["sql_comandos"]} comandos SQL"',
+        f"bcrypt;dur={medicoes['bcrypt'] * 1000:.2f}",
+        f"jwt;dur={medicoes['jwt'] * 1000:.2f}",
+    ])
+    return resposta
+
+
+@metricas_router.get("/metrics", response_class=PlainTextResponse)
+async def exportar_metricas():
+    """
+    Essa é a rota que expõe as métricas de desempenho da API no formato texto do Prometheus:
+    histogramas de latência, respostas por status, comandos SQL, tempo de banco, bcrypt e JWT por
+    rota, além das métricas registradas por outros módulos (como os caches de autenticação).
+    """
+    return metricas.exportar()
@@ -1,12 +1,61 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, Float, ForeignKey
+from sqlalchemy import Column, Integer, SmallInteger, String, Text, Boolean, DateTime, ForeignKey, JSON, TypeDecorator, Index, UniqueConstraint, update, delete, type_coerce, text, func, event, DDL
 from sqlalchemy.orm import declarative_base, relationship
-from sqlalchemy_utils.types import ChoiceType
-
-# conexãop do banco de dados
-db = create_engine('sqlite:///database.db', echo=True)
+from sqlalchemy.ext.asyncio import AsyncAttrs
+from decimal import Decimal
+from enum import IntEnum
 
 # cria a base do banco de dados
-Base = declarative_base()
+# AsyncAttrs permite carregar relacionamentos de forma assíncrona com "await objeto.awaitable_attrs.relacao"
+Base = declarative_base(cls=AsyncAttrs)
+
+def para_centavos(valor):
+    """
+    Função para converter um valor em reais (float, Decimal ou string) para um número inteiro
+    de centavos, arredondando na segunda casa decimal.
+    """
+    return int((Decimal(str(valor)) * 100).to_integral_value())
+
+class Dinheiro(TypeDecorator):
+    """
+    Tipo para valores monetários. No banco de dados o valor é armazenado como um número inteiro
+    de centavos, para que somas e atualizações incrementais não acumulem erros de ponto flutuante;
+    no Python o valor continua sendo lido e escrito em reais.
+    """
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return para_centavos(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return value / 100
+
+class EnumInteiro(TypeDecorator):
+    """
+    Tipo para enums inteiros (IntEnum). No banco de dados é armazenado o valor do membro em um
+    SmallInteger e no Python é devolvido o membro do enum. Faz o mesmo que o ChoiceType do
+    sqlalchemy-utils, cuja importação sozinha custava mais de 100 ms na inicialização de cada worker.
+    """
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, enum):
+        super().__init__()
+        self.enum = enum
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return self.enum(value).value
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return self.enum(value)
 
 # criar as classes/tabelas
 # usuário
@@ -32,46 +81,305 @@ class Usuario(Base):
         self.ativo = ativo
         self.admin = admin
 
+class TokenRevogado(Base):
+    """
+    Tokens revogados antes da expiração (logout), identificados pelo jti. A linha só precisa existir
+    até a expiração do token, quando ele deixa de ser aceito de qualquer forma.
+    """
+    __tablename__ = 'tokens_revogados'
+
+    jti = Column("jti", String(32), primary_key=True)
+    expira_em = Column("expira_em", DateTime, nullable=False, index=True)
+
+class StatusPedido(IntEnum):
+    """
+    Status do pedido, armazenado no banco de dados como um inteiro pequeno.
+    """
+    PENDENTE = 1
+    FINALIZADO = 2
+    CANCELADO = 3
+
+# transições de status permitidas: status atual -> status para os quais o pedido pode ir
+TRANSICOES_STATUS = {
+    StatusPedido.PENDENTE: {StatusPedido.FINALIZADO, StatusPedido.CANCELADO},
+    StatusPedido.FINALIZADO: set(),
+    StatusPedido.CANCELADO: set(),
+}
+
 class Pedido(Base):
     __tablename__ = 'pedidos'
 
-    # STATUS_PEDIDO = [
-    #     ('PENDENTE', 'Pendente'),
-    #     ('EM_PREPARACAO', 'Em Preparação'),
-    #     ('PRONTO', 'Pronto'),
-    #     ('ENTREGUE', 'Entregue'),
-    #     ('CANCELADO', 'Cancelado')
-    # ]
-
     id = Column("id", Integer, primary_key=True, autoincrement=True)
-    status = Column("status", String, nullable=False)
+    status = Column("status", EnumInteiro(StatusPedido), nullable=False)
     usuario = Column("usuario", Integer, ForeignKey('usuarios.id'), nullable=False)
-    total = Column("total", Float, nullable=False)
+    total = Column("total", Dinheiro, nullable=False)
+    qtde_itens = Column("qtde_itens", Integer, nullable=False, default=0)
+    # versão da linha, incrementada a cada alteração de status ou de itens; usada nos ETags das
+    # leituras e no controle de concorrência otimista (If-Match) das alterações
+    versao = Column("versao", Integer, nullable=False)
+    criado_em = Column("criado_em", DateTime, nullable=False, server_default=func.now())
     itens = relationship("ItemPedido", cascade="all, delete")
 
-    def __init__(self, usuario, status='PENDENTE', total=0):
+    __table_args__ = (
+        # pedidos de um usuário e listagens por status, já ordenados por id para a paginação por cursor
+        Index("ix_pedidos_usuario_id", "usuario", "id"),
+        Index("ix_pedidos_status_id", "status", "id"),
+        # filtros por período nos relatórios de vendas
+        Index("ix_pedidos_criado_em", "criado_em"),
+        # índice parcial só com os pedidos em aberto, bem menor que a tabela inteira
+        Index(
+            "ix_pedidos_abertos_usuario_id", "usuario", "id",
+            sqlite_where=text(f"status = {StatusPedido.PENDENTE.value}"),
+            postgresql_where=text(f"status = {StatusPedido.PENDENTE.value}")
+        ),
+    )
+    # o SQLAlchemy incrementa a versão nas alterações feitas pela sessão; os UPDATEs montados abaixo
+    # incrementam a versão explicitamente
+    __mapper_args__ = {"version_id_col": versao}
+
+    def __init__(self, usuario, status=StatusPedido.PENDENTE, total=0, qtde_itens=0):
         self.status = status
         self.usuario = usuario
         self.total = total
+        self.qtde_itens = qtde_itens
+
+    @staticmethod
+    def alterar_status(id_pedido, novo_status, id_usuario=None, versao=None):
+        """
+        Monta o comando que leva um pedido para novo_status em um único UPDATE condicional: o status
+        só é alterado se o status atual for um dos que podem ir para novo_status (conforme
+        TRANSICOES_STATUS), quando id_usuario é informado, se o pedido pertencer a esse usuário e,
+        quando versao é informada, se o pedido ainda estiver nessa versão. O comando incrementa a
+        versão e devolve (RETURNING) o pedido alterado, ou nada se a condição não foi atendida.
+        """
+        status_origem = [status for status, destinos in TRANSICOES_STATUS.items() if novo_status in destinos]
+        comando = update(Pedido).filter(Pedido.id == id_pedido, Pedido.status.in_(status_origem))
+        if id_usuario is not None:
+            comando = comando.filter(Pedido.usuario == id_usuario)
+        if versao is not None:
+            comando = comando.filter(Pedido.versao == versao)
+        return (
+            comando
+            .values(status=novo_status, versao=Pedido.versao + 1)
+            .returning(Pedido)
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def ajustar_totais(id_pedido, valor_centavos, qtde_itens, versao=None):
+        """
+        Monta o comando que soma valor_centavos ao total e qtde_itens à quantidade de itens de um
+        pedido em um único UPDATE atômico (total = total + :valor), sem carregar os itens e sem
+        perder atualizações de outras requisições concorrentes. Só pedidos pendentes são alterados
+        (os itens de um pedido finalizado ou cancelado não mudam, mesmo que o pedido tenha sido
+        encerrado por outra requisição depois de lido) e, quando versao é informada, só se o pedido
+        ainda estiver nessa versão. O comando incrementa a versão e devolve (RETURNING) o total, a
+        quantidade de itens e a versão resultantes, ou nada se o pedido não foi alterado.
+        """
+        comando = update(Pedido).filter(Pedido.id == id_pedido, Pedido.status == StatusPedido.PENDENTE)
+        if versao is not None:
+            comando = comando.filter(Pedido.versao == versao)
+        return (
+            comando
+            .values(
+                total=type_coerce(Pedido.total, Integer) + valor_centavos,
+                qtde_itens=Pedido.qtde_itens + qtde_itens,
+                versao=Pedido.versao + 1
+            )
+            .returning(Pedido.total, Pedido.qtde_itens, Pedido.versao)
+            .execution_options(synchronize_session=False)
+        )
+
+class Produto(Base):
+    """
+    Catálogo de produtos: cada combinação de sabor e tamanho é um produto, com o preço atual e a
+    disponibilidade. Os itens dos pedidos guardam o id do produto e o preço cobrado no momento do
+    pedido, então uma alteração de preço não muda os pedidos existentes. Os produtos não são
+    excluídos nem renomeados (ficam indisponíveis), para que os itens antigos continuem válidos.
+    versao guarda a versão do catálogo (VersaoCatalogo) da última inclusão ou alteração do produto.
+    """
+    __tablename__ = 'produtos'
+
+    id = Column("id", Integer, primary_key=True, autoincrement=True)
+    sabor = Column("sabor", String(50), nullable=False)
+    tamanho = Column("tamanho", String(20), nullable=False)
+    preco = Column("preco", Dinheiro, nullable=False)
+    disponivel = Column("disponivel", Boolean, nullable=False, default=True)
+    versao = Column("versao", Integer, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("sabor", "tamanho", name="uq_produtos_sabor_tamanho"),
+    )
+
+class VersaoCatalogo(Base):
+    """
+    Versão do catálogo de produtos, em uma única linha (id 1). Cada inclusão ou alteração de produtos
+    incrementa a versão com um UPDATE ... RETURNING na mesma transação; o bloqueio da linha até o
+    commit faz com que alterações simultâneas recebam versões diferentes e crescentes, o que a maior
+    versão da tabela produtos mais um não garante no PostgreSQL. Cada processo confere essa linha
+    para saber se o seu índice de preços (catalogo.py) está atualizado.
+    """
+    __tablename__ = 'versao_catalogo'
+
+    id = Column("id", Integer, primary_key=True)
+    versao = Column("versao", Integer, nullable=False)
 
-    def calcular_total(self):
-        self.total = sum(item.quantidade * item.preco_unitario for item in self.itens)
+    @staticmethod
+    def incrementar():
+        """
+        Monta o UPDATE que incrementa a versão do catálogo e retorna a nova versão, usada nos INSERTs
+        e UPDATEs da tabela de produtos.
+        """
+        return (update(VersaoCatalogo).filter(VersaoCatalogo.id == 1)
+            .values(versao=VersaoCatalogo.versao + 1)
+            .returning(VersaoCatalogo.versao)
+            .execution_options(synchronize_session=False))
+
+# a linha da versão é criada junto com a tabela (create_all); nos bancos migrados, pela migração
+event.listen(VersaoCatalogo.__table__, "after_create", DDL("INSERT INTO versao_catalogo (id, versao) VALUES (1, 0)"))
 
 class ItemPedido(Base):
     __tablename__ = 'itens_pedido'
 
     id = Column("id", Integer, primary_key=True, autoincrement=True)
     quantidade = Column("quantidade", Integer, nullable=False)
-    sabor = Column("sabor", String(50), nullable=False)
-    tamanho = Column("tamanho", String(20), nullable=False)
-    preco_unitario = Column("preco_unitario", Float, nullable=False)
-    pedido = Column("pedido", Integer, ForeignKey('pedidos.id'), nullable=False)
+    # o sabor e o tamanho ficam no catálogo; o preço é o do produto no momento em que o item foi incluído
+    produto = Column("produto", Integer, ForeignKey('produtos.id'), nullable=False)
+    preco_unitario = Column("preco_unitario", Dinheiro, nullable=False)
+    pedido = Column("pedido", Integer, ForeignKey('pedidos.id'), nullable=False, index=True)
 
-    def __init__(self, pedido, quantidade, sabor, tamanho, preco_unitario):
+    def __init__(self, pedido, quantidade, produto, preco_unitario):
         self.pedido = pedido
         self.quantidade = quantidade
-        self.sabor = sabor
-        self.tamanho = tamanho
+        self.produto = produto
         self.preco_unitario = preco_unitario
 
+    def valor_centavos(self):
+        return self.quantidade * para_centavos(self.preco_unitario)
+
+    @staticmethod
+    def remover(id_pedido, ids_itens):
+        """
+        Monta o DELETE dos itens informados que pertencem ao pedido, devolvendo (RETURNING) o id, a
+        quantidade e o preço de cada linha excluída. Os totais do pedido devem ser ajustados só pelas
+        linhas devolvidas: com requisições concorrentes removendo o mesmo item, apenas uma delas
+        recebe a linha e as demais não alteram o total.
+        """
+        return (
+            delete(ItemPedido)
+            .filter(ItemPedido.id.in_(ids_itens), ItemPedido.pedido == id_pedido)
+            .returning(ItemPedido.id, ItemPedido.quantidade, ItemPedido.preco_unitario)
+            .execution_options(synchronize_session=False)
+        )
+
+class ResumoPedido(Base):
+    """
+    Projeção de leitura com uma linha de resumo por pedido (status, total, quantidade de itens e data
+    da última alteração), mantida pelas rotas que alteram os pedidos na mesma transação da alteração.
+    A listagem dos pedidos de um usuário é lida só desta tabela, pelo índice (usuario, pedido), sem
+    juntar pedidos e itens. Pode ser reconstruída a partir das tabelas de pedidos e itens com
+    "python resumo_pedidos.py".
+    """
+    __tablename__ = 'resumo_pedidos'
+
+    pedido = Column("pedido", Integer, ForeignKey('pedidos.id'), primary_key=True, autoincrement=False)
+    usuario = Column("usuario", Integer, ForeignKey('usuarios.id'), nullable=False)
+    status = Column("status", EnumInteiro(StatusPedido), nullable=False)
+    total = Column("total", Dinheiro, nullable=False)
+    qtde_itens = Column("qtde_itens", Integer, nullable=False)
+    atualizado_em = Column("atualizado_em", DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_resumo_pedidos_usuario_pedido", "usuario", "pedido"),
+    )
+
+    @staticmethod
+    def atualizar(id_pedido, **valores):
+        """
+        Monta o comando que copia para o resumo do pedido os valores informados (status, total ou
+        qtde_itens), registrando a data da alteração.
+        """
+        return (
+            update(ResumoPedido)
+            .filter(ResumoPedido.pedido == id_pedido)
+            .values(**valores, atualizado_em=func.now())
+            .execution_options(synchronize_session=False)
+        )
+
+class PedidoArquivado(Base):
+    """
+    Arquivo dos pedidos encerrados (finalizados ou cancelados) antigos, movidos da tabela pedidos por
+    "python arquivamento.py". Mantém os mesmos ids e valores do pedido original, além da data da
+    última alteração e da data do arquivamento, e deixa a tabela de pedidos e os seus índices só com
+    os pedidos em uso.
+    """
+    __tablename__ = 'pedidos_arquivados'
+
+    id = Column("id", Integer, primary_key=True, autoincrement=False)
+    status = Column("status", EnumInteiro(StatusPedido), nullable=False)
+    usuario = Column("usuario", Integer, ForeignKey('usuarios.id'), nullable=False)
+    total = Column("total", Dinheiro, nullable=False)
+    qtde_itens = Column("qtde_itens", Integer, nullable=False)
+    versao = Column("versao", Integer, nullable=False)
+    criado_em = Column("criado_em", DateTime, nullable=False)
+    atualizado_em = Column("atualizado_em", DateTime, nullable=False)
+    arquivado_em = Column("arquivado_em", DateTime, nullable=False, server_default=func.now())
+    itens = relationship("ItemPedidoArquivado")
+
+    __table_args__ = (
+        Index("ix_pedidos_arquivados_usuario_id", "usuario", "id"),
+        Index("ix_pedidos_arquivados_criado_em", "criado_em"),
+    )
+
+class ItemPedidoArquivado(Base):
+    __tablename__ = 'itens_pedido_arquivados'
+
+    id = Column("id", Integer, primary_key=True, autoincrement=False)
+    quantidade = Column("quantidade", Integer, nullable=False)
+    produto = Column("produto", Integer, ForeignKey('produtos.id'), nullable=False)
+    preco_unitario = Column("preco_unitario", Dinheiro, nullable=False)
+    pedido = Column("pedido", Integer, ForeignKey('pedidos_arquivados.id'), nullable=False, index=True)
+
+class Tarefa(Base):
+    """
+    Fila de tarefas em segundo plano (tarefas.py). A tarefa é gravada na mesma transação da alteração
+    que a originou e a chave de idempotência é única, então enfileirar de novo a mesma chave não cria
+    outra tarefa. disponivel_em é o instante a partir do qual a tarefa pode ser executada: ele é
+    adiado pelo backoff depois de uma falha e pelo prazo de execução enquanto um worker a executa.
+    A linha de uma tarefa concluída é mantida por algum tempo para que a chave continue valendo.
+    """
+    __tablename__ = 'tarefas'
+
+    id = Column("id", Integer, primary_key=True, autoincrement=True)
+    tipo = Column("tipo", String(50), nullable=False)
+    chave = Column("chave", String(200), nullable=False, unique=True)
+    dados = Column("dados", JSON, nullable=False)
+    tentativas = Column("tentativas", Integer, nullable=False, default=0)
+    criado_em = Column("criado_em", DateTime, nullable=False)
+    disponivel_em = Column("disponivel_em", DateTime, nullable=False)
+    concluida_em = Column("concluida_em", DateTime, nullable=True)
+
+    __table_args__ = (
+        # tarefas pendentes (concluida_em nulo) por ordem de disponibilidade, e concluídas antigas a remover
+        Index("ix_tarefas_concluida_disponivel", "concluida_em", "disponivel_em"),
+    )
+
+class TarefaFalha(Base):
+    """
+    Tarefas que falharam em todas as tentativas (dead letter), com o erro da última tentativa. Saem
+    da fila para não serem tentadas para sempre e podem ser devolvidas a ela depois de corrigido o
+    problema, com "python tarefas.py --reprocessar-falhas".
+    """
+    __tablename__ = 'tarefas_falhas'
+
+    id = Column("id", Integer, primary_key=True, autoincrement=True)
+    tarefa = Column("tarefa", Integer, nullable=False)
+    tipo = Column("tipo", String(50), nullable=False)
+    chave = Column("chave", String(200), nullable=False, index=True)
+    dados = Column("dados", JSON, nullable=False)
+    tentativas = Column("tentativas", Integer, nullable=False)
+    erro = Column("erro", Text, nullable=False)
+    criado_em = Column("criado_em", DateTime, nullable=False)
+    falhou_em = Column("falhou_em", DateTime, nullable=False, server_default=func.now())
+
 # executa a criação dos metadados no banco de dados
\ No newline at end of file
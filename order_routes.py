@@ -1,14 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect, status as status_http
+from fastapi.responses import StreamingResponse
 from dependencies import getSession, verificar_token
-from schemas import PedidoSchema, ItemPedidoSchema, ResponsePedidoSchema
-from sqlalchemy.orm import Session
-from models import Pedido, Usuario, ItemPedido
-from typing import List
-
-order_router = APIRouter(prefix="/orders", tags=["orders"], dependencies=[Depends(verificar_token)])
-
-
-@order_router.get("/")
+from admissao import admitir_escrita_pedidos
+from database import obter_fabrica_sessao
+from eventos import hub_eventos, TODOS_USUARIOS
+from gravacao import GravadorLote, gravar, obter_gravador
+from tarefas import BackendTarefas, obter_fila_tarefas, TAREFAS_PEDIDO_FINALIZADO
+from catalogo import CatalogoProdutos, obter_catalogo_requisicao
+from configuracoes import configuracoes
+from schemas import PedidoSchema, ItemPedidoSchema, LoteItensPedidoSchema, ResponsePedidoSchema, ResponseResumoPedidoSchema
+from schemas import ResponseMensagemSchema, ResponseCriarPedidoSchema, ResponseMensagemPedidoSchema, ResponseListarPedidosSchema
+from schemas import ResponseObterPedidoSchema, ResponseAdicionarItemSchema, ResponseRemoverItemSchema, ResponseLoteItensPedidoSchema
+from schemas import ResponseMeusPedidosSchema
+from sqlalchemy import select, insert, func
+from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Pedido, Usuario, ItemPedido, ResumoPedido, PedidoArquivado, StatusPedido, para_centavos
+from typing import List, Optional
+import asyncio
+import orjson
+
+# o catálogo do app é definido em todas as rotas, para a serialização dos itens nas respostas
+order_router = APIRouter(prefix="/orders", tags=["orders"], dependencies=[Depends(verificar_token), Depends(obter_catalogo_requisicao)])
+# o WebSocket não envia o cabeçalho Authorization, então o token é validado na própria rota
+order_ws_router = APIRouter(prefix="/orders", tags=["orders"])
+
+
+@order_router.get("/", response_model=ResponseMensagemSchema)
 async def pedidos():
     """
     Essa é a rota padrão de pedidos do sistema. Ela pode ser usada para listar os pedidos existentes ou para verificar se a rota está funcionando corretamente. No futuro, essa rota pode ser expandida para incluir funcionalidades como criação, atualização e exclusão de pedidos, bem como a integração com um banco de dados para armazenar as informações dos pedidos.
@@ -17,61 +36,396 @@ async def pedidos():
         "message": "Você acessou a rota padrão de ordem!"
     }
 
-@order_router.post("/pedido")
-async def criar_pedido(pedido_schema: PedidoSchema, session: Session = Depends(getSession)):
+@order_router.post("/pedido", response_model=ResponseCriarPedidoSchema, dependencies=[Depends(admitir_escrita_pedidos)])
+async def criar_pedido(pedido_schema: PedidoSchema, session: AsyncSession = Depends(getSession), gravador: Optional[GravadorLote] = Depends(obter_gravador)):
     """
     Essa é a rota para criar um novo pedido. Ela pode ser usada para receber os detalhes do pedido, como os itens, 
     quantidades e informações do cliente, e processar a criação do pedido no sistema. No futuro, essa rota pode ser 
     expandida para incluir validação dos dados de entrada, integração com um banco de dados para armazenar as 
     informações do pedido e lógica adicional para calcular o total do pedido ou verificar a disponibilidade dos itens.
     """
-    novo_pedido = Pedido(
-        usuario=pedido_schema.usuario
-    )
-
-    session.add(novo_pedido)
-    session.commit()
+    id_pedido = await gravar(session, gravador, inserir_pedido, pedido_schema.usuario)
     return {
         "message": f"Pedido criado com sucesso para o usuário {pedido_schema.usuario}!",
-        "pedido_id": novo_pedido.id
+        "pedido_id": id_pedido
     }
 
-@order_router.post("pedido/cancelar/{id_pedido}")
-async def cancelar_pedido(id_pedido: int, session: Session = Depends(getSession), usuario: Usuario = Depends(verificar_token)):
-    pedido = session.query(Pedido).filter(Pedido.id==id_pedido).first()
-
-    if not pedido:
-        raise HTTPException(status_code=400, detail="Pedido não encontrado")
-
-    if not usuario.admin and usuario.id != pedido.usuario:
-        raise HTTPException(status_code=401, detail="Você não tem autorização para fazer essa modificação")
+async def inserir_pedido(session, id_usuario):
+    """
+    Operação de escrita que insere um novo pedido em aberto, junto com a sua linha de resumo, e
+    devolve o id gerado.
+    """
+    id_pedido = await session.scalar(
+        insert(Pedido)
+        .values(usuario=id_usuario, status=StatusPedido.PENDENTE, total=0, qtde_itens=0, versao=1)
+        .returning(Pedido.id)
+    )
+    await session.execute(
+        insert(ResumoPedido)
+        .values(pedido=id_pedido, usuario=id_usuario, status=StatusPedido.PENDENTE, total=0, qtde_itens=0)
+    )
+    return id_pedido
 
-    pedido.status = "CANCELADO"
-    pedido.commit()
+async def inserir_item_pedido(session, item_pedido, versao=None):
+    """
+    Operação de escrita que insere um item e soma o seu valor ao total do pedido, devolvendo o id do
+    item, o novo total, a nova quantidade de itens e a nova versão do pedido. Quando versao é
+    informada, o item só é gravado se o pedido ainda estiver nessa versão.
+    """
+    id_item = await session.scalar(
+        insert(ItemPedido)
+        .values(
+            pedido=item_pedido.pedido,
+            quantidade=item_pedido.quantidade,
+            produto=item_pedido.produto,
+            preco_unitario=item_pedido.preco_unitario
+        )
+        .returning(ItemPedido.id)
+    )
+    totais = (await session.execute(Pedido.ajustar_totais(item_pedido.pedido, item_pedido.valor_centavos(), 1, versao))).one_or_none()
+    if totais is None:
+        await recusar_ajuste_totais(session, item_pedido.pedido)
+    await session.execute(ResumoPedido.atualizar(item_pedido.pedido, total=totais.total, qtde_itens=totais.qtde_itens))
+    return id_item, totais.total, totais.qtde_itens, totais.versao
+
+@order_router.post("/pedido/cancelar/{id_pedido}", response_model=ResponseMensagemPedidoSchema, dependencies=[Depends(admitir_escrita_pedidos)])
+async def cancelar_pedido(id_pedido: int, response: Response, if_match: Optional[str] = Header(None), session: AsyncSession = Depends(getSession), usuario: Usuario = Depends(verificar_token)):
+    pedido = await alterar_status_pedido(session, id_pedido, StatusPedido.CANCELADO, usuario, versao_esperada(if_match, id_pedido))
+    await publicar_evento_pedido("status", pedido)
+    response.headers["ETag"] = etag_pedido(pedido.id, pedido.versao)
 
     return{
         "mensagem": f"Pedido número {pedido.id} cancelado",
         "pedido": pedido
     }
 
-@order_router.post("/listar")
-async def listar_pedidos(session: Session = Depends(getSession), usuario: Usuario = Depends(verificar_token)):
-    # if usuario.admin:
-    #     pedidos = session.query(Pedido).all()
-    # else:
-    #     pedidos = session.query(Pedido).filter(Pedido.usuario == usuario.id).all()
+async def alterar_status_pedido(session, id_pedido, novo_status, usuario, versao=None, fila=None):
+    """
+    Função para alterar o status de um pedido respeitando as transições permitidas. A alteração é feita
+    com um único UPDATE condicional (WHERE status IN (...) AND usuario = ... AND versao = ...), sem ler o
+    pedido antes. Só quando nenhuma linha é alterada o pedido é consultado, para informar o motivo:
+    pedido não encontrado (400), usuário sem autorização (401), pedido alterado desde a versão
+    informada no If-Match (412) ou transição de status não permitida (400). Na finalização, as tarefas
+    posteriores (recálculo do total, comanda e relatórios) são enfileiradas na fila do app, informada
+    em fila, na mesma transação e executadas fora da requisição; quem finaliza chama fila.despachar()
+    depois do commit.
+    """
+    pedido = await session.scalar(Pedido.alterar_status(id_pedido, novo_status, None if usuario.admin else usuario.id, versao))
+
+    if pedido is None:
+        pedido = await session.scalar(select(Pedido).filter(Pedido.id==id_pedido))
+
+        if not pedido:
+            raise HTTPException(status_code=400, detail="Pedido não encontrado")
+
+        if not usuario.admin and usuario.id != pedido.usuario:
+            raise HTTPException(status_code=401, detail="Você não tem autorização para fazer essa modificação")
 
+        if versao is not None and pedido.versao != versao:
+            raise pedido_alterado()
+
+        raise HTTPException(status_code=400, detail=f"Não é possível alterar o pedido de {pedido.status.name} para {novo_status.name}")
+
+    await session.execute(ResumoPedido.atualizar(id_pedido, status=novo_status))
+    if novo_status == StatusPedido.FINALIZADO:
+        for tipo in TAREFAS_PEDIDO_FINALIZADO:
+            await fila.enfileirar(session, tipo, {"pedido": id_pedido}, f"{tipo}:{id_pedido}")
+    await session.commit()
+    return pedido
+
+async def ajustar_totais_pedido(session, pedido, valor_centavos, qtde_itens, versao=None):
+    """
+    Função para atualizar de forma incremental o total e a quantidade de itens de um pedido, somando
+    a variação em um único UPDATE atômico no banco de dados, sem carregar nem percorrer os itens. As
+    inclusões e exclusões pendentes na sessão são enviadas ao banco antes do UPDATE (autoflush) e o
+    objeto do pedido recebe os valores resultantes sem ser marcado como alterado e o resumo do pedido
+    é atualizado. Se o pedido já foi encerrado a função levanta uma exceção HTTP 400 e, quando versao
+    é informada e o pedido já passou dessa versão, uma exceção HTTP 412.
+    """
+    totais = (await session.execute(Pedido.ajustar_totais(pedido.id, valor_centavos, qtde_itens, versao))).one_or_none()
+    if totais is None:
+        await recusar_ajuste_totais(session, pedido.id)
+    await session.execute(ResumoPedido.atualizar(pedido.id, total=totais.total, qtde_itens=totais.qtde_itens))
+    set_committed_value(pedido, "total", totais.total)
+    set_committed_value(pedido, "qtde_itens", totais.qtde_itens)
+    set_committed_value(pedido, "versao", totais.versao)
+
+def etag_pedido(id_pedido, versao):
+    return f'"{id_pedido}.{versao}"'
+
+def etag_corresponde(if_none_match, etag):
+    """
+    Função para verificar se o ETag atual está entre os enviados no cabeçalho If-None-Match (uma lista
+    separada por vírgulas, com ou sem o prefixo W/, ou "*").
+    """
+    if if_none_match is None:
+        return False
+    etags = [valor.strip().removeprefix("W/") for valor in if_none_match.split(",")]
+    return "*" in etags or etag in etags
+
+def versao_esperada(if_match, id_pedido):
+    """
+    Função para obter a versão do pedido exigida pelo cabeçalho If-Match, que deve trazer o ETag
+    devolvido na última leitura do pedido. Sem o cabeçalho (ou com "*") a alteração é feita em
+    qualquer versão; um ETag que não é deste pedido nunca corresponde e resulta em 412.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    try:
+        id_etag, versao = if_match.strip().strip('"').split(".")
+        if int(id_etag) == id_pedido:
+            return int(versao)
+    except ValueError:
+        pass
+    raise pedido_alterado()
+
+def pedido_alterado():
+    return HTTPException(status_code=412, detail="O pedido foi alterado por outra requisição, leia o pedido novamente")
+
+def pedido_encerrado(status):
+    return HTTPException(status_code=400, detail=f"Não é possível alterar os itens de um pedido {status.name}")
+
+async def recusar_ajuste_totais(session, id_pedido):
+    """
+    Função chamada quando o UPDATE condicional dos totais não alterou o pedido, para levantar a
+    exceção com o motivo: pedido não encontrado ou já encerrado (400) ou alterado desde a versão
+    informada no If-Match (412).
+    """
+    status = await session.scalar(select(Pedido.status).filter(Pedido.id == id_pedido))
+    if status is None:
+        raise HTTPException(status_code=400, detail="Pedido não encontrado")
+    if status != StatusPedido.PENDENTE:
+        raise pedido_encerrado(status)
+    raise pedido_alterado()
+
+async def publicar_evento_pedido(tipo, pedido):
+    """
+    Função para avisar os clientes conectados (SSE ou WebSocket) de uma mudança já gravada no pedido:
+    "status" quando o pedido é finalizado ou cancelado e "total" quando os seus itens mudam. O evento
+    vai para o dono do pedido e para os administradores que acompanham todos os pedidos.
+    """
+    await hub_eventos.publicar(pedido.usuario, {
+        "tipo": tipo,
+        "pedido": ResponseResumoPedidoSchema.model_validate(pedido).model_dump(mode="json")
+    })
+
+def canal_eventos(usuario, todos):
+    if todos:
+        if not usuario.admin:
+            raise HTTPException(status_code=401, detail="Você não tem autorização para acessar essa rota")
+        return TODOS_USUARIOS
+    return usuario.id
+
+def filtrar_pedidos(consulta, status, id_usuario):
+    """
+    Função para aplicar os filtros opcionais de status e de usuário em uma consulta de pedidos.
+    """
+    if status is not None:
+        if status not in StatusPedido.__members__:
+            raise HTTPException(status_code=400, detail=f"Status inválido, use um destes: {', '.join(StatusPedido.__members__)}")
+        consulta = consulta.filter(Pedido.status == StatusPedido[status])
+    if id_usuario is not None:
+        consulta = consulta.filter(Pedido.usuario == id_usuario)
+    return consulta
+
+@order_router.post("/listar", response_model=ResponseListarPedidosSchema)
+async def listar_pedidos(
+    cursor: Optional[int] = None,
+    limite: int = Query(configuracoes.PAGINA_TAMANHO_PADRAO, ge=1, le=configuracoes.PAGINA_TAMANHO_MAXIMO),
+    status: Optional[str] = None,
+    id_usuario: Optional[int] = None,
+    session: AsyncSession = Depends(getSession),
+    usuario: Usuario = Depends(verificar_token)
+):
+    """
+    Essa é a rota para listar os pedidos do sistema, disponível apenas para administradores. A listagem
+    é paginada por cursor (keyset): cada página traz no máximo "limite" pedidos com id maior que o
+    "cursor" informado, em ordem crescente de id, e devolve em "proximo_cursor" o valor a ser enviado
+    para buscar a página seguinte (None quando não há mais pedidos). Os pedidos podem ser filtrados por
+    status e por usuário. Como a consulta parte sempre do último id visto, o custo de cada página não
+    cresce com o tamanho do histórico de pedidos.
+    """
     if not usuario.admin:
         raise HTTPException(status_code=401, detail="Você não tem autorização para acessar essa rota")
 
-    pedidos = session.query(Pedido).all()
+    consulta = filtrar_pedidos(select(Pedido), status, id_usuario)
+    if cursor is not None:
+        consulta = consulta.filter(Pedido.id > cursor)
+    # busca um pedido a mais para saber se existe uma próxima página
+    consulta = consulta.order_by(Pedido.id).limit(limite + 1)
+
+    pedidos = (await session.scalars(consulta)).all()
+    proximo_cursor = None
+    if len(pedidos) > limite:
+        pedidos = pedidos[:limite]
+        proximo_cursor = pedidos[-1].id
+
+    return {
+        "pedidos": pedidos,
+        "proximo_cursor": proximo_cursor
+    }
+
+@order_router.post("/listar/meus_pedidos", response_model=ResponseMeusPedidosSchema)
+async def listar_meus_pedidos(
+    cursor: Optional[int] = None,
+    limite: int = Query(configuracoes.PAGINA_TAMANHO_PADRAO, ge=1, le=configuracoes.PAGINA_TAMANHO_MAXIMO),
+    session: AsyncSession = Depends(getSession),
+    usuario: Usuario = Depends(verificar_token)
+):
+    """
+    Essa é a rota para listar os pedidos do usuário autenticado, do mais recente para o mais antigo,
+    com o resumo de cada pedido (status, total, quantidade de itens e data da última alteração). Os
+    dados vêm da tabela de resumo dos pedidos (e dos pedidos arquivados), sem juntar pedidos e itens,
+    e a listagem é paginada por
+    cursor: cada página traz no máximo "limite" pedidos com id menor que o "cursor" informado, e
+    "proximo_cursor" traz o valor para a página seguinte (None quando não há mais pedidos).
+    """
+    consulta = select(
+        ResumoPedido.pedido, ResumoPedido.status, ResumoPedido.total, ResumoPedido.qtde_itens, ResumoPedido.atualizado_em
+    ).filter(ResumoPedido.usuario == usuario.id)
+    consulta_arquivo = select(
+        PedidoArquivado.id.label("pedido"), PedidoArquivado.status, PedidoArquivado.total, PedidoArquivado.qtde_itens,
+        PedidoArquivado.atualizado_em
+    ).filter(PedidoArquivado.usuario == usuario.id)
+    if cursor is not None:
+        consulta = consulta.filter(ResumoPedido.pedido < cursor)
+        consulta_arquivo = consulta_arquivo.filter(PedidoArquivado.id < cursor)
+    consulta = consulta.order_by(ResumoPedido.pedido.desc()).limit(limite + 1)
+    consulta_arquivo = consulta_arquivo.order_by(PedidoArquivado.id.desc()).limit(limite + 1)
+
+    # os pedidos arquivados continuam no histórico: cada tabela devolve a sua página pelo índice
+    # (usuario, id) e as duas são intercaladas por id
+    resumos = (await session.execute(consulta)).all() + (await session.execute(consulta_arquivo)).all()
+    resumos = sorted(resumos, key=lambda resumo: resumo.pedido, reverse=True)[:limite + 1]
+    proximo_cursor = None
+    if len(resumos) > limite:
+        resumos = resumos[:limite]
+        proximo_cursor = resumos[-1].pedido
+
     return {
-        "pedidos": pedidos
+        "pedidos": resumos,
+        "proximo_cursor": proximo_cursor
     }
 
-@order_router.post("/pedido/adicionar_item/{id_pedido}")
-async def adicionar_item_pedido(id_pedido: int, item_pedido_schema: ItemPedidoSchema, session: Session = Depends(getSession), usuario: Usuario = Depends(verificar_token)):
-    pedido = session.query(Pedido).filter(Pedido.id==id_pedido).first()
+@order_router.post("/listar/stream")
+async def listar_pedidos_stream(
+    request: Request,
+    status: Optional[str] = None,
+    id_usuario: Optional[int] = None,
+    usuario: Usuario = Depends(verificar_token)
+):
+    """
+    Essa é a rota para exportar a listagem de pedidos em NDJSON (um pedido em JSON por linha), disponível
+    apenas para administradores. Os pedidos são lidos de um cursor no servidor em lotes de
+    STREAM_TAMANHO_LOTE e enviados ao cliente à medida que são lidos, sem montar a lista completa em
+    memória, de forma que o consumo de memória não depende da quantidade de pedidos.
+    """
+    if not usuario.admin:
+        raise HTTPException(status_code=401, detail="Você não tem autorização para acessar essa rota")
+
+    consulta = filtrar_pedidos(select(Pedido), status, id_usuario).order_by(Pedido.id)
+
+    async def gerar_linhas():
+        # a sessão é aberta dentro do gerador para durar enquanto a resposta estiver sendo enviada
+        async with obter_fabrica_sessao(request.app)() as session:
+            resultado = await session.stream_scalars(consulta.execution_options(yield_per=configuracoes.STREAM_TAMANHO_LOTE))
+            async for lote in resultado.partitions():
+                yield "".join(
+                    ResponseResumoPedidoSchema.model_validate(pedido).model_dump_json() + "\n"
+                    for pedido in lote
+                )
+                # libera os pedidos do lote já enviado para a memória não crescer
+                session.expunge_all()
+
+    return StreamingResponse(gerar_linhas(), media_type="application/x-ndjson")
+
+@order_router.get("/eventos")
+async def eventos_pedidos(request: Request, todos: bool = False, usuario: Usuario = Depends(verificar_token)):
+    """
+    Essa é a rota para acompanhar em tempo real as mudanças de status e de total dos pedidos do usuário
+    por Server-Sent Events, no lugar de consultar o pedido repetidamente. A conexão fica aberta e cada
+    evento é enviado assim que a alteração é gravada; a cada EVENTOS_INTERVALO_PING segundos sem
+    eventos é enviado um comentário de ping para manter a conexão viva. Administradores podem enviar
+    todos=true para receber os eventos dos pedidos de todos os usuários.
+    """
+    canal = canal_eventos(usuario, todos)
+
+    async def gerar_eventos():
+        with hub_eventos.assinar(canal) as fila:
+            while True:
+                try:
+                    evento = await asyncio.wait_for(fila.get(), configuracoes.EVENTOS_INTERVALO_PING)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: {evento['tipo']}\ndata: {orjson.dumps(evento['pedido']).decode()}\n\n"
+
+    return StreamingResponse(gerar_eventos(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@order_ws_router.websocket("/ws")
+async def eventos_pedidos_ws(websocket: WebSocket, token: str, todos: bool = False):
+    """
+    Essa é a rota para acompanhar em tempo real as mudanças dos pedidos por WebSocket. Como o navegador
+    não permite enviar o cabeçalho Authorization na abertura do WebSocket, o token de acesso é passado
+    no parâmetro "token" da URL. Cada evento é enviado como uma mensagem JSON com o tipo ("status" ou
+    "total") e o resumo do pedido.
+    """
+    async with obter_fabrica_sessao(websocket.app)() as session:
+        try:
+            usuario = await verificar_token(token, session)
+            canal = canal_eventos(usuario, todos)
+        except HTTPException:
+            await websocket.close(code=status_http.WS_1008_POLICY_VIOLATION)
+            return
+
+    await websocket.accept()
+    with hub_eventos.assinar(canal) as fila:
+        recebimento = asyncio.ensure_future(websocket.receive())
+        try:
+            while True:
+                leitura = asyncio.ensure_future(fila.get())
+                await asyncio.wait((leitura, recebimento), return_when=asyncio.FIRST_COMPLETED)
+                if leitura.done():
+                    await websocket.send_bytes(orjson.dumps(leitura.result()))
+                else:
+                    leitura.cancel()
+                if recebimento.done():
+                    # o cliente não envia mensagens; o que importa é perceber o fechamento da conexão
+                    if recebimento.result()["type"] == "websocket.disconnect":
+                        break
+                    recebimento = asyncio.ensure_future(websocket.receive())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            recebimento.cancel()
+
+async def resolver_produtos(session, catalogo, itens_schema):
+    """
+    Função para encontrar o produto de cada linha de item no índice do catálogo do app, pelo id
+    ou pelo sabor e tamanho, sem consulta ao banco de dados. Só quando alguma linha não é encontrada
+    (um produto incluído em outro processo desde a última conferência) a versão do catálogo é
+    conferida no banco e as linhas são procuradas de novo. A função retorna o produto de cada linha,
+    ou None para as que não estão no catálogo.
+    """
+    indice = await catalogo.atualizar(session)
+    produtos = [indice.resolver(item.produto, item.sabor, item.tamanho) for item in itens_schema]
+    if None in produtos:
+        indice = await catalogo.atualizar(session, forcar=True)
+        produtos = [indice.resolver(item.produto, item.sabor, item.tamanho) for item in itens_schema]
+    return produtos
+
+@order_router.post("/pedido/adicionar_item/{id_pedido}", response_model=ResponseAdicionarItemSchema, dependencies=[Depends(admitir_escrita_pedidos)])
+async def adicionar_item_pedido(id_pedido: int, item_pedido_schema: ItemPedidoSchema, response: Response, if_match: Optional[str] = Header(None), session: AsyncSession = Depends(getSession), usuario: Usuario = Depends(verificar_token), catalogo: CatalogoProdutos = Depends(obter_catalogo_requisicao), gravador: Optional[GravadorLote] = Depends(obter_gravador)):
+    """
+    Essa é a rota para adicionar um item a um pedido. O produto é informado pelo id ou pelo sabor e
+    tamanho e procurado no índice do catálogo em memória; o item guarda o id do produto e o preço do
+    catálogo (o preço enviado pelo cliente não é mais usado). Produtos fora do catálogo ou
+    indisponíveis são recusados (400).
+    """
+    versao = versao_esperada(if_match, id_pedido)
+    pedido = await session.scalar(select(Pedido).filter(Pedido.id==id_pedido))
 
     if not pedido:
         raise HTTPException(status_code=400, detail="Pedido não encontrado")
@@ -79,49 +433,93 @@ async def adicionar_item_pedido(id_pedido: int, item_pedido_schema: ItemPedidoSc
     if not usuario.admin and usuario.id != pedido.usuario:
         raise HTTPException(status_code=401, detail="Você não tem autorização para fazer essa modificação")
 
+    if versao is not None and pedido.versao != versao:
+        raise pedido_alterado()
+
+    if pedido.status != StatusPedido.PENDENTE:
+        raise pedido_encerrado(pedido.status)
+
+    produto, = await resolver_produtos(session, catalogo, [item_pedido_schema])
+    if produto is None:
+        raise HTTPException(status_code=400, detail="Produto não encontrado no catálogo")
+    if not produto.disponivel:
+        raise HTTPException(status_code=400, detail=f"Produto indisponível: {produto.sabor} {produto.tamanho}")
+
     item_pedido = ItemPedido(
         pedido=id_pedido,
         quantidade=item_pedido_schema.quantidade,
-        sabor=item_pedido_schema.sabor,
-        tamanho=item_pedido_schema.tamanho,
-        preco_unitario=item_pedido_schema.preco_unitario
+        produto=produto.id,
+        preco_unitario=produto.preco
     )
 
-    session.add(item_pedido)
-    pedido.calcular_total()
-    session.commit()
+    id_item, total, qtde_itens, nova_versao = await gravar(session, gravador, inserir_item_pedido, item_pedido, versao)
+    set_committed_value(pedido, "total", total)
+    set_committed_value(pedido, "qtde_itens", qtde_itens)
+    set_committed_value(pedido, "versao", nova_versao)
+    await publicar_evento_pedido("total", pedido)
+    response.headers["ETag"] = etag_pedido(pedido.id, pedido.versao)
 
     return {
         "mensagem": f"Item adicionado ao pedido número {pedido.id}",
-        "item_pedido": item_pedido.id,
+        "item_pedido": id_item,
         "pedido_total": pedido.total
     }
 
-@order_router.post("/pedido/remover_item/{id_item_pedido}")
-async def remover_item_pedido(id_item_pedido: int, session: Session = Depends(getSession), usuario: Usuario = Depends(verificar_token)):
-    item_pedido = session.query(ItemPedido).filter(ItemPedido.id==id_item_pedido).first()
-    pedido = session.query(Pedido).filter(Pedido.id==item_pedido.pedido).first()
+@order_router.post("/pedido/remover_item/{id_item_pedido}", response_model=ResponseRemoverItemSchema, dependencies=[Depends(admitir_escrita_pedidos)])
+async def remover_item_pedido(id_item_pedido: int, response: Response, if_match: Optional[str] = Header(None), session: AsyncSession = Depends(getSession), usuario: Usuario = Depends(verificar_token)):
+    """
+    Essa é a rota para remover um item de um pedido. O item é excluído com um DELETE que devolve a
+    linha excluída (RETURNING), e o total e a quantidade de itens do pedido são ajustados só pela
+    linha devolvida: entre remoções concorrentes do mesmo item, só uma altera o pedido e as demais
+    respondem 400.
+    """
+    item_pedido = await session.scalar(select(ItemPedido).filter(ItemPedido.id==id_item_pedido))
 
     if not item_pedido:
         raise HTTPException(status_code=400, detail="Item do pedido não encontrado")
 
-    if not usuario.admin and usuario.id != item_pedido.pedido.usuario:
+    pedido = await session.scalar(select(Pedido).filter(Pedido.id==item_pedido.pedido))
+
+    if not usuario.admin and usuario.id != pedido.usuario:
         raise HTTPException(status_code=401, detail="Você não tem autorização para fazer essa modificação")
 
-    session.delete(item_pedido)
-    pedido.calcular_total()
-    session.commit()
+    versao = versao_esperada(if_match, pedido.id)
+    if versao is not None and pedido.versao != versao:
+        raise pedido_alterado()
+
+    if pedido.status != StatusPedido.PENDENTE:
+        raise pedido_encerrado(pedido.status)
+
+    # o total é ajustado pela linha que o DELETE realmente excluiu; se outra requisição removeu o
+    # item antes, nada é devolvido e o total não muda
+    removido = (await session.execute(ItemPedido.remover(pedido.id, [id_item_pedido]))).one_or_none()
+    if removido is None:
+        raise HTTPException(status_code=400, detail="Item do pedido não encontrado")
+    valor_centavos = removido.quantidade * para_centavos(removido.preco_unitario)
+    await ajustar_totais_pedido(session, pedido, -valor_centavos, -1, versao)
+    await session.commit()
+    await publicar_evento_pedido("total", pedido)
+    response.headers["ETag"] = etag_pedido(pedido.id, pedido.versao)
 
     return {
         "mensagem": f"Item do pedido número {item_pedido.id} removido",
         "pedido_total": pedido.total,
-        "itens_qtde": len(pedido.itens),
+        "itens_qtde": pedido.qtde_itens,
         "pedido": pedido
     }
 
-@order_router.post("/pedido/finalizar/{id_pedido}")
-async def finalizar_pedido(id_pedido: int, session: Session = Depends(getSession), usuario: Usuario = Depends(verificar_token)):
-    pedido = session.query(Pedido).filter(Pedido.id==id_pedido).first()
+@order_router.post("/pedido/itens/{id_pedido}", response_model=ResponseLoteItensPedidoSchema, dependencies=[Depends(admitir_escrita_pedidos)])
+async def alterar_itens_pedido(id_pedido: int, lote_schema: LoteItensPedidoSchema, response: Response, if_match: Optional[str] = Header(None), session: AsyncSession = Depends(getSession), usuario: Usuario = Depends(verificar_token), catalogo: CatalogoProdutos = Depends(obter_catalogo_requisicao)):
+    """
+    Essa é a rota para adicionar e remover vários itens de um pedido em uma única requisição. Todas as
+    linhas são validadas antes de qualquer alteração (quantidades positivas, já no schema, produtos
+    disponíveis no catálogo e itens a remover pertencentes ao pedido); se alguma for inválida, nada é
+    gravado. As inclusões são feitas com um único INSERT em lote, com o preço de cada produto no
+    catálogo, as exclusões com um único DELETE, o total do pedido é ajustado uma única vez e tudo é
+    gravado em um só commit. A resposta traz o resultado de cada linha e o estado final do pedido.
+    """
+    versao = versao_esperada(if_match, id_pedido)
+    pedido = await session.scalar(select(Pedido).filter(Pedido.id==id_pedido))
 
     if not pedido:
         raise HTTPException(status_code=400, detail="Pedido não encontrado")
@@ -129,17 +527,122 @@ async def finalizar_pedido(id_pedido: int, session: Session = Depends(getSession
     if not usuario.admin and usuario.id != pedido.usuario:
         raise HTTPException(status_code=401, detail="Você não tem autorização para fazer essa modificação")
 
-    pedido.status = "FINALIZADO"
-    session.commit()
+    if versao is not None and pedido.versao != versao:
+        raise pedido_alterado()
+
+    if pedido.status != StatusPedido.PENDENTE:
+        raise pedido_encerrado(pedido.status)
+
+    produtos = await resolver_produtos(session, catalogo, lote_schema.adicionar)
+    linhas_invalidas = [
+        indice for indice, (item_schema, produto) in enumerate(zip(lote_schema.adicionar, produtos))
+        if produto is None or not produto.disponivel
+    ]
+    if linhas_invalidas:
+        raise HTTPException(status_code=400, detail=f"Itens inválidos nas linhas {linhas_invalidas}")
+
+    ids_remover = list(dict.fromkeys(lote_schema.remover))
+    if ids_remover:
+        encontrados = set((await session.scalars(
+            select(ItemPedido.id).filter(ItemPedido.id.in_(ids_remover), ItemPedido.pedido == id_pedido)
+        )).all())
+        nao_encontrados = [id_item for id_item in ids_remover if id_item not in encontrados]
+        if nao_encontrados:
+            raise HTTPException(status_code=400, detail=f"Itens {nao_encontrados} não encontrados no pedido")
+
+    itens_adicionar = [
+        ItemPedido(
+            pedido=id_pedido,
+            quantidade=item_schema.quantidade,
+            produto=produto.id,
+            preco_unitario=produto.preco
+        )
+        for item_schema, produto in zip(lote_schema.adicionar, produtos)
+    ]
+
+    ids_adicionados = []
+    if itens_adicionar:
+        ids_adicionados = (await session.scalars(
+            insert(ItemPedido).returning(ItemPedido.id, sort_by_parameter_order=True),
+            [
+                {
+                    "pedido": item.pedido,
+                    "quantidade": item.quantidade,
+                    "produto": item.produto,
+                    "preco_unitario": item.preco_unitario
+                }
+                for item in itens_adicionar
+            ]
+        )).all()
+    # a variação do total é calculada pelas linhas que o DELETE realmente excluiu; se outra requisição
+    # removeu algum dos itens depois da validação, nada é gravado (a sessão é descartada sem commit)
+    itens_remover = []
+    if ids_remover:
+        itens_remover = (await session.execute(ItemPedido.remover(id_pedido, ids_remover))).all()
+        removidos = {item.id for item in itens_remover}
+        nao_encontrados = [id_item for id_item in ids_remover if id_item not in removidos]
+        if nao_encontrados:
+            raise HTTPException(status_code=400, detail=f"Itens {nao_encontrados} não encontrados no pedido")
+
+    valor_centavos = (
+        sum(item.valor_centavos() for item in itens_adicionar)
+        - sum(item.quantidade * para_centavos(item.preco_unitario) for item in itens_remover)
+    )
+    qtde_itens = len(itens_adicionar) - len(itens_remover)
+    await ajustar_totais_pedido(session, pedido, valor_centavos, qtde_itens, versao)
+    await session.commit()
+    await publicar_evento_pedido("total", pedido)
+    response.headers["ETag"] = etag_pedido(pedido.id, pedido.versao)
+
+    return {
+        "mensagem": f"Itens do pedido número {pedido.id} atualizados",
+        "adicionados": [
+            {"linha": indice, "item_pedido": id_item, "valor": item.valor_centavos() / 100}
+            for indice, (id_item, item) in enumerate(zip(ids_adicionados, itens_adicionar))
+        ],
+        "removidos": [
+            {"item_pedido": item.id, "valor": item.quantidade * para_centavos(item.preco_unitario) / 100}
+            for item in itens_remover
+        ],
+        "pedido_total": pedido.total,
+        "itens_qtde": pedido.qtde_itens,
+        "pedido": pedido
+    }
+
+@order_router.post("/pedido/finalizar/{id_pedido}", response_model=ResponseMensagemPedidoSchema, dependencies=[Depends(admitir_escrita_pedidos)])
+async def finalizar_pedido(id_pedido: int, response: Response, if_match: Optional[str] = Header(None), session: AsyncSession = Depends(getSession), usuario: Usuario = Depends(verificar_token), fila: BackendTarefas = Depends(obter_fila_tarefas)):
+    pedido = await alterar_status_pedido(session, id_pedido, StatusPedido.FINALIZADO, usuario, versao_esperada(if_match, id_pedido), fila)
+    await fila.despachar(session)
+    await publicar_evento_pedido("status", pedido)
+    response.headers["ETag"] = etag_pedido(pedido.id, pedido.versao)
 
     return {
         "mensagem": f"Pedido número {pedido.id} finalizado",
         "pedido": pedido
     }
 
-@order_router.post("/pedido/{id_pedido}")
-async def obter_pedido(id_pedido: int, session: Session = Depends(getSession), usuario: Usuario = Depends(verificar_token)):
-    pedido = session.query(Pedido).filter(Pedido.id==id_pedido).first()
+@order_router.post("/pedido/{id_pedido}", response_model=ResponseObterPedidoSchema)
+async def obter_pedido(id_pedido: int, response: Response, if_none_match: Optional[str] = Header(None), session: AsyncSession = Depends(getSession), usuario: Usuario = Depends(verificar_token), catalogo: CatalogoProdutos = Depends(obter_catalogo_requisicao)):
+    """
+    Essa é a rota para obter um pedido com os seus itens. A resposta traz o cabeçalho ETag com a versão
+    do pedido; quando o cliente envia esse valor no If-None-Match e o pedido não mudou, a rota responde
+    304 (Not Modified) consultando apenas o dono e a versão do pedido, sem carregar os itens nem
+    montar o JSON da resposta. Pedidos que não estão mais na tabela de pedidos são procurados no arquivo.
+    """
+    if if_none_match is not None:
+        atual = (await session.execute(select(Pedido.usuario, Pedido.versao).filter(Pedido.id==id_pedido))).one_or_none()
+        if atual is None:
+            atual = (await session.execute(select(PedidoArquivado.usuario, PedidoArquivado.versao).filter(PedidoArquivado.id==id_pedido))).one_or_none()
+        if atual is not None and (usuario.admin or usuario.id == atual.usuario):
+            etag = etag_pedido(id_pedido, atual.versao)
+            if etag_corresponde(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+
+    # o pedido e os seus itens são lidos na mesma consulta (LEFT OUTER JOIN)
+    pedido = await session.scalar(select(Pedido).options(joinedload(Pedido.itens)).filter(Pedido.id==id_pedido))
+    if not pedido:
+        # pedidos encerrados antigos são movidos para o arquivo e continuam disponíveis para leitura
+        pedido = await session.scalar(select(PedidoArquivado).options(joinedload(PedidoArquivado.itens)).filter(PedidoArquivado.id==id_pedido))
 
     if not pedido:
         raise HTTPException(status_code=400, detail="Pedido não encontrado")
@@ -147,16 +650,40 @@ async def obter_pedido(id_pedido: int, session: Session = Depends(getSession), u
     if not usuario.admin and usuario.id != pedido.usuario:
         raise HTTPException(status_code=401, detail="Você não tem autorização para acessar essa rota")
 
+    await catalogo.garantir(session, {item.produto for item in pedido.itens})
+    response.headers["ETag"] = etag_pedido(pedido.id, pedido.versao)
     return {
         "qtde_itens": len(pedido.itens),
         "pedido": pedido
     }
 
 @order_router.post("/listar/pedidos_usuario", response_model=List[ResponsePedidoSchema])
-async def listar_pedidos_usuario(session: Session = Depends(getSession), usuario: Usuario = Depends(verificar_token)):
-    pedidos = session.query(Pedido).filter(Pedido.usuario == usuario.id).all()
+async def listar_pedidos_usuario(response: Response, if_none_match: Optional[str] = Header(None), session: AsyncSession = Depends(getSession), usuario: Usuario = Depends(verificar_token), catalogo: CatalogoProdutos = Depends(obter_catalogo_requisicao)):
+    """
+    Essa é a rota para listar os pedidos do usuário autenticado com os seus itens, considerando só a
+    tabela de pedidos (os pedidos encerrados arquivados aparecem em /listar/meus_pedidos e continuam
+    disponíveis pelo id em /pedido/{id_pedido}). O ETag da lista é
+    calculado em uma consulta agregada (quantidade de pedidos, maior id e soma das versões), que muda
+    sempre que um pedido é criado ou alterado; se ele coincidir com o If-None-Match, a rota responde
+    304 (Not Modified) sem carregar os pedidos.
+    """
+    quantidade, id_maximo, soma_versoes = (await session.execute(
+        select(func.count(Pedido.id), func.max(Pedido.id), func.sum(Pedido.versao)).filter(Pedido.usuario == usuario.id)
+    )).one()
 
-    if not pedidos:
+    if not quantidade:
         raise HTTPException(status_code=400, detail="Nenhum pedido encontrado para este usuário")
 
+    etag = f'"{usuario.id}.{quantidade}.{id_maximo}.{soma_versoes}"'
+    if etag_corresponde(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    # os itens de todos os pedidos são carregados em uma única consulta adicional (SELECT ... IN),
+    # mantendo o número de consultas constante independentemente da quantidade de pedidos
+    pedidos = (await session.scalars(
+        select(Pedido).options(selectinload(Pedido.itens)).filter(Pedido.usuario == usuario.id)
+    )).all()
+    await catalogo.garantir(session, {item.produto for pedido in pedidos for item in pedido.itens})
+
     return pedidos
\ No newline at end of file
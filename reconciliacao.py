@@ -0,0 +1,80 @@
+from sqlalchemy import select, update, func, or_, bindparam, type_coerce, Integer
+from database import SessionLocal
+from models import Pedido, ItemPedido, ResumoPedido
+import argparse
+import asyncio
+
+async def reconciliar_totais(session, corrigir=False, ids=None):
+    """
+    Função para conferir os totais e as quantidades de itens armazenados em cada pedido (ou só nos
+    pedidos de ids) com os valores calculados a partir dos itens. A conferência é feita em uma única
+    consulta agregada (LEFT JOIN + GROUP BY) no banco de dados, que devolve apenas os pedidos
+    divergentes, com os valores em centavos. Quando corrigir=True, os pedidos divergentes são
+    atualizados em lote com os valores calculados, na transação da sessão (o commit fica com quem
+    chama). A função retorna a lista de divergências encontradas.
+    """
+    total_armazenado = type_coerce(Pedido.total, Integer)
+    total_calculado = func.coalesce(func.sum(ItemPedido.quantidade * type_coerce(ItemPedido.preco_unitario, Integer)), 0)
+    qtde_calculada = func.count(ItemPedido.id)
+
+    consulta = (
+        select(Pedido.id, total_armazenado, Pedido.qtde_itens, total_calculado, qtde_calculada)
+        .outerjoin(ItemPedido, ItemPedido.pedido == Pedido.id)
+        .group_by(Pedido.id, Pedido.total, Pedido.qtde_itens)
+        .having(or_(total_armazenado != total_calculado, Pedido.qtde_itens != qtde_calculada))
+    )
+    if ids is not None:
+        consulta = consulta.filter(Pedido.id.in_(ids))
+    divergencias = [
+        {
+            "pedido": id_pedido,
+            "total_centavos": total,
+            "qtde_itens": qtde,
+            "total_centavos_calculado": total_itens,
+            "qtde_itens_calculada": qtde_itens
+        }
+        for id_pedido, total, qtde, total_itens, qtde_itens in (await session.execute(consulta)).all()
+    ]
+
+    if corrigir and divergencias:
+        comando = (
+            update(Pedido.__table__)
+            .where(Pedido.__table__.c.id == bindparam("b_pedido"))
+            .values(
+                total=bindparam("b_total", type_=Integer),
+                qtde_itens=bindparam("b_qtde"),
+                versao=Pedido.__table__.c.versao + 1
+            )
+        )
+        parametros = [
+            {
+                "b_pedido": divergencia["pedido"],
+                "b_total": divergencia["total_centavos_calculado"],
+                "b_qtde": divergencia["qtde_itens_calculada"]
+            }
+            for divergencia in divergencias
+        ]
+        await session.execute(comando, parametros)
+        # o resumo dos pedidos recebe os mesmos valores corrigidos
+        await session.execute(
+            update(ResumoPedido.__table__)
+            .where(ResumoPedido.__table__.c.pedido == bindparam("b_pedido"))
+            .values(total=bindparam("b_total", type_=Integer), qtde_itens=bindparam("b_qtde"), atualizado_em=func.now()),
+            parametros
+        )
+
+    return divergencias
+
+async def executar(corrigir):
+    async with SessionLocal() as session:
+        divergencias = await reconciliar_totais(session, corrigir)
+        await session.commit()
+    for divergencia in divergencias:
+        print(divergencia)
+    print(f"{len(divergencias)} pedido(s) com total divergente" + (" corrigido(s)" if corrigir else ""))
+
+if __name__ == "__main__":
+    # uso: python reconciliacao.py [--corrigir]
+    parser = argparse.ArgumentParser(description="Confere os totais armazenados dos pedidos com a soma dos itens.")
+    parser.add_argument("--corrigir", action="store_true", help="atualiza os pedidos divergentes")
+    asyncio.run(executar(parser.parse_args().corrigir))
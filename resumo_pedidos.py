@@ -0,0 +1,35 @@
+from sqlalchemy import select, insert, delete, func, type_coerce, Integer
+from database import SessionLocal
+from models import Pedido, ItemPedido, ResumoPedido
+import asyncio
+
+async def reconstruir_resumos(session):
+    """
+    Função para regenerar toda a tabela de resumo dos pedidos a partir das tabelas de pedidos e de
+    itens. Os resumos atuais são apagados e recriados com um único INSERT ... SELECT agregado
+    (LEFT JOIN + GROUP BY), que calcula o total em centavos e a quantidade de itens de cada pedido
+    no próprio banco de dados, na mesma transação. A função retorna a quantidade de resumos gerados.
+    """
+    total_calculado = func.coalesce(func.sum(ItemPedido.quantidade * type_coerce(ItemPedido.preco_unitario, Integer)), 0)
+    consulta = (
+        select(Pedido.id, Pedido.usuario, Pedido.status, total_calculado, func.count(ItemPedido.id), func.now())
+        .outerjoin(ItemPedido, ItemPedido.pedido == Pedido.id)
+        .group_by(Pedido.id, Pedido.usuario, Pedido.status)
+    )
+    tabela = ResumoPedido.__table__
+
+    await session.execute(delete(tabela))
+    resultado = await session.execute(
+        insert(tabela).from_select(["pedido", "usuario", "status", "total", "qtde_itens", "atualizado_em"], consulta)
+    )
+    await session.commit()
+    return resultado.rowcount
+
+async def executar():
+    async with SessionLocal() as session:
+        quantidade = await reconstruir_resumos(session)
+    print(f"{quantidade} resumo(s) de pedido gerado(s)")
+
+if __name__ == "__main__":
+    # uso: python resumo_pedidos.py
+    asyncio.run(executar())
@@ -1,5 +1,11 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, BeforeValidator, Field, model_validator
+from typing import Optional, List, Annotated
+from datetime import datetime
+from models import StatusPedido
+from catalogo import catalogo_atual
+
+# o status é armazenado como inteiro (StatusPedido), mas a API continua expondo o nome
+NomeStatusPedido = Annotated[str, BeforeValidator(lambda valor: valor.name if isinstance(valor, StatusPedido) else valor)]
 
 class UsuarioSchema(BaseModel):
     nome: str
@@ -32,7 +38,20 @@ class PedidoSchema(BaseModel):
         from_attributes = True
 
 class ItemPedidoSchema(BaseModel):
+    # a quantidade precisa ser positiva, tanto na inclusão de um item quanto na de um lote (422)
+    quantidade: int = Field(gt=0)
+    # o produto é informado pelo id ou pelo sabor e tamanho; o preço é sempre o do catálogo
+    produto: Optional[int] = None
+    sabor: Optional[str] = None
+    tamanho: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class ResponseItemPedidoSchema(BaseModel):
+    id: int
     quantidade: int
+    produto: int
     sabor: str
     tamanho: str
     preco_unitario: float
@@ -40,11 +59,176 @@ class ItemPedidoSchema(BaseModel):
     class Config:
         from_attributes = True
 
+    @model_validator(mode="before")
+    @classmethod
+    def incluir_produto(cls, item):
+        # o item guarda só o id do produto; o sabor e o tamanho vêm do índice do catálogo do app, sem consulta ao banco
+        if isinstance(item, dict):
+            return item
+        produto = catalogo_atual.get().indice[item.produto]
+        return {
+            "id": item.id,
+            "quantidade": item.quantidade,
+            "produto": item.produto,
+            "sabor": produto.sabor,
+            "tamanho": produto.tamanho,
+            "preco_unitario": item.preco_unitario,
+        }
+
 class ResponsePedidoSchema(BaseModel):
     id: int
-    status: str
+    status: NomeStatusPedido
     total: float
-    itens: List[ItemPedidoSchema]
+    itens: List[ResponseItemPedidoSchema]
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ResponseResumoPedidoSchema(BaseModel):
+    id: int
+    status: NomeStatusPedido
+    usuario: int
+    total: float
+    qtde_itens: int
+    versao: int
+
+    class Config:
+        from_attributes = True
+
+class ResponsePedidoDetalhadoSchema(ResponseResumoPedidoSchema):
+    itens: List[ResponseItemPedidoSchema]
+
+class ResponseResumoMeuPedidoSchema(BaseModel):
+    pedido: int
+    status: NomeStatusPedido
+    total: float
+    qtde_itens: int
+    atualizado_em: datetime
+
+    class Config:
+        from_attributes = True
+
+class ProdutoSchema(BaseModel):
+    sabor: str
+    tamanho: str
+    preco: float
+    disponivel: bool = True
+
+class AlterarProdutoSchema(BaseModel):
+    preco: Optional[float] = None
+    disponivel: Optional[bool] = None
+
+class LoteItensPedidoSchema(BaseModel):
+    adicionar: List[ItemPedidoSchema] = []
+    remover: List[int] = []
+
+    class Config:
+        from_attributes = True
+
+# esquemas das respostas das rotas, usados como response_model para que a serialização
+# seja feita pelo Pydantic a partir dos atributos dos objetos do banco de dados
+class ResponseMensagemSchema(BaseModel):
+    message: str
+
+class ResponseAuthHomeSchema(BaseModel):
+    message: str
+    autenticado: bool
+
+class ResponseTokenSchema(BaseModel):
+    access_token: str
+    token_type: str
+
+class ResponseLoginSchema(ResponseTokenSchema):
+    refresh_token: str
+
+class ResponseCriarPedidoSchema(BaseModel):
+    message: str
+    pedido_id: int
+
+class ResponseMensagemPedidoSchema(BaseModel):
+    mensagem: str
+    pedido: ResponseResumoPedidoSchema
+
+class ResponseListarPedidosSchema(BaseModel):
+    pedidos: List[ResponseResumoPedidoSchema]
+    proximo_cursor: Optional[int]
+
+class ResponseMeusPedidosSchema(BaseModel):
+    pedidos: List[ResponseResumoMeuPedidoSchema]
+    proximo_cursor: Optional[int]
+
+class ResponseObterPedidoSchema(BaseModel):
+    qtde_itens: int
+    pedido: ResponsePedidoDetalhadoSchema
+
+class ResponseAdicionarItemSchema(BaseModel):
+    mensagem: str
+    item_pedido: int
+    pedido_total: float
+
+class ResponseRemoverItemSchema(BaseModel):
+    mensagem: str
+    pedido_total: float
+    itens_qtde: int
+    pedido: ResponseResumoPedidoSchema
+
+class ResponseLinhaAdicionadaSchema(BaseModel):
+    linha: int
+    item_pedido: int
+    valor: float
+
+class ResponseLinhaRemovidaSchema(BaseModel):
+    item_pedido: int
+    valor: float
+
+class ResponseLoteItensPedidoSchema(BaseModel):
+    mensagem: str
+    adicionados: List[ResponseLinhaAdicionadaSchema]
+    removidos: List[ResponseLinhaRemovidaSchema]
+    pedido_total: float
+    itens_qtde: int
+    pedido: ResponseResumoPedidoSchema
+
+class ResponseProdutoSchema(BaseModel):
+    id: int
+    sabor: str
+    tamanho: str
+    preco: float
+    disponivel: bool
+
+    class Config:
+        from_attributes = True
+
+class ResponseCatalogoSchema(BaseModel):
+    versao: int
+    produtos: List[ResponseProdutoSchema]
+
+class ResponseMensagemProdutoSchema(BaseModel):
+    mensagem: str
+    versao: int
+    produto: ResponseProdutoSchema
+
+class ResponseLinhaVendasSchema(BaseModel):
+    grupo: str
+    receita: float
+    quantidade: int
+    pedidos: int
+
+class ResponseVendasSchema(BaseModel):
+    agrupar: str
+    linhas: List[ResponseLinhaVendasSchema]
+
+class ResponseResumoVendasSchema(BaseModel):
+    pedidos: int
+    receita: float
+    ticket_medio: Optional[float] = None
+    ticket_p50: Optional[float] = None
+    ticket_p90: Optional[float] = None
+    ticket_p99: Optional[float] = None
+    cesta_media: Optional[float] = None
+    cesta_p50: Optional[float] = None
+    cesta_p90: Optional[float] = None
+
+class ResponseImportacaoSchema(BaseModel):
+    mensagem: str
+    importados: int
@@ -0,0 +1,58 @@
+from fastapi import HTTPException
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+from configuracoes import configuracoes
+from metricas import medir
+import asyncio
+import threading
+
+bcrypt_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=configuracoes.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=configuracoes.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=configuracoes.BCRYPT_ROUNDS
+)
+# valor gravado no lugar do hash dos usuários importados sem senha: não corresponde a nenhuma senha
+SENHA_BLOQUEADA = "!"
+# o bcrypt libera o GIL durante o cálculo, então um pool de threads consegue usar vários núcleos
+executor_senhas = ThreadPoolExecutor(max_workers=configuracoes.SENHA_WORKERS, thread_name_prefix="bcrypt")
+# vagas = threads em execução + senhas aguardando na fila
+vagas_senhas = threading.BoundedSemaphore(configuracoes.SENHA_WORKERS + configuracoes.SENHA_FILA_MAXIMA)
+
+async def executar_no_pool(funcao, *args):
+    """
+    Função para executar uma operação do bcrypt no pool dedicado, fora do event loop. Se todas as
+    vagas do pool (threads ocupadas mais a fila de espera) estiverem em uso, a função levanta uma
+    exceção HTTP 503 (Service Unavailable) com o cabeçalho Retry-After, em vez de acumular logins
+    pendentes e atrasar as demais rotas.
+    """
+    if not vagas_senhas.acquire(blocking=False):
+        raise HTTPException(
+            status_code=503,
+            detail="Serviço de autenticação sobrecarregado, tente novamente em instantes.",
+            headers={"Retry-After": "1"}
+        )
+    try:
+        loop = asyncio.get_running_loop()
+        with medir("bcrypt"):
+            return await loop.run_in_executor(executor_senhas, funcao, *args)
+    finally:
+        vagas_senhas.release()
+
+async def gerar_hash_senha(senha):
+    """
+    Função para criptografar uma senha com o bcrypt_context no pool dedicado.
+    """
+    return await executar_no_pool(bcrypt_context.hash, senha)
+
+async def verificar_senha(senha, senha_hash):
+    """
+    Função para verificar uma senha com o bcrypt_context no pool dedicado. Ela retorna uma tupla
+    (valida, novo_hash): o novo_hash só é preenchido quando a senha está correta e o hash armazenado
+    usa um custo ou algoritmo diferente do configurado, indicando que ele deve ser substituído. Um
+    valor que não é um hash conhecido (como SENHA_BLOQUEADA) nunca é uma senha válida.
+    """
+    if not bcrypt_context.identify(senha_hash):
+        return False, None
+    return await executar_no_pool(bcrypt_context.verify_and_update, senha, senha_hash)
@@ -0,0 +1,441 @@
+from abc import ABC, abstractmethod
+from sqlalchemy import select, update, delete, insert, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from starlette.requests import HTTPConnection
+from analytics_routes import cache_analise
+from catalogo import catalogo_produtos, catalogo_atual, obter_catalogo_produtos
+from configuracoes import configuracoes
+from database import SessionLocal, obter_fabrica_sessao
+from eventos import hub_eventos
+from metricas import Histograma, registrar_coletor
+from models import Tarefa, TarefaFalha, Pedido
+from reconciliacao import reconciliar_totais
+from schemas import ResponsePedidoDetalhadoSchema
+from datetime import datetime, timedelta, timezone
+import argparse
+import asyncio
+import contextvars
+import random
+import time
+import weakref
+
+# limites (em segundos) dos buckets do histograma de latência das tarefas, do enfileiramento à conclusão
+LIMITES_LATENCIA_TAREFAS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+
+# INSERT com ON CONFLICT DO NOTHING de cada dialeto que o suporta
+DIALETOS_ON_CONFLICT = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+# funções de cada tipo de tarefa: tipo -> função assíncrona executar(session, dados)
+TIPOS_TAREFA = {}
+
+
+def tipo_tarefa(tipo):
+    """
+    Decorador que registra a função como executora das tarefas do tipo informado. A função recebe a
+    sessão e os dados da tarefa e não faz commit: o commit é feito pela fila, junto com a marcação da
+    tarefa como concluída. Como uma tarefa pode ser executada mais de uma vez (um worker que cai no
+    meio da execução, uma falha no commit), a função deve ser idempotente.
+    """
+    def registrar(funcao):
+        TIPOS_TAREFA[tipo] = funcao
+        return funcao
+    return registrar
+
+def agora():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def espera_backoff(tentativas):
+    """
+    Função para calcular a espera (em segundos) antes da próxima tentativa de uma tarefa que falhou:
+    exponencial a partir de TAREFAS_BACKOFF_BASE, limitada a TAREFAS_BACKOFF_MAXIMO, com uma variação
+    aleatória entre a metade e o valor cheio para que tarefas que falharam juntas não voltem juntas.
+    """
+    espera = min(configuracoes.TAREFAS_BACKOFF_MAXIMO, configuracoes.TAREFAS_BACKOFF_BASE * 2 ** (tentativas - 1))
+    return espera * random.uniform(0.5, 1)
+
+async def executar_tarefa(session, tipo, dados):
+    funcao = TIPOS_TAREFA.get(tipo)
+    if funcao is None:
+        raise ValueError(f"Tipo de tarefa desconhecido: {tipo}")
+    await asyncio.wait_for(funcao(session, dados), configuracoes.TAREFAS_PRAZO_EXECUCAO)
+
+
+class BackendTarefas(ABC):
+    """
+    Interface da fila de tarefas em segundo plano. enfileirar() inclui a tarefa na transação da
+    sessão de quem a cria, de modo que ela só passa a existir se a alteração que a originou for
+    gravada, e despachar() é chamada depois do commit dessa sessão. Os resultados e as latências
+    (do enfileiramento até a conclusão) de cada tipo de tarefa são acumulados para as métricas.
+    """
+
+    def __init__(self):
+        self.pendentes = 0
+        self.mais_antiga = 0.0
+        self.resultados = {}
+        self.latencias = {}
+
+    @abstractmethod
+    async def enfileirar(self, session, tipo, dados, chave):
+        """Inclui a tarefa na transação da sessão; uma tarefa com a mesma chave é ignorada."""
+
+    @abstractmethod
+    async def despachar(self, session):
+        """Chamada depois do commit da sessão que enfileirou as tarefas."""
+
+    async def iniciar(self, fabrica_sessao, workers, catalogo=catalogo_produtos):
+        """
+        Inicia a execução das tarefas em segundo plano, nos backends que têm workers, com as sessões
+        de fabrica_sessao e o catálogo de produtos do app.
+        """
+
+    async def parar(self):
+        """Interrompe os workers iniciados em iniciar()."""
+
+    def registrar_resultado(self, tipo, resultado, criado_em=None):
+        self.resultados[(tipo, resultado)] = self.resultados.get((tipo, resultado), 0) + 1
+        if criado_em is not None:
+            histograma = self.latencias.setdefault(tipo, Histograma(LIMITES_LATENCIA_TAREFAS))
+            histograma.observar((agora() - criado_em).total_seconds())
+
+
+class BackendBanco(BackendTarefas):
+    """
+    Fila durável na tabela tarefas do próprio banco de dados. Cada processo executa as tarefas com
+    "workers" tarefas asyncio, que consultam a fila a cada TAREFAS_INTERVALO segundos ou logo depois
+    de um commit que enfileirou tarefas no mesmo processo. Um worker reserva uma tarefa com um UPDATE
+    condicional que incrementa as tentativas e adia disponivel_em pelo prazo de execução, então vários
+    processos podem consumir a mesma fila sem executar a mesma tarefa ao mesmo tempo, e a tarefa de um
+    worker que caiu volta para a fila quando o prazo vence. A tarefa executada com sucesso é marcada
+    como concluída na mesma transação do seu trabalho; a que falha volta para a fila com espera
+    exponencial, e a que esgota as tentativas vai para a tabela tarefas_falhas (dead letter).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.fabrica_sessao = None
+        self._tarefas = []
+        self._quantidade_workers = 0
+        self._aviso = None
+
+    async def enfileirar(self, session, tipo, dados, chave):
+        momento = agora()
+        valores = dict(tipo=tipo, chave=chave, dados=dados, tentativas=0, criado_em=momento, disponivel_em=momento)
+        dialeto = session.get_bind().dialect.name
+        if dialeto in DIALETOS_ON_CONFLICT:
+            # INSERT ... ON CONFLICT DO NOTHING: a chave de idempotência já existente não gera outra tarefa
+            await session.execute(DIALETOS_ON_CONFLICT[dialeto](Tarefa).values(**valores).on_conflict_do_nothing(index_elements=["chave"]))
+        elif await session.scalar(select(Tarefa.id).filter(Tarefa.chave == chave)) is None:
+            # nos demais bancos o INSERT é feito em um savepoint, e a violação da chave única por uma
+            # tarefa enfileirada ao mesmo tempo desfaz só o savepoint, sem afetar a transação de quem enfileira
+            try:
+                async with session.begin_nested():
+                    await session.execute(insert(Tarefa).values(**valores))
+            except IntegrityError:
+                pass
+        session.info["tarefas_enfileiradas"] = True
+
+    async def despachar(self, session):
+        # acorda os workers deste processo, que de outra forma só veriam a tarefa na próxima consulta
+        if session.info.pop("tarefas_enfileiradas", False) and self._aviso is not None:
+            self._aviso.set()
+
+    async def iniciar(self, fabrica_sessao, workers, catalogo=catalogo_produtos):
+        if self._tarefas:
+            return
+        self.fabrica_sessao = fabrica_sessao
+        self._quantidade_workers = workers
+        self._aviso = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        # contexto sem as variáveis da requisição, para que os comandos SQL das tarefas não sejam somados
+        # às métricas de uma requisição, só com o catálogo do app para a serialização dos pedidos
+        contexto = contextvars.Context()
+        contexto.run(catalogo_atual.set, catalogo)
+        for rotina in [self._trabalhar() for _ in range(workers)] + [self._manter()]:
+            self._tarefas.append(loop.create_task(rotina, context=contexto.copy()))
+
+    async def parar(self):
+        for tarefa in self._tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*self._tarefas, return_exceptions=True)
+        self._tarefas = []
+        self._aviso = None
+
+    async def _aguardar(self):
+        try:
+            await asyncio.wait_for(self._aviso.wait(), configuracoes.TAREFAS_INTERVALO)
+        except asyncio.TimeoutError:
+            pass
+        self._aviso.clear()
+
+    async def _trabalhar(self):
+        while True:
+            try:
+                tarefa = await self._reservar()
+                if tarefa is None:
+                    await self._aguardar()
+                else:
+                    await self._executar(tarefa)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # banco de dados indisponível, por exemplo; a tarefa reservada volta quando o prazo vencer
+                await asyncio.sleep(configuracoes.TAREFAS_INTERVALO)
+
+    async def _reservar(self):
+        """
+        Reserva a próxima tarefa disponível. A busca das candidatas é só uma leitura, para que os
+        workers ociosos não disputem o bloqueio de escrita; a reserva é um UPDATE condicional que só
+        tem efeito se a tarefa ainda estiver disponível, e, quando outro worker reservou a candidata
+        antes, a próxima é tentada.
+        """
+        momento = agora()
+        async with self.fabrica_sessao() as session:
+            candidatas = (await session.scalars(
+                select(Tarefa.id)
+                .filter(Tarefa.concluida_em.is_(None), Tarefa.disponivel_em <= momento)
+                .order_by(Tarefa.disponivel_em)
+                .limit(max(1, self._quantidade_workers))
+            )).all()
+            for id_tarefa in candidatas:
+                tarefa = (await session.execute(
+                    update(Tarefa)
+                    .filter(Tarefa.id == id_tarefa, Tarefa.concluida_em.is_(None), Tarefa.disponivel_em <= momento)
+                    .values(
+                        tentativas=Tarefa.tentativas + 1,
+                        disponivel_em=momento + timedelta(seconds=configuracoes.TAREFAS_PRAZO_EXECUCAO)
+                    )
+                    .returning(Tarefa.id, Tarefa.tipo, Tarefa.chave, Tarefa.dados, Tarefa.tentativas, Tarefa.criado_em)
+                    .execution_options(synchronize_session=False)
+                )).one_or_none()
+                await session.commit()
+                if tarefa is not None:
+                    return tarefa
+        return None
+
+    async def _executar(self, tarefa):
+        async with self.fabrica_sessao() as session:
+            try:
+                await executar_tarefa(session, tarefa.tipo, tarefa.dados)
+                await session.execute(
+                    update(Tarefa)
+                    .filter(Tarefa.id == tarefa.id)
+                    .values(concluida_em=agora())
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+            except Exception as erro:
+                await session.rollback()
+                await self._registrar_falha(session, tarefa, erro)
+                return
+        self.registrar_resultado(tarefa.tipo, "concluida", tarefa.criado_em)
+
+    async def _registrar_falha(self, session, tarefa, erro):
+        if tarefa.tentativas >= configuracoes.TAREFAS_MAXIMO_TENTATIVAS:
+            await session.execute(insert(TarefaFalha).values(
+                tarefa=tarefa.id, tipo=tarefa.tipo, chave=tarefa.chave, dados=tarefa.dados,
+                tentativas=tarefa.tentativas, erro=f"{type(erro).__name__}: {erro}", criado_em=tarefa.criado_em
+            ))
+            await session.execute(delete(Tarefa).filter(Tarefa.id == tarefa.id).execution_options(synchronize_session=False))
+            resultado = "falha"
+        else:
+            await session.execute(
+                update(Tarefa)
+                .filter(Tarefa.id == tarefa.id)
+                .values(disponivel_em=agora() + timedelta(seconds=espera_backoff(tarefa.tentativas)))
+                .execution_options(synchronize_session=False)
+            )
+            resultado = "repetida"
+        await session.commit()
+        self.registrar_resultado(tarefa.tipo, resultado)
+
+    async def _manter(self):
+        """
+        A cada TAREFAS_INTERVALO segundos conta as tarefas na fila (pendentes ou em execução) e a
+        idade da mais antiga, para as métricas, e uma vez por minuto remove as tarefas concluídas há
+        mais de TAREFAS_RETENCAO_HORAS horas.
+        """
+        proxima_limpeza = 0
+        while True:
+            try:
+                async with self.fabrica_sessao() as session:
+                    quantidade, mais_antiga = (await session.execute(
+                        select(func.count(Tarefa.id), func.min(Tarefa.criado_em)).filter(Tarefa.concluida_em.is_(None))
+                    )).one()
+                    self.pendentes = quantidade
+                    self.mais_antiga = (agora() - mais_antiga).total_seconds() if mais_antiga is not None else 0.0
+                    if time.monotonic() >= proxima_limpeza:
+                        limite = agora() - timedelta(hours=configuracoes.TAREFAS_RETENCAO_HORAS)
+                        await session.execute(delete(Tarefa).filter(Tarefa.concluida_em < limite).execution_options(synchronize_session=False))
+                        await session.commit()
+                        proxima_limpeza = time.monotonic() + 60
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            await asyncio.sleep(configuracoes.TAREFAS_INTERVALO)
+
+    async def reprocessar_falhas(self, session):
+        """
+        Devolve à fila as tarefas da tabela tarefas_falhas, com as tentativas zeradas, e as remove de
+        lá. A função retorna a quantidade de tarefas devolvidas.
+        """
+        falhas = (await session.scalars(select(TarefaFalha).order_by(TarefaFalha.id))).all()
+        for falha in falhas:
+            await self.enfileirar(session, falha.tipo, falha.dados, falha.chave)
+            await session.delete(falha)
+        await session.commit()
+        return len(falhas)
+
+
+class BackendMemoria(BackendTarefas):
+    """
+    Fila síncrona em memória, para testes. As tarefas enfileiradas ficam guardadas na sessão e são
+    executadas em despachar(), logo depois do commit, na própria sessão e dentro da requisição, com
+    as mesmas tentativas da fila no banco de dados, mas sem espera entre elas; as que esgotam as
+    tentativas ficam em falhas. Nada é gravado nas tabelas de tarefas.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chaves = set()
+        self.falhas = []
+
+    async def enfileirar(self, session, tipo, dados, chave):
+        session.info.setdefault("tarefas", []).append((tipo, dados, chave, agora()))
+
+    async def despachar(self, session):
+        for tipo, dados, chave, criado_em in session.info.pop("tarefas", []):
+            if chave in self.chaves:
+                continue
+            self.chaves.add(chave)
+            for tentativa in range(1, configuracoes.TAREFAS_MAXIMO_TENTATIVAS + 1):
+                try:
+                    await executar_tarefa(session, tipo, dados)
+                    await session.commit()
+                except Exception as erro:
+                    await session.rollback()
+                    if tentativa == configuracoes.TAREFAS_MAXIMO_TENTATIVAS:
+                        self.falhas.append({"tipo": tipo, "chave": chave, "dados": dados, "erro": f"{type(erro).__name__}: {erro}"})
+                        self.registrar_resultado(tipo, "falha")
+                    else:
+                        self.registrar_resultado(tipo, "repetida")
+                    continue
+                self.registrar_resultado(tipo, "concluida", criado_em)
+                break
+
+
+# filas dos apps do processo, somadas na exportação das métricas
+filas_tarefas = weakref.WeakSet()
+
+def criar_fila_tarefas(configuracoes_app=configuracoes):
+    """
+    Função para criar a fila de tarefas de um app, com o backend de TAREFAS_BACKEND das configurações
+    do app. Cada app tem a sua fila (em app.state.fila_tarefas, criada e iniciada no lifespan), com
+    os workers ligados à sua própria fábrica de sessões.
+    """
+    fila = BackendMemoria() if configuracoes_app.TAREFAS_BACKEND == "memoria" else BackendBanco()
+    filas_tarefas.add(fila)
+    return fila
+
+async def obter_fila_tarefas(conexao: HTTPConnection):
+    """
+    Dependência que devolve a fila de tarefas do app da requisição. Normalmente ela já foi criada e
+    iniciada no lifespan; quando o app é executado sem o lifespan (por exemplo pelo transporte ASGI
+    do httpx), a fila é criada e iniciada no primeiro uso, como a engine do banco de dados.
+    """
+    app = conexao.app
+    if getattr(app.state, "fila_tarefas", None) is None:
+        app.state.fila_tarefas = criar_fila_tarefas(app.state.configuracoes)
+        await app.state.fila_tarefas.iniciar(obter_fabrica_sessao(app), app.state.configuracoes.TAREFAS_WORKERS, obter_catalogo_produtos(app))
+    return app.state.fila_tarefas
+
+# tarefas enfileiradas quando um pedido é finalizado, cada uma com a chave "<tipo>:<id do pedido>"
+TAREFAS_PEDIDO_FINALIZADO = ("recalcular_total_pedido", "emitir_comanda", "atualizar_analise")
+
+@tipo_tarefa("recalcular_total_pedido")
+async def recalcular_total_pedido(session, dados):
+    """
+    Confere o total e a quantidade de itens do pedido finalizado com a soma dos itens e os corrige
+    se estiverem divergentes.
+    """
+    await reconciliar_totais(session, corrigir=True, ids=[dados["pedido"]])
+
+@tipo_tarefa("emitir_comanda")
+async def emitir_comanda(session, dados):
+    """
+    Envia o pedido finalizado com os seus itens, como um evento "comanda", ao dono do pedido (o
+    recibo) e aos administradores que acompanham todos os pedidos (a cozinha). Um pedido que já foi
+    arquivado não gera comanda.
+    """
+    pedido = await session.scalar(select(Pedido).options(selectinload(Pedido.itens)).filter(Pedido.id == dados["pedido"]))
+    if pedido is None:
+        return
+    await catalogo_atual.get().garantir(session, {item.produto for item in pedido.itens})
+    await hub_eventos.publicar(pedido.usuario, {
+        "tipo": "comanda",
+        "pedido": ResponsePedidoDetalhadoSchema.model_validate(pedido).model_dump(mode="json")
+    })
+
+@tipo_tarefa("atualizar_analise")
+async def atualizar_analise(session, dados):
+    """
+    Descarta os relatórios de vendas em cache no processo, para que incluam o pedido finalizado; nos
+    demais processos eles são atualizados quando o cache vence (ANALISE_CACHE_TTL).
+    """
+    cache_analise.limpar()
+
+def exportar_metricas_tarefas():
+    filas = list(filas_tarefas)
+    resultados = {}
+    latencias = {}
+    for fila in filas:
+        for chave, quantidade in fila.resultados.items():
+            resultados[chave] = resultados.get(chave, 0) + quantidade
+        for tipo, histograma in fila.latencias.items():
+            total = latencias.setdefault(tipo, Histograma(LIMITES_LATENCIA_TAREFAS))
+            total.contagens = [a + b for a, b in zip(total.contagens, histograma.contagens)]
+            total.soma += histograma.soma
+            total.quantidade += histograma.quantidade
+    linhas = [
+        "# TYPE delivery_tarefas_pendentes gauge",
+        f"delivery_tarefas_pendentes {sum(fila.pendentes for fila in filas)}",
+        "# TYPE delivery_tarefas_mais_antiga_segundos gauge",
+        f"delivery_tarefas_mais_antiga_segundos {max((fila.mais_antiga for fila in filas), default=0.0)}",
+        "# TYPE delivery_tarefas_total counter",
+    ]
+    for (tipo, resultado), quantidade in sorted(resultados.items()):
+        linhas.append(f'delivery_tarefas_total{{tipo="{tipo}",resultado="{resultado}"}} {quantidade}')
+    linhas.append("# TYPE delivery_tarefas_latencia_segundos histogram")
+    for tipo, histograma in sorted(latencias.items()):
+        for limite, contagem in zip(histograma.limites, histograma.contagens):
+            linhas.append(f'delivery_tarefas_latencia_segundos_bucket{{tipo="{tipo}",le="{limite}"}} {contagem}')
+        linhas.append(f'delivery_tarefas_latencia_segundos_bucket{{tipo="{tipo}",le="+Inf"}} {histograma.quantidade}')
+        linhas.append(f'delivery_tarefas_latencia_segundos_sum{{tipo="{tipo}"}} {histograma.soma}')
+        linhas.append(f'delivery_tarefas_latencia_segundos_count{{tipo="{tipo}"}} {histograma.quantidade}')
+    return linhas
+
+registrar_coletor(exportar_metricas_tarefas)
+
+async def executar(args):
+    fila = BackendBanco()
+    if args.reprocessar_falhas:
+        async with SessionLocal() as session:
+            quantidade = await fila.reprocessar_falhas(session)
+        print(f"{quantidade} tarefa(s) devolvida(s) à fila")
+        return
+
+    await fila.iniciar(SessionLocal, args.workers)
+    try:
+        # executa as tarefas até o processo ser interrompido (Ctrl+C)
+        await asyncio.Event().wait()
+    finally:
+        await fila.parar()
+
+if __name__ == "__main__":
+    # uso: python tarefas.py [--workers 4] [--reprocessar-falhas]
+    parser = argparse.ArgumentParser(description="Executa as tarefas em segundo plano da fila no banco de dados.")
+    parser.add_argument("--workers", type=int, default=configuracoes.TAREFAS_WORKERS)
+    parser.add_argument("--reprocessar-falhas", action="store_true", help="devolve à fila as tarefas que falharam em todas as tentativas")
+    asyncio.run(executar(parser.parse_args()))
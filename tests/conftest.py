@@ -0,0 +1,78 @@
+import os
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+
+# as configurações são lidas do ambiente na importação dos módulos do app, então as variáveis
+# obrigatórias e o banco padrão (temporário) precisam estar definidos antes de qualquer import
+PASTA_TEMPORARIA = tempfile.mkdtemp(prefix="testes_delivery_")
+os.environ.setdefault("SECRET_KEY", "chave-testes")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("ADMISSAO_ATIVA", "false")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(PASTA_TEMPORARIA, 'testes.db')}")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+import pytest
+
+from configuracoes import configuracoes
+from database import criar_engine
+from models import Base, Usuario, Produto, VersaoCatalogo
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@asynccontextmanager
+async def montar_app(pasta, **ajustes):
+    """
+    Monta um app com create_app() sobre um banco SQLite novo na pasta, com as configurações do
+    ambiente alteradas pelos ajustes, e executa o lifespan. O banco já tem um administrador (id 1),
+    um cliente (id 2) e um produto (id 1, calabresa G a 10,00).
+    """
+    from main import create_app
+    from dependencies import cache_usuarios, cache_tokens
+
+    # os caches de autenticação são do processo; os ids dos usuários se repetem entre os bancos dos testes
+    cache_usuarios.limpar()
+    cache_tokens.limpar()
+    configuracoes_testes = configuracoes.model_copy(update={"DATABASE_URL": f"sqlite+aiosqlite:///{pasta / 'app.db'}", **ajustes})
+    engine = criar_engine(configuracoes=configuracoes_testes)
+    async with engine.begin() as conexao:
+        await conexao.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+
+    app = create_app(configuracoes_testes)
+    async with app.router.lifespan_context(app):
+        async with app.state.fabrica_sessao() as session:
+            session.add(Usuario("admin", "admin@testes", "-", admin=True))
+            session.add(Usuario("cliente", "cliente@testes", "-"))
+            session.add(Produto(sabor="calabresa", tamanho="G", preco=10.0, versao=1))
+            await session.execute(VersaoCatalogo.incrementar())
+            await session.commit()
+        yield app
+
+
+@pytest.fixture
+async def app_testes(tmp_path):
+    """App montado por montar_app() em uma pasta temporária do teste."""
+    async with montar_app(tmp_path) as app:
+        yield app
+
+
+@pytest.fixture
+async def cliente(app_testes):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app_testes), base_url="http://testes") as cliente:
+        yield cliente
+
+
+@pytest.fixture
+def cabecalho():
+    from auth_routes import criar_token
+
+    def montar(id_usuario):
+        return {"Authorization": f"Bearer {criar_token(id_usuario)}"}
+    return montar
@@ -0,0 +1,54 @@
+"""
+Controle de admissão: os baldes de fichas recusam com 429 e Retry-After as requisições acima da
+rajada, as fichas são repostas com o tempo e os limites só valem para as rotas e chaves limitadas.
+"""
+import asyncio
+
+import pytest
+
+from admissao import backend_limites, controle_admissao
+from configuracoes import configuracoes
+
+
+@pytest.fixture
+def admissao(monkeypatch):
+    monkeypatch.setattr(configuracoes, "ADMISSAO_ATIVA", True)
+    monkeypatch.setattr(configuracoes, "ADMISSAO_IP_RAJADA", 3)
+    monkeypatch.setattr(configuracoes, "ADMISSAO_IP_TAXA", 5)
+    monkeypatch.setattr(configuracoes, "ADMISSAO_USUARIO_RAJADA", 2)
+    monkeypatch.setattr(configuracoes, "ADMISSAO_USUARIO_TAXA", 10)
+    # os baldes são do processo e não podem vir cheios ou vazios de outro teste
+    backend_limites.baldes.limpar()
+    yield controle_admissao
+    backend_limites.baldes.limpar()
+
+
+@pytest.mark.anyio
+async def test_limite_de_taxa_das_rotas_de_autenticacao(admissao, cliente, cabecalho):
+    rejeicoes = admissao.rejeicoes.get("ip", 0)
+    assert [(await cliente.get("/auth/")).status_code for _ in range(3)] == [200] * 3
+    resposta = await cliente.get("/auth/")
+    assert resposta.status_code == 429
+    assert resposta.headers["Retry-After"] == "1"
+    assert admissao.rejeicoes["ip"] == rejeicoes + 1
+
+    # as rotas sem limite de taxa continuam atendendo o mesmo cliente
+    assert (await cliente.get("/orders/", headers=cabecalho(2))).status_code == 200
+
+    # a 5 fichas por segundo, uma nova ficha chega em 0,2 s (e a seguinte só em 0,4 s)
+    await asyncio.sleep(0.25)
+    assert (await cliente.get("/auth/")).status_code == 200
+    assert (await cliente.get("/auth/")).status_code == 429
+
+
+@pytest.mark.anyio
+async def test_limite_de_taxa_das_escritas_por_usuario(admissao, cliente, cabecalho):
+    for _ in range(2):
+        assert (await cliente.post("/orders/pedido", json={"usuario": 2}, headers=cabecalho(2))).status_code == 200
+    resposta = await cliente.post("/orders/pedido", json={"usuario": 2}, headers=cabecalho(2))
+    assert resposta.status_code == 429
+    assert "Retry-After" in resposta.headers
+
+    # o balde é de cada usuário, e as leituras não consomem fichas
+    assert (await cliente.post("/orders/pedido", json={"usuario": 1}, headers=cabecalho(1))).status_code == 200
+    assert (await cliente.post("/orders/listar/meus_pedidos", headers=cabecalho(2))).status_code == 200
@@ -0,0 +1,101 @@
+"""
+Relatórios de vendas: valores de /analytics/vendas e /analytics/resumo sobre um conjunto pequeno de
+pedidos (em uso e arquivados), com e sem o NumPy, e acesso restrito aos administradores.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import update
+
+import analytics_routes
+from analytics_routes import cache_analise
+from arquivamento import arquivar_lote
+from models import Pedido, Produto, VersaoCatalogo
+
+
+@pytest.fixture
+async def vendas(app_testes, cliente, cabecalho):
+    """
+    Pedidos do cliente: um finalizado (2 calabresas G e 1 mussarela M, 28,00) e um cancelado
+    (1 mussarela M, 8,00), ambos antigos e arquivados, e dois pendentes: um sem itens e um com
+    3 calabresas G (30,00).
+    """
+    async with app_testes.state.fabrica_sessao() as session:
+        session.add(Produto(sabor="mussarela", tamanho="M", preco=8.0, versao=2))
+        await session.execute(VersaoCatalogo.incrementar())
+        await session.commit()
+
+    async def criar_pedido(itens, encerramento=None):
+        id_pedido = (await cliente.post("/orders/pedido", json={"usuario": 2}, headers=cabecalho(2))).json()["pedido_id"]
+        for produto, quantidade in itens:
+            resposta = await cliente.post(f"/orders/pedido/adicionar_item/{id_pedido}", json={"quantidade": quantidade, "produto": produto}, headers=cabecalho(2))
+            assert resposta.status_code == 200
+        if encerramento is not None:
+            assert (await cliente.post(f"/orders/pedido/{encerramento}/{id_pedido}", headers=cabecalho(2))).status_code == 200
+        return id_pedido
+
+    antigos = [await criar_pedido([(1, 2), (2, 1)], "finalizar"), await criar_pedido([(2, 1)], "cancelar")]
+    await criar_pedido([])
+    await criar_pedido([(1, 3)])
+
+    agora = datetime.now(timezone.utc).replace(tzinfo=None)
+    async with app_testes.state.fabrica_sessao() as session:
+        await session.execute(update(Pedido).where(Pedido.id.in_(antigos)).values(criado_em=agora - timedelta(days=100)))
+        await session.commit()
+        assert await arquivar_lote(session, agora - timedelta(days=90), 100) == antigos
+
+    # os relatórios ficam em cache no processo, e os bancos dos testes repetem os mesmos parâmetros
+    cache_analise.limpar()
+    yield agora
+    cache_analise.limpar()
+
+
+async def relatorio(cliente, cabecalho, rota, **parametros):
+    resposta = await cliente.get(f"/analytics/{rota}", params=parametros, headers=cabecalho(1))
+    assert resposta.status_code == 200
+    return resposta.json()
+
+
+@pytest.mark.anyio
+async def test_vendas_agrupadas(vendas, cliente, cabecalho):
+    def linhas(resposta):
+        return [(linha["grupo"], linha["receita"], linha["quantidade"], linha["pedidos"]) for linha in resposta["linhas"]]
+
+    assert linhas(await relatorio(cliente, cabecalho, "vendas", agrupar="sabor")) == [("calabresa", 50.0, 5, 2), ("mussarela", 16.0, 2, 2)]
+    assert linhas(await relatorio(cliente, cabecalho, "vendas", agrupar="produto")) == [("calabresa G", 50.0, 5, 2), ("mussarela M", 16.0, 2, 2)]
+    assert linhas(await relatorio(cliente, cabecalho, "vendas", agrupar="status")) == [
+        ("PENDENTE", 30.0, 3, 1), ("FINALIZADO", 28.0, 3, 1), ("CANCELADO", 8.0, 1, 1)
+    ]
+    assert linhas(await relatorio(cliente, cabecalho, "vendas", agrupar="tamanho", status="FINALIZADO")) == [("G", 20.0, 2, 1), ("M", 8.0, 1, 1)]
+    # só os pedidos criados na janela entram no relatório
+    inicio = (vendas - timedelta(days=1)).isoformat()
+    assert linhas(await relatorio(cliente, cabecalho, "vendas", agrupar="sabor", inicio=inicio)) == [("calabresa", 30.0, 3, 1)]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("numpy", [True, False], ids=["numpy", "python"])
+async def test_resumo_das_vendas(vendas, cliente, cabecalho, monkeypatch, numpy):
+    if not numpy:
+        monkeypatch.setattr(analytics_routes, "carregar_numpy", lambda: None)
+
+    # totais dos pedidos 28,00, 8,00, 0 e 30,00; cestas de 3, 1, 0 e 3 unidades
+    assert await relatorio(cliente, cabecalho, "resumo") == {
+        "pedidos": 4, "receita": 66.0,
+        "ticket_medio": 16.5, "ticket_p50": 18.0, "ticket_p90": 29.4, "ticket_p99": 29.94,
+        "cesta_media": 1.75, "cesta_p50": 2.0, "cesta_p90": 3.0,
+    }
+    resumo = await relatorio(cliente, cabecalho, "resumo", status="CANCELADO")
+    assert (resumo["pedidos"], resumo["receita"], resumo["ticket_medio"]) == (1, 8.0, 8.0)
+    resumo = await relatorio(cliente, cabecalho, "resumo", fim=(vendas - timedelta(days=200)).isoformat())
+    assert resumo == {
+        "pedidos": 0, "receita": 0.0, "ticket_medio": None, "ticket_p50": None, "ticket_p90": None,
+        "ticket_p99": None, "cesta_media": None, "cesta_p50": None, "cesta_p90": None,
+    }
+
+
+@pytest.mark.anyio
+async def test_relatorios_so_para_administradores(vendas, cliente, cabecalho):
+    for rota in ("vendas", "resumo"):
+        assert (await cliente.get(f"/analytics/{rota}", headers=cabecalho(2))).status_code == 401
+        assert (await cliente.get(f"/analytics/{rota}")).status_code == 401
+        assert (await cliente.get(f"/analytics/{rota}", headers=cabecalho(1))).status_code == 200
@@ -0,0 +1,67 @@
+"""
+Arquivamento: só os pedidos encerrados anteriores ao limite vão para as tabelas de arquivo, eles
+continuam disponíveis nas rotas de leitura e os seus ids não são reutilizados por novos registros.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, update
+
+from arquivamento import arquivar_lote
+from models import Pedido, PedidoArquivado, ItemPedidoArquivado
+
+
+async def criar_pedido(cliente, cabecalho, itens, encerramento=None):
+    id_pedido = (await cliente.post("/orders/pedido", json={"usuario": 2}, headers=cabecalho(2))).json()["pedido_id"]
+    for _ in range(itens):
+        resposta = await cliente.post(f"/orders/pedido/adicionar_item/{id_pedido}", json={"quantidade": 2, "produto": 1}, headers=cabecalho(2))
+        assert resposta.status_code == 200
+    if encerramento is not None:
+        assert (await cliente.post(f"/orders/pedido/{encerramento}/{id_pedido}", headers=cabecalho(2))).status_code == 200
+    return id_pedido
+
+
+@pytest.mark.anyio
+async def test_arquivamento_de_pedidos_encerrados_antigos(app_testes, cliente, cabecalho):
+    finalizado = await criar_pedido(cliente, cabecalho, 2, "finalizar")
+    cancelado = await criar_pedido(cliente, cabecalho, 1, "cancelar")
+    aberto = await criar_pedido(cliente, cabecalho, 1)
+    recente = await criar_pedido(cliente, cabecalho, 1, "finalizar")
+    # o dono do item de maior id fica na tabela de pedidos, mesmo encerrado e antigo
+    dono_maior_item = await criar_pedido(cliente, cabecalho, 0)
+    maior_pedido = await criar_pedido(cliente, cabecalho, 0, "cancelar")
+    assert (await cliente.post(f"/orders/pedido/adicionar_item/{dono_maior_item}", json={"quantidade": 1, "produto": 1}, headers=cabecalho(2))).status_code == 200
+    assert (await cliente.post(f"/orders/pedido/finalizar/{dono_maior_item}", headers=cabecalho(2))).status_code == 200
+
+    agora = datetime.now(timezone.utc).replace(tzinfo=None)
+    async with app_testes.state.fabrica_sessao() as session:
+        antigos = [finalizado, cancelado, aberto, dono_maior_item, maior_pedido]
+        await session.execute(update(Pedido).where(Pedido.id.in_(antigos)).values(criado_em=agora - timedelta(days=100)))
+        await session.commit()
+        assert await arquivar_lote(session, agora - timedelta(days=90), 100) == [finalizado, cancelado]
+
+    async with app_testes.state.fabrica_sessao() as session:
+        restantes = set((await session.scalars(select(Pedido.id))).all())
+        arquivados = (await session.scalars(select(PedidoArquivado).order_by(PedidoArquivado.id))).all()
+        itens_arquivados = (await session.scalars(select(ItemPedidoArquivado.pedido))).all()
+        maior_item_arquivado = max((await session.scalars(select(ItemPedidoArquivado.id))).all())
+    assert restantes == {aberto, recente, dono_maior_item, maior_pedido}
+    assert [(pedido.id, pedido.total, pedido.qtde_itens) for pedido in arquivados] == [(finalizado, 40.0, 2), (cancelado, 20.0, 1)]
+    assert sorted(itens_arquivados) == [finalizado, finalizado, cancelado]
+
+    # os pedidos arquivados continuam disponíveis pelo id e no histórico do usuário
+    resposta = (await cliente.post(f"/orders/pedido/{finalizado}", headers=cabecalho(2))).json()
+    assert resposta["qtde_itens"] == 2
+    assert (resposta["pedido"]["status"], resposta["pedido"]["total"]) == ("FINALIZADO", 40.0)
+    assert [item["quantidade"] for item in resposta["pedido"]["itens"]] == [2, 2]
+    historico = (await cliente.post("/orders/listar/meus_pedidos", headers=cabecalho(2))).json()["pedidos"]
+    resumos = {resumo["pedido"]: (resumo["status"], resumo["total"], resumo["qtde_itens"]) for resumo in historico}
+    assert resumos[finalizado] == ("FINALIZADO", 40.0, 2)
+    assert resumos[cancelado] == ("CANCELADO", 20.0, 1)
+    assert len(resumos) == 6
+
+    # novos pedidos e itens não reutilizam os ids arquivados
+    novo = await criar_pedido(cliente, cabecalho, 0)
+    item = (await cliente.post(f"/orders/pedido/adicionar_item/{novo}", json={"quantidade": 1, "produto": 1}, headers=cabecalho(2))).json()["item_pedido"]
+    assert novo > maior_pedido
+    assert item > maior_item_arquivado
@@ -0,0 +1,66 @@
+"""
+Catálogo de produtos: cada app tem o seu catálogo, cada alteração recebe uma versão própria do
+catálogo, e as rotas do catálogo são medidas como as demais rotas da API.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from conftest import montar_app
+
+
+@pytest.mark.anyio
+async def test_rotas_do_catalogo_sao_medidas(cliente, cabecalho):
+    resposta = await cliente.get("/catalog/produtos", headers=cabecalho(2))
+
+    assert resposta.status_code == 200
+    assert "Server-Timing" in resposta.headers
+    metricas = (await cliente.get("/metrics")).text
+    assert 'delivery_respostas_total{metodo="GET",rota="/catalog/produtos",status="200"}' in metricas
+
+
+@pytest.mark.anyio
+async def test_alteracoes_simultaneas_recebem_versoes_diferentes(cliente, cabecalho):
+    respostas = await asyncio.gather(
+        *(cliente.post("/catalog/produto", json={"sabor": f"sabor{indice}", "tamanho": "M", "preco": 20.0}, headers=cabecalho(1)) for indice in range(3)),
+        cliente.patch("/catalog/produto/1", json={"preco": 12.0}, headers=cabecalho(1)),
+    )
+
+    assert [resposta.status_code for resposta in respostas] == [200] * 4
+    catalogo = (await cliente.get("/catalog/produtos", headers=cabecalho(2))).json()
+    # a versão inicial (1) mais uma por alteração
+    assert catalogo["versao"] == 5
+    assert len(catalogo["produtos"]) == 4
+
+
+@pytest.mark.anyio
+async def test_apps_com_catalogos_diferentes(tmp_path, cabecalho):
+    sabores = {"a": "portuguesa", "b": "margherita"}
+    for nome in sabores:
+        (tmp_path / nome).mkdir()
+    async with montar_app(tmp_path / "a") as app_a, montar_app(tmp_path / "b") as app_b:
+        assert app_a.state.catalogo_produtos is not app_b.state.catalogo_produtos
+        clientes = {
+            nome: httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testes")
+            for nome, app in (("a", app_a), ("b", app_b))
+        }
+        # o produto 2 de cada banco tem um sabor diferente
+        for nome, sabor in sabores.items():
+            resposta = await clientes[nome].post("/catalog/produto", json={"sabor": sabor, "tamanho": "M", "preco": 20.0}, headers=cabecalho(1))
+            assert resposta.json()["produto"]["id"] == 2
+
+        for nome, sabor in sabores.items():
+            cliente = clientes[nome]
+            id_pedido = (await cliente.post("/orders/pedido", json={"usuario": 2}, headers=cabecalho(2))).json()["pedido_id"]
+            resposta = await cliente.post(f"/orders/pedido/adicionar_item/{id_pedido}", json={"quantidade": 1, "sabor": sabor, "tamanho": "M"}, headers=cabecalho(2))
+            assert resposta.status_code == 200
+            pedido = (await cliente.post(f"/orders/pedido/{id_pedido}", headers=cabecalho(2))).json()["pedido"]
+            assert [(item["produto"], item["sabor"]) for item in pedido["itens"]] == [(2, sabor)]
+
+            # o sabor do outro app não está no catálogo deste
+            outro = next(outro for outro in sabores.values() if outro != sabor)
+            resposta = await cliente.post(f"/orders/pedido/adicionar_item/{id_pedido}", json={"quantidade": 1, "sabor": outro, "tamanho": "M"}, headers=cabecalho(2))
+            assert resposta.status_code == 400
+        for cliente in clientes.values():
+            await cliente.aclose()
@@ -0,0 +1,20 @@
+"""
+O número de consultas SQL das rotas de leitura de pedidos não pode crescer com a quantidade de
+pedidos do usuário (N+1).
+"""
+import asyncio
+
+from benchmarks.contagem_consultas import contar_consultas
+
+VOLUMES = (1, 10, 50)
+
+
+def test_consultas_constantes_por_volume(tmp_path):
+    async def contar():
+        return {volume: await contar_consultas(volume, str(tmp_path), 3) for volume in VOLUMES}
+
+    resultados = asyncio.run(contar())
+
+    for volume in VOLUMES[1:]:
+        assert resultados[volume] == resultados[VOLUMES[0]], resultados
+    assert resultados[VOLUMES[0]]["obter_pedido"] == 1
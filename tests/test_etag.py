@@ -0,0 +1,77 @@
+"""
+ETag dos pedidos: a versão sobe a cada escrita, o If-None-Match com a versão atual responde 304 e
+uma escrita com If-Match de uma versão antiga responde 412 sem alterar o pedido.
+"""
+import pytest
+
+from test_itens_pedido import criar_pedido
+
+
+async def ler_pedido(cliente, cabecalho, id_pedido, **cabecalhos):
+    return await cliente.post(f"/orders/pedido/{id_pedido}", headers={**cabecalho(2), **cabecalhos})
+
+
+@pytest.mark.anyio
+async def test_versao_sobe_a_cada_escrita(cliente, cabecalho):
+    id_pedido, (id_item,) = await criar_pedido(cliente, cabecalho, 1)
+    resposta = await ler_pedido(cliente, cabecalho, id_pedido)
+    versao = resposta.json()["pedido"]["versao"]
+    assert resposta.headers["ETag"] == f'"{id_pedido}.{versao}"'
+
+    escritas = [
+        ("/orders/pedido/adicionar_item", id_pedido, {"json": {"quantidade": 1, "produto": 1}}),
+        ("/orders/pedido/remover_item", id_item, {}),
+        ("/orders/pedido/itens", id_pedido, {"json": {"adicionar": [{"quantidade": 1, "produto": 1}]}}),
+        ("/orders/pedido/cancelar", id_pedido, {}),
+    ]
+    for rota, id_alvo, corpo in escritas:
+        resposta = await cliente.post(f"{rota}/{id_alvo}", headers=cabecalho(2), **corpo)
+        assert resposta.status_code == 200
+        versao += 1
+        assert resposta.headers["ETag"] == f'"{id_pedido}.{versao}"'
+        assert (await ler_pedido(cliente, cabecalho, id_pedido)).json()["pedido"]["versao"] == versao
+
+
+@pytest.mark.anyio
+async def test_if_none_match_responde_304(cliente, cabecalho):
+    id_pedido, _ = await criar_pedido(cliente, cabecalho, 1)
+    etag = (await ler_pedido(cliente, cabecalho, id_pedido)).headers["ETag"]
+
+    resposta = await ler_pedido(cliente, cabecalho, id_pedido, **{"If-None-Match": etag})
+    assert resposta.status_code == 304
+    assert resposta.headers["ETag"] == etag
+    assert resposta.content == b""
+    # o ETag de uma versão antiga devolve o pedido atual
+    assert (await cliente.post(f"/orders/pedido/adicionar_item/{id_pedido}", json={"quantidade": 1, "produto": 1}, headers=cabecalho(2))).status_code == 200
+    resposta = await ler_pedido(cliente, cabecalho, id_pedido, **{"If-None-Match": etag})
+    assert resposta.status_code == 200
+    assert resposta.json()["qtde_itens"] == 2
+
+    lista = await cliente.post("/orders/listar/pedidos_usuario", headers=cabecalho(2))
+    resposta = await cliente.post("/orders/listar/pedidos_usuario", headers={**cabecalho(2), "If-None-Match": lista.headers["ETag"]})
+    assert resposta.status_code == 304
+
+
+@pytest.mark.anyio
+async def test_if_match_antigo_responde_412(cliente, cabecalho):
+    id_pedido, (id_item,) = await criar_pedido(cliente, cabecalho, 1)
+    etag_antigo = (await ler_pedido(cliente, cabecalho, id_pedido)).headers["ETag"]
+    resposta = await cliente.post(f"/orders/pedido/adicionar_item/{id_pedido}", json={"quantidade": 1, "produto": 1}, headers={**cabecalho(2), "If-Match": etag_antigo})
+    assert resposta.status_code == 200
+    etag_atual = resposta.headers["ETag"]
+
+    escritas = [
+        ("/orders/pedido/adicionar_item", id_pedido, {"json": {"quantidade": 1, "produto": 1}}),
+        ("/orders/pedido/remover_item", id_item, {}),
+        ("/orders/pedido/itens", id_pedido, {"json": {"adicionar": [{"quantidade": 1, "produto": 1}]}}),
+        ("/orders/pedido/finalizar", id_pedido, {}),
+    ]
+    for rota, id_alvo, corpo in escritas:
+        resposta = await cliente.post(f"{rota}/{id_alvo}", headers={**cabecalho(2), "If-Match": etag_antigo}, **corpo)
+        assert resposta.status_code == 412
+
+    pedido = (await ler_pedido(cliente, cabecalho, id_pedido)).json()
+    assert (pedido["qtde_itens"], pedido["pedido"]["status"], pedido["pedido"]["total"]) == (2, "PENDENTE", 20.0)
+    # com a versão atual a escrita é aceita
+    resposta = await cliente.post(f"/orders/pedido/finalizar/{id_pedido}", headers={**cabecalho(2), "If-Match": etag_atual})
+    assert resposta.status_code == 200
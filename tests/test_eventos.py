@@ -0,0 +1,75 @@
+"""
+Eventos de pedidos: as mudanças de status e de itens chegam em tempo real ao dono do pedido (e aos
+administradores que acompanham todos os pedidos), e nenhum outro usuário recebe os eventos dele.
+"""
+import asyncio
+
+import orjson
+import pytest
+
+from auth_routes import criar_token
+from models import Usuario
+
+
+async def abrir_ws(app, id_usuario, todos=False):
+    """
+    Abre a rota /orders/ws diretamente pelo protocolo ASGI (o transporte do httpx não tem WebSocket)
+    e devolve as filas de mensagens de entrada e de saída e a tarefa da conexão.
+    """
+    entrada, saida = asyncio.Queue(), asyncio.Queue()
+    consulta = f"token={criar_token(id_usuario)}" + ("&todos=true" if todos else "")
+    scope = {
+        "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "path": "/orders/ws",
+        "raw_path": b"/orders/ws", "root_path": "", "query_string": consulta.encode(),
+        "headers": [(b"host", b"testes")], "client": ("127.0.0.1", 1), "server": ("testes", 80), "subprotocols": [],
+    }
+    await entrada.put({"type": "websocket.connect"})
+    tarefa = asyncio.create_task(app(scope, entrada.get, saida.put))
+    return entrada, saida, tarefa
+
+
+async def receber(saida):
+    mensagem = await asyncio.wait_for(saida.get(), 2)
+    if mensagem["type"] == "websocket.send":
+        return orjson.loads(mensagem["bytes"])
+    return mensagem
+
+
+async def fechar_ws(entrada, tarefa):
+    await entrada.put({"type": "websocket.disconnect", "code": 1000})
+    await asyncio.wait_for(tarefa, 2)
+
+
+@pytest.mark.anyio
+async def test_eventos_chegam_so_ao_dono_do_pedido(app_testes, cliente, cabecalho):
+    async with app_testes.state.fabrica_sessao() as session:
+        session.add(Usuario("outro", "outro@testes", "-"))
+        await session.commit()
+
+    conexoes = {}
+    for nome, id_usuario, todos in (("dono", 2, False), ("outro", 3, False), ("admin", 1, True)):
+        conexoes[nome] = await abrir_ws(app_testes, id_usuario, todos)
+        assert (await receber(conexoes[nome][1]))["type"] == "websocket.accept"
+
+    id_pedido = (await cliente.post("/orders/pedido", json={"usuario": 2}, headers=cabecalho(2))).json()["pedido_id"]
+    assert (await cliente.post(f"/orders/pedido/adicionar_item/{id_pedido}", json={"quantidade": 2, "produto": 1}, headers=cabecalho(2))).status_code == 200
+    assert (await cliente.post(f"/orders/pedido/finalizar/{id_pedido}", headers=cabecalho(2))).status_code == 200
+
+    for nome in ("dono", "admin"):
+        saida = conexoes[nome][1]
+        total, status = await receber(saida), await receber(saida)
+        assert (total["tipo"], total["pedido"]["id"], total["pedido"]["total"], total["pedido"]["qtde_itens"]) == ("total", id_pedido, 20.0, 1)
+        assert (status["tipo"], status["pedido"]["id"], status["pedido"]["status"]) == ("status", id_pedido, "FINALIZADO")
+    assert conexoes["outro"][1].empty()
+
+    for entrada, _, tarefa in conexoes.values():
+        await fechar_ws(entrada, tarefa)
+
+
+@pytest.mark.anyio
+async def test_so_administradores_acompanham_todos_os_pedidos(app_testes, cliente, cabecalho):
+    assert (await cliente.get("/orders/eventos", params={"todos": "true"}, headers=cabecalho(2))).status_code == 401
+
+    entrada, saida, tarefa = await abrir_ws(app_testes, 2, todos=True)
+    assert await receber(saida) == {"type": "websocket.close", "code": 1008, "reason": ""}
+    await asyncio.wait_for(tarefa, 2)
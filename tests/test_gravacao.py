@@ -0,0 +1,61 @@
+"""
+Gravação em lote (GRAVACAO_LOTE): escritas concorrentes pelas rotas HTTP, em número maior que o
+pool de conexões do app, e falha imediata do lote inteiro quando o pool se esgota.
+"""
+import asyncio
+
+import httpx
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from conftest import montar_app
+from database import criar_fabrica_sessao
+from gravacao import GravadorLote
+from test_itens_pedido import criar_pedido, obter_pedido
+
+
+@pytest.mark.anyio
+async def test_escritas_concorrentes_acima_do_pool(tmp_path, cabecalho):
+    async with montar_app(tmp_path, GRAVACAO_LOTE=True) as app, httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testes") as cliente:
+        pool = app.state.engine.sync_engine.pool
+        concorrencia = 3 * (pool.size() + pool._max_overflow)
+
+        id_pedido, _ = await criar_pedido(cliente, cabecalho, 0)
+        respostas = await asyncio.wait_for(asyncio.gather(*(
+            cliente.post(f"/orders/pedido/adicionar_item/{id_pedido}", json={"quantidade": 1, "produto": 1}, headers=cabecalho(2))
+            for _ in range(concorrencia)
+        )), timeout=20)
+
+        assert [resposta.status_code for resposta in respostas] == [200] * concorrencia
+        pedido = await obter_pedido(cliente, cabecalho, id_pedido)
+        assert pedido["qtde_itens"] == concorrencia
+        assert pedido["total"] == pytest.approx(10.0 * concorrencia)
+        assert app.state.gravador_lote.operacoes == concorrencia + 1
+
+
+@pytest.mark.anyio
+async def test_pool_esgotado_falha_o_lote_sem_repetir(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'gravacao.db'}", pool_size=1, max_overflow=0, pool_timeout=0.2)
+    fabrica = criar_fabrica_sessao(engine)
+    sessoes = []
+
+    def fabrica_contada():
+        sessoes.append(1)
+        return fabrica()
+
+    async def operacao(session):
+        return await session.scalar(text("SELECT 1"))
+
+    gravador = GravadorLote(fabrica_contada, 0.05, 10)
+    try:
+        # a única conexão do pool fica presa durante todo o teste
+        async with engine.connect():
+            resultados = await asyncio.gather(*(gravador.executar(operacao) for _ in range(3)), return_exceptions=True)
+    finally:
+        await gravador.parar()
+        await engine.dispose()
+
+    assert all(isinstance(resultado, exc.TimeoutError) for resultado in resultados)
+    # as operações não são refeitas uma a uma, cada uma esperando de novo pelo pool
+    assert len(sessoes) == 1
@@ -0,0 +1,96 @@
+"""
+Inclusão e remoção de itens: o total e a quantidade de itens do pedido precisam continuar
+corretos com requisições concorrentes.
+"""
+import asyncio
+
+import pytest
+
+
+async def criar_pedido(cliente, cabecalho, itens):
+    id_pedido = (await cliente.post("/orders/pedido", json={"usuario": 2}, headers=cabecalho(2))).json()["pedido_id"]
+    ids_itens = []
+    for _ in range(itens):
+        resposta = await cliente.post(f"/orders/pedido/adicionar_item/{id_pedido}", json={"quantidade": 1, "produto": 1}, headers=cabecalho(2))
+        assert resposta.status_code == 200
+        ids_itens.append(resposta.json()["item_pedido"])
+    return id_pedido, ids_itens
+
+
+async def obter_pedido(cliente, cabecalho, id_pedido):
+    return (await cliente.post(f"/orders/pedido/{id_pedido}", headers=cabecalho(2))).json()["pedido"]
+
+
+@pytest.mark.anyio
+async def test_remocoes_concorrentes_do_mesmo_item(cliente, cabecalho):
+    id_pedido, ids_itens = await criar_pedido(cliente, cabecalho, 2)
+
+    respostas = await asyncio.gather(*(
+        cliente.post(f"/orders/pedido/remover_item/{ids_itens[0]}", headers=cabecalho(2)) for _ in range(3)
+    ))
+
+    assert sorted(resposta.status_code for resposta in respostas) == [200, 400, 400]
+    pedido = await obter_pedido(cliente, cabecalho, id_pedido)
+    assert (pedido["total"], pedido["qtde_itens"], len(pedido["itens"])) == (10.0, 1, 1)
+
+
+@pytest.mark.anyio
+async def test_remocoes_concorrentes_em_lote(cliente, cabecalho):
+    id_pedido, ids_itens = await criar_pedido(cliente, cabecalho, 3)
+
+    respostas = await asyncio.gather(*(
+        cliente.post(f"/orders/pedido/itens/{id_pedido}", json={"remover": ids_itens[:2]}, headers=cabecalho(2)) for _ in range(3)
+    ))
+
+    assert sorted(resposta.status_code for resposta in respostas) == [200, 400, 400]
+    removidos = next(resposta for resposta in respostas if resposta.status_code == 200).json()["removidos"]
+    assert sorted(item["item_pedido"] for item in removidos) == ids_itens[:2]
+    pedido = await obter_pedido(cliente, cabecalho, id_pedido)
+    assert (pedido["total"], pedido["qtde_itens"], len(pedido["itens"])) == (10.0, 1, 1)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("encerramento", ["finalizar", "cancelar"])
+async def test_itens_de_pedido_encerrado_nao_mudam(cliente, cabecalho, encerramento):
+    id_pedido, ids_itens = await criar_pedido(cliente, cabecalho, 2)
+    assert (await cliente.post(f"/orders/pedido/{encerramento}/{id_pedido}", headers=cabecalho(2))).status_code == 200
+    antes = await obter_pedido(cliente, cabecalho, id_pedido)
+
+    respostas = [
+        await cliente.post(f"/orders/pedido/adicionar_item/{id_pedido}", json={"quantidade": 1, "produto": 1}, headers=cabecalho(2)),
+        await cliente.post(f"/orders/pedido/remover_item/{ids_itens[0]}", headers=cabecalho(2)),
+        await cliente.post(f"/orders/pedido/itens/{id_pedido}", json={"adicionar": [{"quantidade": 1, "produto": 1}], "remover": ids_itens[1:]}, headers=cabecalho(2)),
+    ]
+
+    assert [resposta.status_code for resposta in respostas] == [400, 400, 400]
+    assert await obter_pedido(cliente, cabecalho, id_pedido) == antes
+
+
+@pytest.mark.anyio
+async def test_ajuste_de_totais_recusa_pedido_encerrado_depois_da_leitura(app_testes, cliente, cabecalho):
+    # simula um pedido finalizado por outra requisição entre a leitura e a gravação do item
+    from fastapi import HTTPException
+    from models import ItemPedido
+    from order_routes import inserir_item_pedido
+
+    id_pedido, _ = await criar_pedido(cliente, cabecalho, 1)
+    await cliente.post(f"/orders/pedido/finalizar/{id_pedido}", headers=cabecalho(2))
+
+    async with app_testes.state.fabrica_sessao() as session:
+        with pytest.raises(HTTPException) as erro:
+            await inserir_item_pedido(session, ItemPedido(id_pedido, 1, 1, 10.0))
+    assert erro.value.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_quantidade_nao_positiva_e_recusada_nas_duas_rotas(cliente, cabecalho):
+    id_pedido, _ = await criar_pedido(cliente, cabecalho, 1)
+    antes = await obter_pedido(cliente, cabecalho, id_pedido)
+
+    for quantidade in (-5, 0):
+        respostas = [
+            await cliente.post(f"/orders/pedido/adicionar_item/{id_pedido}", json={"quantidade": quantidade, "produto": 1}, headers=cabecalho(2)),
+            await cliente.post(f"/orders/pedido/itens/{id_pedido}", json={"adicionar": [{"quantidade": quantidade, "produto": 1}]}, headers=cabecalho(2)),
+        ]
+        assert [resposta.status_code for resposta in respostas] == [422, 422]
+    assert await obter_pedido(cliente, cabecalho, id_pedido) == antes
@@ -0,0 +1,19 @@
+"""
+As consultas frequentes de pedidos, do arquivo e da fila de tarefas precisam usar índices
+(EXPLAIN QUERY PLAN no SQLite), sem percorrer a tabela inteira.
+"""
+import asyncio
+
+import pytest
+
+from benchmarks.plano_consultas import CONSULTAS, obter_planos
+
+
+@pytest.fixture(scope="module")
+def planos(tmp_path_factory):
+    return asyncio.run(obter_planos(str(tmp_path_factory.mktemp("plano"))))
+
+
+@pytest.mark.parametrize("nome", list(CONSULTAS))
+def test_consulta_usa_indice(planos, nome):
+    assert not planos[nome]["varredura_completa"], planos[nome]["plano"]
@@ -0,0 +1,51 @@
+"""
+Resumo dos pedidos: a projeção de leitura acompanha o pedido a cada inclusão e remoção de itens e a
+cada mudança de status, com ou sem a gravação em lote, e coincide com a reconstrução completa.
+"""
+import httpx
+import pytest
+from sqlalchemy import select
+
+from conftest import montar_app
+from models import Pedido, ResumoPedido
+from resumo_pedidos import reconstruir_resumos
+
+
+async def conferir_resumos(app):
+    async with app.state.fabrica_sessao() as session:
+        pedidos = {pedido.id: (pedido.usuario, pedido.status, pedido.total, pedido.qtde_itens) for pedido in (await session.scalars(select(Pedido))).all()}
+        resumos = {resumo.pedido: (resumo.usuario, resumo.status, resumo.total, resumo.qtde_itens) for resumo in (await session.scalars(select(ResumoPedido))).all()}
+    assert resumos == pedidos
+    return resumos
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("gravacao_lote", [False, True], ids=["sessao", "lote"])
+async def test_resumo_acompanha_o_pedido(tmp_path, cabecalho, gravacao_lote):
+    async with montar_app(tmp_path, GRAVACAO_LOTE=gravacao_lote) as app, httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testes") as cliente:
+        async def escrever(rota, **corpo):
+            resposta = await cliente.post(rota, headers=cabecalho(2), **corpo)
+            assert resposta.status_code == 200
+            await conferir_resumos(app)
+            return resposta.json()
+
+        id_pedido = (await escrever("/orders/pedido", json={"usuario": 2}))["pedido_id"]
+        outro_pedido = (await escrever("/orders/pedido", json={"usuario": 2}))["pedido_id"]
+        ids_itens = [(await escrever(f"/orders/pedido/adicionar_item/{id_pedido}", json={"quantidade": 3, "produto": 1}))["item_pedido"] for _ in range(2)]
+        await escrever(f"/orders/pedido/remover_item/{ids_itens[0]}")
+        await escrever(f"/orders/pedido/itens/{id_pedido}", json={"adicionar": [{"quantidade": 1, "produto": 1}] * 2, "remover": [ids_itens[1]]})
+        await escrever(f"/orders/pedido/adicionar_item/{outro_pedido}", json={"quantidade": 1, "produto": 1})
+        await escrever(f"/orders/pedido/finalizar/{id_pedido}")
+        await escrever(f"/orders/pedido/cancelar/{outro_pedido}")
+
+        resumos = await conferir_resumos(app)
+        assert [(status.name, total, qtde_itens) for _, status, total, qtde_itens in resumos.values()] == [("FINALIZADO", 20.0, 2), ("CANCELADO", 10.0, 1)]
+        historico = (await cliente.post("/orders/listar/meus_pedidos", headers=cabecalho(2))).json()["pedidos"]
+        assert [(resumo["pedido"], resumo["status"], resumo["total"], resumo["qtde_itens"]) for resumo in historico] == [
+            (outro_pedido, "CANCELADO", 10.0, 1), (id_pedido, "FINALIZADO", 20.0, 2)
+        ]
+
+        # a reconstrução completa chega aos mesmos resumos mantidos pelas rotas
+        async with app.state.fabrica_sessao() as session:
+            assert await reconstruir_resumos(session) == 2
+        assert await conferir_resumos(app) == resumos
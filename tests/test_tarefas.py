@@ -0,0 +1,174 @@
+"""
+Fila de tarefas em segundo plano: idempotência pela chave, novas tentativas e dead letter nos dois
+backends, e uma fila por app, com os workers ligados ao banco do app.
+"""
+import asyncio
+
+import httpx
+import pytest
+from sqlalchemy import select, func
+
+import tarefas
+from conftest import montar_app
+from configuracoes import configuracoes
+from database import criar_engine, criar_fabrica_sessao
+from models import Base, Tarefa, TarefaFalha
+from tarefas import BackendBanco, BackendMemoria, TIPOS_TAREFA, tipo_tarefa
+
+
+@pytest.fixture
+def execucoes(monkeypatch):
+    """
+    Registra os tipos de tarefa "unica" (sempre conclui), "instavel" (falha nas duas primeiras
+    execuções) e "quebrada" (sempre falha) e devolve as execuções de cada um.
+    """
+    monkeypatch.setattr(configuracoes, "TAREFAS_MAXIMO_TENTATIVAS", 3)
+    monkeypatch.setattr(configuracoes, "TAREFAS_BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(configuracoes, "TAREFAS_BACKOFF_MAXIMO", 0.05)
+    monkeypatch.setattr(configuracoes, "TAREFAS_INTERVALO", 0.05)
+    contagem = {}
+    falhas = {"instavel": 2, "quebrada": float("inf")}
+
+    def registrar_tipo(tipo):
+        @tipo_tarefa(tipo)
+        async def executar(session, dados):
+            contagem[tipo] = contagem.get(tipo, 0) + 1
+            if contagem[tipo] <= falhas.get(tipo, 0):
+                raise RuntimeError(f"falha simulada em {tipo}")
+    for tipo in ("unica", "instavel", "quebrada"):
+        registrar_tipo(tipo)
+    yield contagem
+    for tipo in ("unica", "instavel", "quebrada"):
+        del TIPOS_TAREFA[tipo]
+
+
+@pytest.fixture
+async def fabrica_sessao(tmp_path):
+    engine = criar_engine(f"sqlite+aiosqlite:///{tmp_path / 'tarefas.db'}")
+    async with engine.begin() as conexao:
+        await conexao.run_sync(Base.metadata.create_all)
+    yield criar_fabrica_sessao(engine)
+    await engine.dispose()
+
+
+async def enfileirar(fila, fabrica_sessao, tipo, chave):
+    async with fabrica_sessao() as session:
+        await fila.enfileirar(session, tipo, {}, chave)
+        await session.commit()
+        await fila.despachar(session)
+
+
+async def aguardar_tarefas(app, limite_segundos=5):
+    inicio = asyncio.get_running_loop().time()
+    while asyncio.get_running_loop().time() - inicio < limite_segundos:
+        async with app.state.fabrica_sessao() as session:
+            tarefas = (await session.scalars(select(Tarefa))).all()
+        if tarefas and all(tarefa.concluida_em is not None for tarefa in tarefas):
+            return tarefas
+        await asyncio.sleep(0.02)
+    return tarefas
+
+
+@pytest.mark.anyio
+async def test_memoria_executa_cada_chave_uma_vez(execucoes, fabrica_sessao):
+    fila = BackendMemoria()
+    for _ in range(2):
+        await enfileirar(fila, fabrica_sessao, "unica", "unica:1")
+    await enfileirar(fila, fabrica_sessao, "unica", "unica:2")
+
+    assert execucoes == {"unica": 2}
+    assert fila.resultados == {("unica", "concluida"): 2}
+
+
+@pytest.mark.anyio
+async def test_memoria_repete_a_tarefa_que_falha(execucoes, fabrica_sessao):
+    fila = BackendMemoria()
+    await enfileirar(fila, fabrica_sessao, "instavel", "instavel:1")
+
+    assert execucoes == {"instavel": 3}
+    assert fila.resultados == {("instavel", "repetida"): 2, ("instavel", "concluida"): 1}
+    assert fila.falhas == []
+
+
+@pytest.mark.anyio
+async def test_memoria_guarda_a_tarefa_que_esgota_as_tentativas(execucoes, fabrica_sessao):
+    fila = BackendMemoria()
+    await enfileirar(fila, fabrica_sessao, "quebrada", "quebrada:1")
+
+    assert execucoes == {"quebrada": 3}
+    assert [(falha["tipo"], falha["chave"], falha["erro"]) for falha in fila.falhas] == [
+        ("quebrada", "quebrada:1", "RuntimeError: falha simulada em quebrada")
+    ]
+    assert fila.resultados == {("quebrada", "repetida"): 2, ("quebrada", "falha"): 1}
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("on_conflict", [True, False], ids=["on_conflict", "savepoint"])
+async def test_banco_ignora_chave_repetida(fabrica_sessao, monkeypatch, on_conflict):
+    # sem o ON CONFLICT, o SQLite segue o caminho dos demais bancos (consulta e INSERT em um savepoint)
+    if not on_conflict:
+        monkeypatch.setattr(tarefas, "DIALETOS_ON_CONFLICT", {})
+    fila = BackendBanco()
+    async with fabrica_sessao() as session:
+        for _ in range(2):
+            await fila.enfileirar(session, "unica", {}, "unica:1")
+        await session.commit()
+    async with fabrica_sessao() as session:
+        session.add(TarefaFalha(tarefa=0, tipo="outra", chave="outra", dados={}, tentativas=1, erro="-", criado_em=tarefas.agora()))
+        await fila.enfileirar(session, "unica", {}, "unica:1")
+        await session.commit()
+
+    async with fabrica_sessao() as session:
+        assert await session.scalar(select(func.count(Tarefa.id))) == 1
+        # a chave repetida não desfaz o restante da transação de quem enfileira
+        assert await session.scalar(select(func.count(TarefaFalha.id))) == 1
+
+
+@pytest.mark.anyio
+async def test_banco_repete_e_move_para_falhas(execucoes, fabrica_sessao):
+    fila = BackendBanco()
+    await fila.iniciar(fabrica_sessao, 2)
+    try:
+        for tipo in ("unica", "instavel", "quebrada"):
+            await enfileirar(fila, fabrica_sessao, tipo, f"{tipo}:1")
+        for _ in range(200):
+            async with fabrica_sessao() as session:
+                if not await session.scalar(select(func.count(Tarefa.id)).filter(Tarefa.concluida_em.is_(None))):
+                    break
+            await asyncio.sleep(0.02)
+
+        async with fabrica_sessao() as session:
+            tarefas_fila = {tarefa.chave: tarefa for tarefa in (await session.scalars(select(Tarefa))).all()}
+            falhas = (await session.scalars(select(TarefaFalha))).all()
+    finally:
+        await fila.parar()
+
+    assert execucoes == {"unica": 1, "instavel": 3, "quebrada": 3}
+    assert tarefas_fila["instavel:1"].tentativas == 3
+    assert "quebrada:1" not in tarefas_fila
+    assert [(falha.chave, falha.tentativas) for falha in falhas] == [("quebrada:1", 3)]
+
+
+@pytest.mark.anyio
+async def test_filas_de_apps_diferentes(tmp_path, cabecalho):
+    for nome in "abcd":
+        (tmp_path / nome).mkdir()
+    async with montar_app(tmp_path / "a", TAREFAS_BACKEND="banco") as app_a, montar_app(tmp_path / "b", TAREFAS_BACKEND="banco") as app_b:
+        assert app_a.state.fila_tarefas is not app_b.state.fila_tarefas
+        for app in (app_a, app_b):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testes") as cliente:
+                id_pedido = (await cliente.post("/orders/pedido", json={"usuario": 2}, headers=cabecalho(2))).json()["pedido_id"]
+                resposta = await cliente.post(f"/orders/pedido/finalizar/{id_pedido}", headers=cabecalho(2))
+                assert resposta.status_code == 200
+
+        for app in (app_a, app_b):
+            tarefas = await aguardar_tarefas(app)
+            assert len(tarefas) == 3
+            assert all(tarefa.concluida_em is not None for tarefa in tarefas)
+
+    # o encerramento de um app para apenas os workers da sua fila
+    async with montar_app(tmp_path / "c", TAREFAS_BACKEND="banco") as app_c:
+        async with montar_app(tmp_path / "d", TAREFAS_BACKEND="banco") as app_d:
+            fila_c = app_c.state.fila_tarefas
+        assert app_d.state.fila_tarefas is None
+        assert fila_c._tarefas
@@ -0,0 +1,84 @@
+"""
+Verificação dos tokens: exp obrigatório em todos os algoritmos, revogação no logout (inclusive de
+tokens já no cache) e o modo sem estado (TOKEN_SEM_ESTADO), que dispensa a consulta do usuário só
+para o access token.
+"""
+import time
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from jose import jwt, JWTError
+
+import dependencies
+from auth_routes import criar_token
+from configuracoes import configuracoes
+from dependencies import cache_usuarios
+from tokens import VerificadorToken, IdentidadeToken, tokens_revogados
+
+
+def chaves_es256():
+    chave = ec.generate_private_key(ec.SECP256R1())
+    privada = chave.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()).decode()
+    publica = chave.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+    return privada, publica
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("algoritmo", ["HS256", "ES256"])
+async def test_token_sem_exp_e_recusado(cliente, monkeypatch, algoritmo):
+    if algoritmo == "ES256":
+        chave_assinatura, chave_verificacao = chaves_es256()
+    else:
+        chave_assinatura = chave_verificacao = "chave-hmac"
+    verificador = VerificadorToken(chave_verificacao, algoritmo)
+    monkeypatch.setattr(dependencies, "verificador_token", verificador)
+
+    sem_exp = jwt.encode({"sub": "2", "jti": "sem-exp"}, chave_assinatura, algoritmo)
+    with pytest.raises(JWTError):
+        verificador.decodificar(sem_exp)
+    resposta = await cliente.get("/orders/", headers={"Authorization": f"Bearer {sem_exp}"})
+    assert resposta.status_code == 401
+
+    com_exp = jwt.encode({"sub": "2", "jti": "com-exp", "exp": int(time.time()) + 60}, chave_assinatura, algoritmo)
+    assert (await cliente.get("/orders/", headers={"Authorization": f"Bearer {com_exp}"})).status_code == 200
+
+
+@pytest.mark.anyio
+async def test_logout_revoga_o_token_em_cache(cliente):
+    token = criar_token(2)
+    cabecalho = {"Authorization": f"Bearer {token}"}
+    # a primeira requisição deixa o token decodificado no cache de tokens
+    assert (await cliente.get("/orders/", headers=cabecalho)).status_code == 200
+
+    assert (await cliente.post("/auth/logout", headers=cabecalho)).status_code == 200
+    assert (await cliente.get("/orders/", headers=cabecalho)).status_code == 401
+
+    # os demais workers recusam o token depois de recarregar a lista do banco
+    tokens_revogados.jtis = set()
+    tokens_revogados._carregado_em = None
+    assert (await cliente.get("/orders/", headers=cabecalho)).status_code == 401
+    # outros tokens do mesmo usuário continuam válidos
+    assert (await cliente.get("/orders/", headers={"Authorization": f"Bearer {criar_token(2)}"})).status_code == 200
+
+
+@pytest.mark.anyio
+async def test_token_sem_estado(cliente, monkeypatch):
+    monkeypatch.setattr(configuracoes, "TOKEN_SEM_ESTADO", True)
+    # o usuário 99 não existe: só as claims assinadas do access token o autenticam como administrador
+    access_token = criar_token(99, usuario=IdentidadeToken(99, admin=True, ativo=True))
+    resposta = await cliente.post("/orders/listar", headers={"Authorization": f"Bearer {access_token}"})
+    assert resposta.status_code == 200
+    assert cache_usuarios.obter(99) is None
+
+    inativo = criar_token(2, usuario=IdentidadeToken(2, admin=False, ativo=False))
+    assert (await cliente.get("/orders/", headers={"Authorization": f"Bearer {inativo}"})).status_code == 401
+    assert cache_usuarios.obter(2) is None
+
+    # o refresh token não leva as claims e continua passando pelo banco
+    assert (await cliente.get("/auth/refresh", headers={"Authorization": f"Bearer {criar_token(99)}"})).status_code == 401
+    resposta = await cliente.get("/auth/refresh", headers={"Authorization": f"Bearer {criar_token(2)}"})
+    assert resposta.status_code == 200
+    assert cache_usuarios.obter(2) is not None
+    claims = jwt.get_unverified_claims(resposta.json()["access_token"])
+    assert (claims["adm"], claims["atv"]) == (False, True)
@@ -0,0 +1,26 @@
+"""
+Exportação e importação em massa de usuários: o hash da senha não sai na exportação.
+"""
+import pytest
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("formato", ["ndjson", "csv"])
+async def test_exportacao_de_usuarios_sem_senha(cliente, cabecalho, formato):
+    resposta = await cliente.get(f"/data/exportar/usuarios?formato={formato}", headers=cabecalho(1))
+
+    assert resposta.status_code == 200
+    assert "admin@testes" in resposta.text
+    assert "senha" not in resposta.text
+
+
+@pytest.mark.anyio
+async def test_usuario_importado_sem_senha_nao_faz_login(cliente, cabecalho):
+    exportado = (await cliente.get("/data/exportar/usuarios", headers=cabecalho(1))).text
+    linha = exportado.splitlines()[0].replace('"id":1', '"id":10').replace("admin@testes", "importado@testes")
+
+    resposta = await cliente.post("/data/importar/usuarios", content=linha + "\n", headers=cabecalho(1))
+    assert resposta.status_code == 200
+
+    login = await cliente.post("/auth/login", json={"email": "importado@testes", "senha": "!"})
+    assert login.status_code == 400
@@ -0,0 +1,113 @@
+from jose import jwt, JWTError
+from jose.exceptions import ExpiredSignatureError
+from sqlalchemy import select
+from configuracoes import configuracoes
+from metricas import registrar_coletor
+from models import TokenRevogado
+from datetime import datetime, timezone
+import base64
+import binascii
+import hashlib
+import hmac
+import orjson
+import time
+
+# algoritmos HMAC verificados diretamente; os demais (RS256, ES256...) continuam com o python-jose
+ALGORITMOS_HMAC = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+
+def decodificar_base64(valor):
+    return base64.urlsafe_b64decode(valor + "=" * (-len(valor) % 4))
+
+
+class VerificadorToken:
+    """
+    Verificador de JWT montado uma única vez com a chave e o algoritmo da aplicação. Nos algoritmos
+    HMAC, o estado do HMAC com a chave já processada é criado no construtor e apenas copiado a cada
+    token, em vez de o python-jose resolver e preparar a chave em toda chamada. O cabeçalho precisa
+    declarar o algoritmo configurado, a assinatura é comparada em tempo constante e o exp é
+    conferido como no jwt.decode. Em todos os algoritmos o exp é obrigatório; qualquer falha levanta
+    JWTError.
+    """
+
+    def __init__(self, chave, algoritmo):
+        self.chave = chave
+        self.algoritmo = algoritmo
+        funcao_hash = ALGORITMOS_HMAC.get(algoritmo)
+        self._hmac = hmac.new(chave.encode(), digestmod=funcao_hash) if funcao_hash else None
+
+    def decodificar(self, token):
+        if self._hmac is None:
+            return jwt.decode(token, self.chave, algorithms=[self.algoritmo], options={"require_exp": True})
+
+        try:
+            cabecalho, payload, assinatura = token.split(".")
+            if orjson.loads(decodificar_base64(cabecalho)).get("alg") != self.algoritmo:
+                raise JWTError("Algoritmo do token não permitido.")
+            esperada = self._hmac.copy()
+            esperada.update(f"{cabecalho}.{payload}".encode())
+            if not hmac.compare_digest(esperada.digest(), decodificar_base64(assinatura)):
+                raise JWTError("Assinatura inválida.")
+            dados = orjson.loads(decodificar_base64(payload))
+        except (ValueError, AttributeError, binascii.Error, orjson.JSONDecodeError):
+            raise JWTError("Token inválido.")
+
+        expira_em = dados.get("exp")
+        if not isinstance(expira_em, (int, float)):
+            raise JWTError("Token sem data de expiração válida.")
+        if expira_em <= time.time():
+            raise ExpiredSignatureError("Token expirado.")
+        return dados
+
+
+class IdentidadeToken:
+    """
+    Usuário autenticado montado a partir das claims assinadas do access token no modo sem estado,
+    com os atributos usados pelas rotas (id, admin e ativo), sem consulta ao banco de dados.
+    """
+
+    def __init__(self, id, admin, ativo):
+        self.id = id
+        self.admin = admin
+        self.ativo = ativo
+
+
+class ConjuntoRevogados:
+    """
+    Conjunto em memória com os jti dos tokens revogados que ainda não expiraram, recarregado da tabela
+    tokens_revogados no máximo a cada intervalo segundos. A consulta a cada requisição é só uma busca
+    no conjunto; o processo que revoga um token o inclui imediatamente, e os demais workers passam a
+    recusá-lo na próxima recarga.
+    """
+
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self.jtis = set()
+        self._carregado_em = None
+
+    def __contains__(self, jti):
+        return jti in self.jtis
+
+    def adicionar(self, jti):
+        self.jtis.add(jti)
+
+    async def atualizar(self, session):
+        agora = time.monotonic()
+        if self._carregado_em is not None and agora - self._carregado_em < self.intervalo:
+            return
+        # marcado antes da consulta para que requisições simultâneas não recarreguem ao mesmo tempo
+        self._carregado_em = agora
+        limite = datetime.now(timezone.utc).replace(tzinfo=None)
+        self.jtis = set((await session.scalars(select(TokenRevogado.jti).filter(TokenRevogado.expira_em > limite))).all())
+
+
+verificador_token = VerificadorToken(configuracoes.SECRET_KEY, configuracoes.ALGORITHM)
+tokens_revogados = ConjuntoRevogados(configuracoes.TOKEN_REVOGADOS_INTERVALO)
+
+def exportar_metricas_tokens():
+    return [
+        "# TYPE delivery_tokens_revogados gauge",
+        f"delivery_tokens_revogados {len(tokens_revogados.jtis)}",
+    ]
+
+registrar_coletor(exportar_metricas_tokens)
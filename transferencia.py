@@ -0,0 +1,319 @@
+from sqlalchemy import select, insert, text
+from database import SessionLocal
+from configuracoes import configuracoes
+from catalogo import catalogo_produtos
+from senhas import SENHA_BLOQUEADA
+from models import Usuario, Produto, VersaoCatalogo, Pedido, ItemPedido, ResumoPedido, PedidoArquivado, ItemPedidoArquivado, StatusPedido, para_centavos
+from datetime import datetime, timezone
+import argparse
+import asyncio
+import codecs
+import csv
+import io
+import orjson
+import sys
+
+FORMATOS = ("ndjson", "csv")
+CONTEUDOS = ("usuarios", "produtos", "pedidos")
+# no CSV de pedidos cada linha é um item (os dados do pedido se repetem); pedidos sem itens têm
+# uma linha com as colunas do item vazias. Os itens são exportados com o sabor e o tamanho do
+# produto, e não com o id, para que o arquivo possa ser importado em outro catálogo
+COLUNAS_CSV = {
+    # o hash da senha não é exportado
+    "usuarios": ["id", "nome", "email", "ativo", "admin"],
+    "produtos": ["id", "sabor", "tamanho", "preco", "disponivel"],
+    "pedidos": ["pedido", "usuario", "status", "criado_em", "quantidade", "sabor", "tamanho", "preco_unitario"],
+}
+
+
+class ErroImportacao(Exception):
+    """
+    Erro em uma linha ou em um lote da importação, com a mensagem que é devolvida ao usuário.
+    """
+
+
+def linhas_csv(linhas):
+    saida = io.StringIO()
+    csv.writer(saida, lineterminator="\n").writerows(linhas)
+    return saida.getvalue().encode()
+
+async def exportar(session, conteudo, formato, tamanho_lote=configuracoes.TRANSFERENCIA_TAMANHO_LOTE):
+    """
+    Gerador assíncrono que exporta usuários, produtos ou pedidos (com os itens aninhados) em NDJSON ou CSV. As
+    linhas são lidas de um cursor no servidor em lotes de tamanho_lote e cada lote é devolvido já
+    serializado em bytes, de forma que a memória usada não depende do tamanho das tabelas. Os pedidos
+    e itens vêm de uma única consulta (LEFT JOIN ordenado por pedido) nas tabelas em uso e de outra
+    nas tabelas de arquivo, e os itens de um pedido são agrupados à medida que as linhas chegam. Os
+    usuários são exportados sem o hash da senha.
+    """
+    if formato == "csv":
+        yield linhas_csv([COLUNAS_CSV[conteudo]])
+
+    if conteudo in ("usuarios", "produtos"):
+        if conteudo == "usuarios":
+            consulta = select(Usuario.id, Usuario.nome, Usuario.email, Usuario.ativo, Usuario.admin).order_by(Usuario.id)
+        else:
+            consulta = select(Produto.id, Produto.sabor, Produto.tamanho, Produto.preco, Produto.disponivel).order_by(Produto.id)
+        resultado = await session.stream(consulta.execution_options(yield_per=tamanho_lote))
+        async for lote in resultado.partitions():
+            if formato == "csv":
+                yield linhas_csv(lote)
+            else:
+                yield b"".join(orjson.dumps(linha._asdict()) + b"\n" for linha in lote)
+        return
+
+    # primeiro os pedidos em uso e depois os arquivados, cada tabela na ordem do seu índice
+    pedido = None
+    for modelo_pedido, modelo_item in ((Pedido, ItemPedido), (PedidoArquivado, ItemPedidoArquivado)):
+        consulta = (
+            select(
+                modelo_pedido.id, modelo_pedido.usuario, modelo_pedido.status, modelo_pedido.criado_em,
+                modelo_item.quantidade, Produto.sabor, Produto.tamanho, modelo_item.preco_unitario
+            )
+            .outerjoin(modelo_item, modelo_item.pedido == modelo_pedido.id)
+            .outerjoin(Produto, Produto.id == modelo_item.produto)
+            .order_by(modelo_pedido.id, modelo_item.id)
+        )
+        resultado = await session.stream(consulta.execution_options(yield_per=tamanho_lote))
+        async for lote in resultado.partitions():
+            if formato == "csv":
+                yield linhas_csv(
+                    (id_pedido, usuario, status.name, criado_em.isoformat(), quantidade, sabor, tamanho, preco_unitario)
+                    for id_pedido, usuario, status, criado_em, quantidade, sabor, tamanho, preco_unitario in lote
+                )
+                continue
+
+            saida = []
+            for id_pedido, usuario, status, criado_em, quantidade, sabor, tamanho, preco_unitario in lote:
+                if pedido is None or pedido["id"] != id_pedido:
+                    if pedido is not None:
+                        saida.append(orjson.dumps(pedido) + b"\n")
+                    pedido = {"id": id_pedido, "usuario": usuario, "status": status.name, "criado_em": criado_em, "itens": []}
+                if quantidade is not None:
+                    pedido["itens"].append({"quantidade": quantidade, "sabor": sabor, "tamanho": tamanho, "preco_unitario": preco_unitario})
+            yield b"".join(saida)
+    # o último pedido só é enviado ao final, pois os seus itens podem continuar no lote seguinte
+    if pedido is not None:
+        yield orjson.dumps(pedido) + b"\n"
+
+async def dividir_linhas(blocos):
+    """
+    Gerador assíncrono que recebe blocos de bytes (o corpo da requisição ou um arquivo) e devolve as
+    linhas de texto não vazias, sem acumular o conteúdo inteiro.
+    """
+    decodificador = codecs.getincrementaldecoder("utf-8")()
+    resto = ""
+    async for bloco in blocos:
+        partes = (resto + decodificador.decode(bloco)).split("\n")
+        resto = partes.pop()
+        for parte in partes:
+            if parte.strip():
+                yield parte
+    resto += decodificador.decode(b"", final=True)
+    if resto.strip():
+        yield resto
+
+async def ler_registros(linhas, conteudo, formato):
+    """
+    Gerador assíncrono que converte as linhas importadas em registros: um usuário ou um produto por
+    linha, ou um pedido com a lista dos seus itens. No CSV de pedidos, as linhas de um mesmo pedido precisam
+    estar em sequência, como na exportação.
+    """
+    numero = 0
+    colunas = None
+    pedido = None
+    async for linha in linhas:
+        numero += 1
+        try:
+            if formato == "csv":
+                valores = next(csv.reader([linha]))
+                if colunas is None:
+                    colunas = valores
+                    continue
+                registro = dict(zip(colunas, valores))
+            else:
+                registro = orjson.loads(linha)
+
+            if conteudo == "usuarios":
+                yield {
+                    "id": int(registro["id"]),
+                    "nome": registro["nome"],
+                    "email": registro["email"],
+                    # arquivos exportados sem a senha: o usuário fica sem senha válida até redefini-la
+                    "senha": registro.get("senha") or SENHA_BLOQUEADA,
+                    "ativo": registro["ativo"] in (True, "True", "true", "1"),
+                    "admin": registro["admin"] in (True, "True", "true", "1"),
+                }
+                continue
+
+            if conteudo == "produtos":
+                yield {
+                    "id": int(registro["id"]),
+                    "sabor": registro["sabor"],
+                    "tamanho": registro["tamanho"],
+                    "preco": float(registro["preco"]),
+                    "disponivel": registro["disponivel"] in (True, "True", "true", "1"),
+                }
+                continue
+
+            if formato == "csv":
+                id_pedido = int(registro["pedido"])
+                if pedido is not None and pedido["id"] != id_pedido:
+                    yield pedido
+                    pedido = None
+                if pedido is None:
+                    pedido = {"id": id_pedido, "usuario": int(registro["usuario"]), "status": registro["status"],
+                              "criado_em": registro["criado_em"], "itens": []}
+                if registro["quantidade"]:
+                    pedido["itens"].append({
+                        "quantidade": int(registro["quantidade"]),
+                        "sabor": registro["sabor"],
+                        "tamanho": registro["tamanho"],
+                        "preco_unitario": float(registro["preco_unitario"]),
+                    })
+            else:
+                yield {
+                    "id": int(registro["id"]),
+                    "usuario": int(registro["usuario"]),
+                    "status": registro["status"],
+                    "criado_em": registro.get("criado_em"),
+                    "itens": [
+                        {
+                            "quantidade": int(item["quantidade"]),
+                            "sabor": item["sabor"],
+                            "tamanho": item["tamanho"],
+                            "preco_unitario": float(item["preco_unitario"]),
+                        }
+                        for item in registro.get("itens", [])
+                    ],
+                }
+        except (KeyError, ValueError, TypeError, orjson.JSONDecodeError) as erro:
+            raise ErroImportacao(f"Linha {numero} inválida: {erro!r}")
+    if pedido is not None:
+        yield pedido
+
+def parametros_pedidos(lote, indice):
+    """
+    Função para montar os parâmetros dos INSERTs de um lote de pedidos: as linhas de pedidos (com
+    total e quantidade de itens calculados a partir dos itens), as linhas de itens (com o id do
+    produto do catálogo correspondente ao sabor e ao tamanho, e o preço cobrado no pedido) e as
+    linhas de resumo dos pedidos.
+    """
+    pedidos, itens, resumos = [], [], []
+    for registro in lote:
+        if registro["status"] not in StatusPedido.__members__:
+            raise ErroImportacao(f"Pedido {registro['id']} com status inválido: {registro['status']}")
+        status = StatusPedido[registro["status"]]
+        try:
+            criado_em = datetime.fromisoformat(registro["criado_em"]) if registro["criado_em"] else datetime.now(timezone.utc).replace(tzinfo=None)
+        except ValueError:
+            raise ErroImportacao(f"Pedido {registro['id']} com data de criação inválida: {registro['criado_em']}")
+        total_centavos = 0
+        for item in registro["itens"]:
+            produto = indice.resolver(sabor=item["sabor"], tamanho=item["tamanho"])
+            if produto is None:
+                raise ErroImportacao(f"Pedido {registro['id']} com produto fora do catálogo: {item['sabor']} {item['tamanho']}")
+            total_centavos += item["quantidade"] * para_centavos(item["preco_unitario"])
+            itens.append({"pedido": registro["id"], "quantidade": item["quantidade"], "produto": produto.id,
+                          "preco_unitario": item["preco_unitario"]})
+        total = total_centavos / 100
+        qtde_itens = len(registro["itens"])
+        pedidos.append({"id": registro["id"], "usuario": registro["usuario"], "status": status, "total": total,
+                        "qtde_itens": qtde_itens, "versao": 1, "criado_em": criado_em})
+        resumos.append({"pedido": registro["id"], "usuario": registro["usuario"], "status": status, "total": total,
+                        "qtde_itens": qtde_itens, "atualizado_em": criado_em})
+    return pedidos, itens, resumos
+
+async def gravar_lote(fabrica_sessao, conteudo, lote, catalogo):
+    async with fabrica_sessao() as session:
+        try:
+            if conteudo == "usuarios":
+                await session.execute(insert(Usuario.__table__), lote)
+            elif conteudo == "produtos":
+                # todo o lote entra com a próxima versão do catálogo
+                versao = await session.scalar(VersaoCatalogo.incrementar())
+                await session.execute(insert(Produto.__table__), [{**produto, "versao": versao} for produto in lote])
+            else:
+                pedidos, itens, resumos = parametros_pedidos(lote, await catalogo.atualizar(session, forcar=True))
+                # os ids dos pedidos arquivados não estão na chave primária da tabela de pedidos
+                arquivado = await session.scalar(
+                    select(PedidoArquivado.id).filter(PedidoArquivado.id.in_([pedido["id"] for pedido in pedidos])).limit(1)
+                )
+                if arquivado is not None:
+                    raise ErroImportacao(f"Pedido {arquivado} já existe no arquivo")
+                await session.execute(insert(Pedido.__table__), pedidos)
+                if itens:
+                    await session.execute(insert(ItemPedido.__table__), itens)
+                await session.execute(insert(ResumoPedido.__table__), resumos)
+            await session.commit()
+        except ErroImportacao:
+            raise
+        except Exception as erro:
+            # o erro do driver (ex.: id duplicado) é mais claro que a mensagem completa do SQLAlchemy
+            raise ErroImportacao(f"Erro ao gravar o lote iniciado no registro {lote[0]['id']}: {getattr(erro, 'orig', erro)}")
+
+async def importar(fabrica_sessao, linhas, conteudo, formato, tamanho_lote=configuracoes.TRANSFERENCIA_TAMANHO_LOTE, catalogo=catalogo_produtos):
+    """
+    Função para importar usuários, produtos ou pedidos (com os itens) a partir de linhas em NDJSON ou
+    CSV no formato da exportação, mantendo os ids; os itens dos pedidos precisam de produtos com o
+    mesmo sabor e tamanho no catálogo (o informado em catalogo, que é recarregado depois da
+    importação de produtos), e os usuários importados sem senha ficam sem senha válida
+    (SENHA_BLOQUEADA) até que ela seja redefinida. Os registros são gravados em lotes de tamanho_lote, cada
+    lote em uma transação própria com um INSERT em lote (executemany) por tabela; o total, a
+    quantidade de itens e o resumo de cada pedido são calculados a partir dos itens. Se um lote
+    falhar, os lotes anteriores continuam gravados e a função levanta ErroImportacao. A função
+    retorna a quantidade de registros importados.
+    """
+    quantidade = 0
+    lote = []
+    async for registro in ler_registros(linhas, conteudo, formato):
+        lote.append(registro)
+        if len(lote) >= tamanho_lote:
+            await gravar_lote(fabrica_sessao, conteudo, lote, catalogo)
+            quantidade += len(lote)
+            lote = []
+    if lote:
+        await gravar_lote(fabrica_sessao, conteudo, lote, catalogo)
+        quantidade += len(lote)
+
+    # com os ids informados explicitamente, as sequências do PostgreSQL precisam ser avançadas
+    async with fabrica_sessao() as session:
+        if session.get_bind().dialect.name == "postgresql":
+            tabela = {"usuarios": Usuario, "produtos": Produto, "pedidos": Pedido}[conteudo].__tablename__
+            await session.execute(text(f"SELECT setval(pg_get_serial_sequence('{tabela}', 'id'), (SELECT MAX(id) FROM {tabela}))"))
+            await session.commit()
+        if conteudo == "produtos":
+            # troca o índice de preços do catálogo (o do app, na importação pela API) pelo do catálogo importado
+            await catalogo.atualizar(session, forcar=True)
+    return quantidade
+
+async def ler_arquivo(caminho):
+    with open(caminho, "rb") as arquivo:
+        while bloco := arquivo.read(1024 * 1024):
+            yield bloco
+
+async def executar(args):
+    if args.operacao == "exportar":
+        saida = open(args.arquivo, "wb") if args.arquivo != "-" else sys.stdout.buffer
+        async with SessionLocal() as session:
+            async for bloco in exportar(session, args.conteudo, args.formato, args.tamanho_lote):
+                saida.write(bloco)
+        saida.flush()
+        return
+
+    try:
+        quantidade = await importar(SessionLocal, dividir_linhas(ler_arquivo(args.arquivo)), args.conteudo, args.formato, args.tamanho_lote)
+    except ErroImportacao as erro:
+        sys.exit(str(erro))
+    print(f"{quantidade} registro(s) de {args.conteudo} importado(s)")
+
+if __name__ == "__main__":
+    # uso: python transferencia.py exportar pedidos pedidos.ndjson [--formato csv]
+    #      python transferencia.py importar pedidos pedidos.ndjson [--formato csv]
+    parser = argparse.ArgumentParser(description="Exporta e importa usuários, produtos e pedidos em NDJSON ou CSV.")
+    parser.add_argument("operacao", choices=("exportar", "importar"))
+    parser.add_argument("conteudo", choices=CONTEUDOS)
+    parser.add_argument("arquivo", help="arquivo de saída ou de entrada (- para a saída padrão na exportação)")
+    parser.add_argument("--formato", choices=FORMATOS, default="ndjson")
+    parser.add_argument("--tamanho-lote", type=int, default=configuracoes.TRANSFERENCIA_TAMANHO_LOTE)
+    asyncio.run(executar(parser.parse_args()))